@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from .jwt_utils import reload_jwt_keys
+        from .models import Usuario
+        from .user_cache import _on_usuario_changed
+
+        # Clave JWT cargada al arrancar: un JWT_SECRET_FILE ausente o ilegible impide iniciar
+        # el proceso en lugar de devolver 500 en la primera petición autenticada
+        reload_jwt_keys()
+
+        # Cambios de activo/rol deben reflejarse de inmediato en la caché de autenticación
+        post_save.connect(_on_usuario_changed, sender=Usuario, dispatch_uid="accounts.user_status.save")
+        post_delete.connect(_on_usuario_changed, sender=Usuario, dispatch_uid="accounts.user_status.delete")
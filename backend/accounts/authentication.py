@@ -5,23 +5,60 @@ from rest_framework import authentication, exceptions
 
 from .jwt_utils import decode_token
 from .models import Usuario
+from .user_cache import get_user_status
 
 
 class SimpleUser:
     """
     Representa un usuario autenticado para DRF sin depender de django.contrib.auth.User.
+
+    Si la autenticación tuvo que cargar la fila Usuario (con su rol), la conserva para que
+    vistas y permisos la reutilicen durante toda la petición sin volver a consultar la BD.
     """
 
-    def __init__(self, user_id: int, email: str, role_name: str) -> None:
+    def __init__(self, user_id: int, email: str, role_name: str, usuario: Optional[Usuario] = None) -> None:
         self.id = user_id
         self.email = email
         self.role = role_name
+        self.usuario = usuario
         self.is_authenticated = True
 
     def __str__(self) -> str:
         return f"{self.email} ({self.role})"
 
 
+def authenticate_token(token: str) -> SimpleUser:
+    """
+    Valida un access token y el estado del usuario. Lanza AuthenticationFailed si no es válido.
+
+    Compartido por JwtAuthentication (HTTP) y los consumers de WebSocket.
+    """
+    claims = decode_token(token)
+    if not claims or claims.get("type") != "access":
+        raise exceptions.AuthenticationFailed("Token inválido o expirado")
+
+    user_id = claims.get("sub")
+    email = claims.get("email")
+    role = claims.get("role")
+    if not user_id or not email or not role:
+        raise exceptions.AuthenticationFailed("Token sin claims requeridos")
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        raise exceptions.AuthenticationFailed("Token sin claims requeridos")
+
+    # Verificar que el usuario exista y esté activo. El estado sale de la caché compartida;
+    # si hubo que ir a la BD, la fila completa (con rol) se comparte con vistas y permisos.
+    user_status, usuario = get_user_status(user_id)
+    if user_status is None or user_status.email != email:
+        raise exceptions.AuthenticationFailed("Usuario no encontrado")
+
+    if not user_status.activo:
+        raise exceptions.AuthenticationFailed("Usuario inactivo")
+
+    return SimpleUser(user_status.id, user_status.email, user_status.role, usuario=usuario)
+
+
 class JwtAuthentication(authentication.BaseAuthentication):
     """
     Autenticación vía JWT en header Authorization: Bearer <token>.
@@ -38,37 +75,27 @@ class JwtAuthentication(authentication.BaseAuthentication):
         if len(parts) != 2 or parts[0] != self.keyword:
             raise exceptions.AuthenticationFailed("Formato de Authorization inválido")
 
-        claims = decode_token(parts[1])
-        if not claims or claims.get("type") != "access":
-            raise exceptions.AuthenticationFailed("Token inválido o expirado")
-
-        user_id = claims.get("sub")
-        email = claims.get("email")
-        role = claims.get("role")
-        if not user_id or not email or not role:
-            raise exceptions.AuthenticationFailed("Token sin claims requeridos")
-
-        # Verificar que el usuario exista y esté activo
-        try:
-            usuario = Usuario.objects.only("id", "email", "activo", "rol__nombre").select_related("rol").get(id=user_id, email=email)
-        except Usuario.DoesNotExist:
-            raise exceptions.AuthenticationFailed("Usuario no encontrado")
-
-        if not usuario.activo:
-            raise exceptions.AuthenticationFailed("Usuario inactivo")
-
-        return SimpleUser(usuario.id, usuario.email, usuario.rol.nombre), None
+        return authenticate_token(parts[1]), None
 
 
 def get_user_from_request(request):
     """
-    Helper para obtener un objeto Usuario desde request (cargando de BD si es necesario).
+    Helper para obtener un objeto Usuario desde request.
+
+    Reutiliza el Usuario ya cargado por JwtAuthentication; solo consulta la BD si el
+    principal no lo trae (p. ej. autenticación por sesión) y lo memoriza en él.
     """
     user = getattr(request, "user", None)
     if not user or isinstance(user, AnonymousUser):
         return None
+    usuario = getattr(user, "usuario", None)
+    if isinstance(usuario, Usuario):
+        return usuario
     try:
-        return Usuario.objects.select_related("rol").get(id=user.id)
+        usuario = Usuario.objects.select_related("rol").get(id=user.id)
     except Usuario.DoesNotExist:
         return None
+    if isinstance(user, SimpleUser):
+        user.usuario = usuario
+    return usuario
 
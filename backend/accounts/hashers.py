@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 con iteraciones configurables (settings.PASSWORD_PBKDF2_ITERATIONS).
+
+    Mantiene el mismo identificador de algoritmo que el hasher de Django, así que los
+    hashes existentes siguen siendo válidos y se actualizan al nuevo costo en el login.
+    Usar ``manage.py calibrate_hashers`` para elegir el valor.
+    """
+
+    @property
+    def iterations(self) -> int:
+        return getattr(settings, "PASSWORD_PBKDF2_ITERATIONS", None) or PBKDF2PasswordHasher.iterations
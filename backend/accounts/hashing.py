@@ -0,0 +1,191 @@
+"""
+Pool acotado de procesos para el hashing de contraseñas (PBKDF2).
+
+El hashing es CPU intensivo: en picos de login ocupaba todos los workers HTTP y
+bloqueaba el resto de la API (incluidas las alertas). Aquí se ejecuta en un
+ProcessPoolExecutor con control de admisión: como mucho ``WORKERS + MAX_QUEUE``
+operaciones en vuelo; por encima se rechaza con ``HashingBusy`` (las vistas
+responden 429 + Retry-After) y las que esperan en cola más de ``QUEUE_TIMEOUT``
+también se rechazan.
+
+Con ``WORKERS = 0`` el hashing se ejecuta en el hilo de la petición (útil en
+desarrollo), manteniendo el mismo control de admisión.
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.db import connection
+
+from common.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+in_flight_gauge = registry.gauge("auth.hashing.in_flight", "Operaciones de hashing en curso o en cola")
+queue_depth_gauge = registry.gauge("auth.hashing.queue_depth", "Operaciones de hashing esperando un proceso libre")
+latency_summary = registry.summary("auth.hashing.latency_seconds", "Latencia total de hashing (cola + cómputo)")
+rejected_counter = registry.counter("auth.hashing.rejected", "Operaciones de hashing rechazadas por saturación")
+rehashed_counter = registry.counter("auth.hashing.rehashed", "Hashes actualizados a los parámetros vigentes tras el login")
+
+
+class HashingBusy(Exception):
+    """
+    El pool de hashing está saturado; reintentar pasados ``retry_after`` segundos.
+    """
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Servicio de autenticación saturado")
+        self.retry_after = retry_after
+
+
+def _init_worker() -> None:
+    # Procesos "spawn": no heredan conexiones a BD ni hilos del proceso padre
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    import django
+
+    django.setup()
+
+
+def _verify_password(raw_password: str, encoded: str) -> Tuple[bool, bool]:
+    return hashers.verify_password(raw_password, encoded)
+
+
+def _make_password(raw_password: str) -> str:
+    return hashers.make_password(raw_password)
+
+
+def _config(name: str, default):
+    return getattr(settings, "PASSWORD_HASHING_POOL", {}).get(name, default)
+
+
+class PasswordHashingPool:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+
+    @property
+    def workers(self) -> int:
+        return int(_config("WORKERS", 0))
+
+    @property
+    def capacity(self) -> int:
+        return max(1, self.workers) + int(_config("MAX_QUEUE", 16))
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def _retry_after(self) -> int:
+        avg = latency_summary.quantile(0.5) or 0.5
+        return max(1, math.ceil(avg * self._in_flight / max(1, self.workers)))
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                rejected_counter.inc()
+                raise HashingBusy(self._retry_after())
+            self._in_flight += 1
+            self._publish_gauges()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._publish_gauges()
+
+    def _publish_gauges(self) -> None:
+        in_flight_gauge.set(self._in_flight)
+        queue_depth_gauge.set(max(0, self._in_flight - max(1, self.workers)))
+
+    def run(self, fn, *args):
+        """
+        Ejecuta ``fn(*args)`` en el pool respetando la capacidad configurada.
+        """
+        self._admit()
+        start = time.perf_counter()
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                latency_summary.observe(time.perf_counter() - start)
+                self._release()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # El hueco se libera cuando la tarea termina de verdad: si vence QUEUE_TIMEOUT con la
+        # tarea ya en un proceso, cancel() no la detiene y sigue ocupándolo
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return future.result(timeout=float(_config("QUEUE_TIMEOUT", 10)))
+        except FutureTimeout:
+            future.cancel()
+            rejected_counter.inc()
+            raise HashingBusy(self._retry_after())
+        finally:
+            latency_summary.observe(time.perf_counter() - start)
+
+    def verify_password(self, raw_password: str, encoded: str) -> Tuple[bool, bool]:
+        """
+        Devuelve (correcta, must_update) como ``django.contrib.auth.hashers.verify_password``.
+        """
+        return self.run(_verify_password, raw_password, encoded)
+
+    def check_password(self, raw_password: str, encoded: str) -> bool:
+        return self.verify_password(raw_password, encoded)[0]
+
+    def make_password(self, raw_password: str) -> str:
+        return self.run(_make_password, raw_password)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+pool = PasswordHashingPool()
+
+
+# Re-hash tras login: un único hilo para no competir con las peticiones por el pool
+_rehash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rehash")
+
+
+def _rehash(user_id: int, old_hash: str, raw_password: str) -> None:
+    # Import diferido: los procesos del pool importan este módulo antes de django.setup()
+    from .models import Usuario
+
+    try:
+        new_hash = pool.make_password(raw_password)
+        # Compare-and-set: si el hash cambió entretanto (p. ej. cambio de contraseña) no se pisa
+        if Usuario.objects.filter(id=user_id, pass_hash=old_hash).update(pass_hash=new_hash):
+            rehashed_counter.inc()
+    except HashingBusy:
+        pass  # oportunista: se reintentará en el próximo login
+    except Exception:
+        logger.exception("No se pudo actualizar el hash del usuario %s", user_id)
+    finally:
+        connection.close()
+
+
+def schedule_rehash(user_id: int, old_hash: str, raw_password: str) -> None:
+    """
+    Actualiza en segundo plano el hash de un usuario a los parámetros vigentes.
+    """
+    if getattr(settings, "PASSWORD_REHASH_ON_LOGIN", True):
+        _rehash_executor.submit(_rehash, user_id, old_hash, raw_password)
@@ -1,20 +1,119 @@
+import hashlib
+import logging
 import os
+import threading
 import time
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
 
 import jwt
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from common.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto (segundos) se revisa JWT_SECRET_FILE en busca de una rotación de clave
+_KEY_FILE_CHECK_INTERVAL = 30.0
+
+_keys_lock = threading.Lock()
+_keys: Optional[Tuple[str, str]] = None
+_key_file_mtime: Optional[float] = None
+_key_file_checked_at = 0.0
+
+# Claims ya verificados: sha256(token) -> (exp, claims)
+_verified: "OrderedDict[bytes, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+_verified_lock = threading.Lock()
+
+verified_hits = registry.counter("auth.jwt.verified_cache_hits", "Tokens servidos desde la caché de claims verificados")
+verified_misses = registry.counter("auth.jwt.verified_cache_misses", "Tokens verificados con HMAC completo")
+
+
+def _resolve_keys() -> Tuple[str, str]:
+    """
+    Resuelve (secreto, algoritmo). El secreto sale de JWT_SECRET_FILE (si existe, permite
+    rotarlo sin reiniciar), de JWT_SECRET o, en su defecto, de SECRET_KEY.
+
+    Lanza ``ImproperlyConfigured`` si JWT_SECRET_FILE no se puede leer o está vacío.
+    """
+    global _key_file_mtime
+    secret = os.getenv("JWT_SECRET", settings.SECRET_KEY)
+    key_file = os.getenv("JWT_SECRET_FILE")
+    if key_file:
+        try:
+            with open(key_file, "r", encoding="utf-8") as fh:
+                secret = fh.read().strip()
+            mtime = os.path.getmtime(key_file)
+        except (OSError, UnicodeDecodeError) as exc:
+            raise ImproperlyConfigured(f"No se puede leer JWT_SECRET_FILE ({key_file}): {exc}") from exc
+        if not secret:
+            raise ImproperlyConfigured(f"JWT_SECRET_FILE ({key_file}) está vacío")
+        _key_file_mtime = mtime
+    return secret, os.getenv("JWT_ALG", "HS256")
+
+
+def _key_file_rotated() -> bool:
+    global _key_file_checked_at
+    key_file = os.getenv("JWT_SECRET_FILE")
+    if not key_file:
+        return False
+    now = time.monotonic()
+    if now - _key_file_checked_at < _KEY_FILE_CHECK_INTERVAL:
+        return False
+    _key_file_checked_at = now
+    try:
+        return os.path.getmtime(key_file) != _key_file_mtime
+    except OSError:
+        return False
+
+
+def _get_keys() -> Tuple[str, str]:
+    keys = _keys
+    if keys is None:
+        keys = reload_jwt_keys()
+    elif _key_file_rotated():
+        try:
+            keys = reload_jwt_keys()
+        except ImproperlyConfigured:
+            # Rotación a medio escribir o fichero retirado: se mantiene la clave vigente
+            logger.exception("No se pudo recargar la clave JWT; se mantiene la anterior")
+    return keys
+
+
+def reload_jwt_keys() -> Tuple[str, str]:
+    """
+    Vuelve a leer secreto/algoritmo (rotación de claves) y descarta los claims verificados.
+    """
+    global _keys
+    with _keys_lock:
+        _keys = _resolve_keys()
+    clear_verified_cache()
+    return _keys
+
+
+def clear_verified_cache() -> None:
+    with _verified_lock:
+        _verified.clear()
+
+
+@receiver(setting_changed)
+def _on_setting_changed(setting, **kwargs) -> None:
+    if setting in ("SECRET_KEY", "JWT_VERIFIED_CACHE_SIZE"):
+        reload_jwt_keys()
 
 
 def _get_jwt_secret() -> str:
     """
     Obtiene la clave para firmar JWT desde el entorno o fallback al SECRET_KEY.
     """
-    return os.getenv("JWT_SECRET", settings.SECRET_KEY)
+    return _get_keys()[0]
 
 
 def _get_alg() -> str:
-    return os.getenv("JWT_ALG", "HS256")
+    return _get_keys()[1]
 
 
 def _now_ts() -> int:
@@ -51,9 +150,34 @@ def create_refresh_token(payload: Dict[str, Any], expires_in_seconds: int = 7 *
 def decode_token(token: str) -> Optional[Dict[str, Any]]:
     """
     Decodifica y valida un token JWT. Devuelve claims o None si inválido/expirado.
+
+    Los claims verificados se memorizan (clave: sha256 del token) hasta su ``exp``,
+    así un mismo access token no repite HMAC y parseo en cada petición.
     """
+    secret, alg = _get_keys()
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    now = _now_ts()
+    with _verified_lock:
+        item = _verified.get(digest)
+        if item is not None:
+            if item[0] > now:
+                _verified.move_to_end(digest)
+                verified_hits.inc()
+                return dict(item[1])
+            del _verified[digest]
+
     try:
-        return jwt.decode(token, _get_jwt_secret(), algorithms=[_get_alg()])
+        claims = jwt.decode(token, secret, algorithms=[alg])
     except jwt.PyJWTError:
         return None
+    verified_misses.inc()
+
+    exp = claims.get("exp")
+    max_entries = getattr(settings, "JWT_VERIFIED_CACHE_SIZE", 4096)
+    if isinstance(exp, int) and max_entries > 0:
+        with _verified_lock:
+            _verified[digest] = (exp, dict(claims))
+            while len(_verified) > max_entries:
+                _verified.popitem(last=False)
+    return claims
 
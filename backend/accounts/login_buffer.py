@@ -0,0 +1,120 @@
+"""
+Buffer write-behind para ``app.usuarios.ultimo_login``.
+
+En picos de login, un UPDATE por inicio de sesión compite por las mismas páginas
+calientes. Aquí los timestamps se acumulan en memoria (uno por usuario, el más
+reciente) y un hilo los vuelca cada ``FLUSH_INTERVAL`` segundos con un único
+``UPDATE ... FROM (VALUES ...)`` por lote. También se vuelca al alcanzar
+``MAX_PENDING`` usuarios y al terminar el proceso (atexit).
+
+Con ``ENABLED = False`` (p. ej. en tests) el UPDATE se hace en línea como antes.
+"""
+
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.db import connection
+
+from common.metrics import registry
+from .models import Usuario
+
+logger = logging.getLogger(__name__)
+
+_CHUNK = 1000
+
+pending_gauge = registry.gauge("auth.last_login.pending", "Usuarios con ultimo_login pendiente de volcar")
+flushed_counter = registry.counter("auth.last_login.flushed", "Filas de ultimo_login volcadas en lote")
+
+
+def _config(name: str, default):
+    return getattr(settings, "LAST_LOGIN_WRITE_BEHIND", {}).get(name, default)
+
+
+class LastLoginBuffer:
+    def __init__(self) -> None:
+        self._pending: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def record(self, user_id: int, ts: datetime) -> None:
+        """
+        Registra un login. Si el buffer está desactivado, actualiza en línea.
+        """
+        if not _config("ENABLED", True):
+            Usuario.objects.filter(id=user_id).update(ultimo_login=ts)
+            return
+        with self._lock:
+            prev = self._pending.get(user_id)
+            if prev is None or prev < ts:
+                self._pending[user_id] = ts
+            size = len(self._pending)
+        pending_gauge.set(size)
+        self._ensure_thread()
+        if size >= int(_config("MAX_PENDING", 5000)):
+            self._wakeup.set()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="last-login-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(float(_config("FLUSH_INTERVAL", 5.0)))
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+    def flush(self) -> int:
+        """
+        Vuelca los timestamps pendientes. Devuelve el número de filas enviadas.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        pending_gauge.set(0)
+        if not batch:
+            return 0
+        rows = sorted(batch.items())
+        try:
+            for i in range(0, len(rows), _CHUNK):
+                self._write(rows[i : i + _CHUNK])
+        except Exception:
+            logger.exception("No se pudo volcar ultimo_login (%s usuarios); se reintentará", len(rows))
+            with self._lock:
+                for user_id, ts in batch.items():
+                    if user_id not in self._pending or self._pending[user_id] < ts:
+                        self._pending[user_id] = ts
+            return 0
+        flushed_counter.inc(len(rows))
+        return len(rows)
+
+    def _write(self, rows: List[Tuple[int, datetime]]) -> None:
+        values = ", ".join(["(%s::bigint, %s::timestamptz)"] * len(rows))
+        params: List = []
+        for user_id, ts in rows:
+            params.extend([user_id, ts])
+        with connection.cursor() as cur:
+            cur.execute(
+                "UPDATE app.usuarios AS u SET ultimo_login = v.ts "
+                f"FROM (VALUES {values}) AS v(id, ts) "
+                "WHERE u.id = v.id AND (u.ultimo_login IS NULL OR u.ultimo_login < v.ts)",
+                params,
+            )
+
+
+buffer = LastLoginBuffer()
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    buffer.flush()
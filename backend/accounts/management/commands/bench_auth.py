@@ -0,0 +1,44 @@
+import os
+import time
+
+import jwt
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts import jwt_utils
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark del costo de verificación de JWT por petición (antes/después de la memoización)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20000, help="Verificaciones por escenario")
+
+    def _run(self, label: str, fn, iterations: int) -> float:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter() - start
+        per_call_us = elapsed / iterations * 1e6
+        self.stdout.write(f"{label:<38} {per_call_us:9.2f} µs/petición  ({iterations / elapsed:,.0f} ops/s)")
+        return per_call_us
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        token = jwt_utils.create_access_token({"sub": 1, "email": "bench@example.com", "role": "user"})
+
+        def legacy_decode():
+            # Ruta original: os.getenv en cada llamada + HMAC y parseo completos
+            secret = os.getenv("JWT_SECRET", settings.SECRET_KEY)
+            alg = os.getenv("JWT_ALG", "HS256")
+            jwt.decode(token, secret, algorithms=[alg])
+
+        def cold_decode():
+            jwt_utils.clear_verified_cache()
+            jwt_utils.decode_token(token)
+
+        before = self._run("antes (getenv + HMAC por petición)", legacy_decode, iterations)
+        self._run("claves resueltas, caché vacía", cold_decode, iterations)
+        jwt_utils.decode_token(token)
+        after = self._run("después (claims memorizados)", lambda: jwt_utils.decode_token(token), iterations)
+        self.stdout.write(self.style.SUCCESS(f"Aceleración: x{before / after:.1f}"))
@@ -0,0 +1,63 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+from accounts.hashers import TunedPBKDF2PasswordHasher
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide en este host el costo de los hashers configurados y recomienda iteraciones "
+        "para un tiempo objetivo por hash (y el throughput de login resultante)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target-ms", type=float, default=250.0, help="Tiempo objetivo por hash en milisegundos")
+        parser.add_argument("--samples", type=int, default=3, help="Mediciones por hasher (se usa la mediana)")
+
+    def _measure(self, fn, samples: int) -> float:
+        times = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        times.sort()
+        return times[len(times) // 2]
+
+    def handle(self, *args, **options):
+        target = options["target_ms"] / 1000.0
+        samples = max(1, options["samples"])
+        workers = max(1, settings.PASSWORD_HASHING_POOL.get("WORKERS", 0))
+        salt = "calibracionsalt1234567"
+
+        for hasher in get_hashers():
+            name = f"{type(hasher).__module__}.{type(hasher).__name__}"
+            iterations = getattr(hasher, "iterations", None)
+            try:
+                if iterations:
+                    # Medir con pocas iteraciones y escalar (PBKDF2 es lineal en iteraciones)
+                    probe = max(10_000, iterations // 20)
+                    per_iter = self._measure(lambda: hasher.encode("x" * 16, salt, probe), samples) / probe
+                    current = per_iter * iterations
+                    recommended = max(10_000, int(round(target / per_iter, -4)))
+                    self.stdout.write(
+                        f"{name}: {iterations:,} iteraciones -> {current * 1000:.0f} ms/hash, "
+                        f"{workers / current:.1f} logins/s con {workers} procesos"
+                    )
+                    if isinstance(hasher, TunedPBKDF2PasswordHasher):
+                        self.stdout.write(
+                            self.style.SUCCESS(
+                                f"  recomendado para {target * 1000:.0f} ms: PASSWORD_PBKDF2_ITERATIONS={recommended} "
+                                f"({workers / target:.1f} logins/s)"
+                            )
+                        )
+                else:
+                    current = self._measure(lambda: hasher.encode("x" * 16, hasher.salt()), samples)
+                    self.stdout.write(f"{name}: {current * 1000:.0f} ms/hash con los parámetros actuales")
+            except (ValueError, TypeError) as exc:
+                # p. ej. argon2/bcrypt no instalados
+                self.stdout.write(self.style.WARNING(f"{name}: no disponible ({exc})"))
+
+        self.stdout.write("Los hashes existentes se actualizan al nuevo costo en el próximo login de cada usuario.")
@@ -0,0 +1,40 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.onboarding import import_users, parse_rows
+
+
+class Command(BaseCommand):
+    help = "Alta masiva de usuarios desde CSV o NDJSON (COPY a app.usuarios y, opcionalmente, app.perfiles_paciente)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Archivo CSV/NDJSON (columnas: email, password|pass_hash, role, activo, nombres, apellidos, fecha_nacimiento, sexo)")
+        parser.add_argument("--format", choices=("csv", "ndjson"), help="Por defecto se deduce de la extensión")
+        parser.add_argument("--default-role", default="user")
+        parser.add_argument("--with-profile", action="store_true", help="Crear perfiles_paciente para filas con nombres/apellidos")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Procesos para hashear contraseñas")
+        parser.add_argument("--max-errors", type=int, default=50, help="Errores a listar en la salida")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+        try:
+            with open(path, "rb") as fh:
+                report = import_users(
+                    parse_rows(fh, fmt),
+                    default_role=options["default_role"],
+                    with_profile=options["with_profile"],
+                    chunk_size=options["chunk_size"],
+                    workers=options["workers"],
+                )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        for err in report.errors[: options["max_errors"]]:
+            self.stdout.write(self.style.WARNING(f"fila {err['fila']} ({err['email']}): {err['error']}"))
+        self.stdout.write(
+            self.style.SUCCESS(f"Procesadas {report.total} filas: {report.created} usuarios creados, {len(report.errors)} errores.")
+        )
@@ -0,0 +1,302 @@
+"""
+Alta masiva de usuarios (CSV o NDJSON) con COPY de PostgreSQL.
+
+Flujo por lotes de ``chunk_size`` filas:
+1. Validación en memoria: formato de email, duplicados dentro del archivo, rol contra
+   el catálogo precargado, longitud mínima de contraseña y campos de perfil (fecha de
+   nacimiento, sexo, longitud de nombres y apellidos).
+2. Emails ya registrados, sin distinguir mayúsculas (igual que los duplicados dentro del
+   archivo): una sola consulta ``lower(email) = ANY(...)`` por lote.
+3. Hash de contraseñas en paralelo. Desde la API (``hashing_pool``) se usa el pool acotado
+   de login con su control de admisión: si se satura, la importación se detiene y el informe
+   indica la fila desde la que reanudar (la vista responde 429). Desde ``manage.py
+   import_users`` se usan procesos dedicados, creados una vez por importación.
+4. ``COPY`` a una tabla temporal y ``INSERT ... SELECT ... ON CONFLICT DO NOTHING`` a
+   ``app.usuarios`` (y opcionalmente ``app.perfiles_paciente``).
+
+Cada lote va en su propio savepoint: un error de BD invalida solo ese lote y el
+resto del archivo se sigue procesando. Los errores se reportan por fila.
+"""
+
+import csv
+import io
+import json
+import multiprocessing
+from datetime import date
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from django.contrib.auth.hashers import identify_hasher
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DatabaseError, connection, transaction
+from django.utils.dateparse import parse_date
+
+from common import catalogs
+from .hashing import HashingBusy, PasswordHashingPool, _init_worker, _make_password
+
+MIN_PASSWORD_LENGTH = 8
+PROFILE_FIELDS = ("nombres", "apellidos", "fecha_nacimiento", "sexo")
+MAX_NAME_LENGTH = 100
+
+_STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS _import_usuarios (
+  fila INTEGER NOT NULL,
+  email TEXT NOT NULL,
+  pass_hash TEXT NOT NULL,
+  rol_id BIGINT NOT NULL,
+  activo BOOLEAN NOT NULL,
+  nombres TEXT,
+  apellidos TEXT,
+  fecha_nacimiento DATE,
+  sexo CHAR(1)
+) ON COMMIT DROP
+"""
+
+
+@dataclass
+class ImportReport:
+    total: int = 0
+    created: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    # Importación detenida por saturación del pool de hashing: primera fila sin procesar
+    resume_from: Optional[int] = None
+    retry_after: int = 0
+
+    def add_error(self, row_number: int, email: Optional[str], error: str) -> None:
+        self.errors.append({"fila": row_number, "email": email, "error": error})
+
+    def as_dict(self) -> Dict[str, Any]:
+        result = {"total": self.total, "created": self.created, "errors": self.errors}
+        if self.resume_from is not None:
+            result["reanudar_desde"] = self.resume_from
+        return result
+
+
+def parse_rows(stream, fmt: str) -> Iterator[Dict[str, Any]]:
+    """
+    Itera filas (dict) desde un stream binario o de texto, sin cargarlo completo en memoria.
+    """
+    text = stream if isinstance(stream, io.TextIOBase) else io.TextIOWrapper(stream, encoding="utf-8-sig")
+    if fmt == "csv":
+        yield from csv.DictReader(text)
+    elif fmt == "ndjson":
+        for line in text:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = {"_error": "JSON inválido"}
+            yield row if isinstance(row, dict) else {"_error": "Se esperaba un objeto JSON"}
+    else:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+
+def _hash_passwords(passwords: List[str], executor: Optional[Executor], workers: int, make_password=_make_password) -> List[str]:
+    if executor is None or len(passwords) < 2:
+        return [make_password(p) for p in passwords]
+    return list(executor.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def _is_encoded(value: str) -> bool:
+    try:
+        identify_hasher(value)
+    except ValueError:
+        return False
+    return True
+
+
+class UserImporter:
+    def __init__(
+        self,
+        default_role: str = "user",
+        with_profile: bool = False,
+        chunk_size: int = 1000,
+        workers: int = 1,
+        hashing_pool: Optional[PasswordHashingPool] = None,
+    ) -> None:
+        self.roles = {r.nombre: r.id for r in catalogs.roles.all()}
+        if default_role not in self.roles:
+            raise ValueError(f"Rol por defecto inexistente: {default_role}")
+        self.default_role = default_role
+        self.with_profile = with_profile
+        self.chunk_size = chunk_size
+        self.hashing_pool = hashing_pool
+        # Con el pool compartido, como mucho tantas contraseñas en vuelo como procesos tiene
+        self.workers = max(1, hashing_pool.workers) if hashing_pool is not None else workers
+        self.report = ImportReport()
+        self._seen_emails: set = set()
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self.workers > 1 and self._executor is None:
+            if self.hashing_pool is not None:
+                # Hilos que solo esperan al pool compartido, que es quien hashea y admite
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="import-hash")
+            else:
+                # Un único pool por importación: arrancar procesos "spawn" por lote cuesta más que hashear
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+                )
+        return self._executor
+
+    def run(self, rows: Iterable[Dict[str, Any]]) -> ImportReport:
+        chunk: List[Dict[str, Any]] = []
+        try:
+            for number, row in enumerate(rows, start=1):
+                self.report.total += 1
+                clean = self._validate(number, row)
+                if clean is not None:
+                    chunk.append(clean)
+                if len(chunk) >= self.chunk_size:
+                    self._load_chunk(chunk)
+                    chunk = []
+            if chunk:
+                self._load_chunk(chunk)
+        except HashingBusy as exc:
+            # El lote en curso no llegó a insertarse; los anteriores ya están confirmados
+            self.report.resume_from = chunk[0]["fila"]
+            self.report.retry_after = exc.retry_after
+            self.report.total = self.report.resume_from - 1
+            self.report.errors = [e for e in self.report.errors if e["fila"] < self.report.resume_from]
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+        return self.report
+
+    def _validate(self, number: int, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if row.get("_error"):
+            self.report.add_error(number, None, row["_error"])
+            return None
+        email = (row.get("email") or "").strip()
+        try:
+            validate_email(email)
+        except ValidationError:
+            self.report.add_error(number, email or None, "Email inválido")
+            return None
+        key = email.lower()
+        if key in self._seen_emails:
+            self.report.add_error(number, email, "Email duplicado en el archivo")
+            return None
+        self._seen_emails.add(key)
+
+        role_name = (row.get("role") or row.get("rol") or "").strip().lower() or self.default_role
+        rol_id = self.roles.get(role_name)
+        if rol_id is None:
+            self.report.add_error(number, email, "Rol inválido")
+            return None
+
+        pass_hash = (row.get("pass_hash") or "").strip()
+        password = row.get("password") or ""
+        if pass_hash:
+            if not _is_encoded(pass_hash):
+                self.report.add_error(number, email, "pass_hash no reconocido")
+                return None
+        elif len(password) < MIN_PASSWORD_LENGTH:
+            self.report.add_error(number, email, f"Contraseña de menos de {MIN_PASSWORD_LENGTH} caracteres")
+            return None
+
+        activo = row.get("activo", True)
+        if isinstance(activo, str):
+            activo = activo.strip().lower() not in ("false", "0", "no", "f")
+
+        clean = {"fila": number, "email": email, "password": password, "pass_hash": pass_hash, "rol_id": rol_id, "activo": bool(activo)}
+        for name in PROFILE_FIELDS:
+            value = row.get(name)
+            clean[name] = value.strip() if isinstance(value, str) and value.strip() else None
+        error = self._validate_profile(clean)
+        if error:
+            self.report.add_error(number, email, error)
+            return None
+        return clean
+
+    @staticmethod
+    def _validate_profile(clean: Dict[str, Any]) -> Optional[str]:
+        """
+        Normaliza los campos de perfil de ``clean`` y devuelve el primer error, o None.
+        Un valor inválido aquí haría fallar el COPY/INSERT de todo el lote.
+        """
+        for name in ("nombres", "apellidos"):
+            if clean[name] is not None and len(clean[name]) > MAX_NAME_LENGTH:
+                return f"{name.capitalize()} excede el máximo permitido"
+        raw = clean["fecha_nacimiento"]
+        if raw is not None:
+            try:
+                value = parse_date(raw)
+            except ValueError:
+                value = None
+            if value is None:
+                return "Fecha de nacimiento inválida (AAAA-MM-DD)"
+            if value > date.today():
+                return "La fecha de nacimiento no puede ser futura"
+            clean["fecha_nacimiento"] = value.isoformat()
+        if clean["sexo"] not in (None, "M", "F", "X"):
+            return "Sexo debe ser 'M','F' o 'X'"
+        return None
+
+    def _load_chunk(self, chunk: List[Dict[str, Any]]) -> None:
+        with connection.cursor() as cur:
+            cur.execute("SELECT lower(email) FROM app.usuarios WHERE lower(email) = ANY(%s)", [[r["email"].lower() for r in chunk]])
+            existing = {e for (e,) in cur.fetchall()}
+        pending = []
+        for r in chunk:
+            if r["email"].lower() in existing:
+                self.report.add_error(r["fila"], r["email"], "Email ya registrado")
+            else:
+                pending.append(r)
+        if not pending:
+            return
+
+        to_hash = [r for r in pending if not r["pass_hash"]]
+        make_password = self.hashing_pool.make_password if self.hashing_pool is not None else _make_password
+        executor = self._get_executor() if len(to_hash) > 1 else None
+        for r, encoded in zip(to_hash, _hash_passwords([r["password"] for r in to_hash], executor, self.workers, make_password)):
+            r["pass_hash"] = encoded
+
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for r in pending:
+            writer.writerow(
+                [r["fila"], r["email"], r["pass_hash"], r["rol_id"], r["activo"]]
+                + [r[name] if r[name] is not None else "" for name in PROFILE_FIELDS]
+            )
+        buf.seek(0)
+
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cur:
+                    cur.execute(_STAGING_DDL)
+                    cur.execute("TRUNCATE _import_usuarios")
+                    cur.copy_expert("COPY _import_usuarios FROM STDIN WITH (FORMAT csv)", buf)
+                    cur.execute(
+                        "INSERT INTO app.usuarios (email, pass_hash, rol_id, activo) "
+                        "SELECT email, pass_hash, rol_id, activo FROM _import_usuarios ORDER BY fila "
+                        "ON CONFLICT (email) DO NOTHING RETURNING id, email"
+                    )
+                    created = dict((email, uid) for uid, email in cur.fetchall())
+                    if self.with_profile and created:
+                        cur.execute(
+                            "INSERT INTO app.perfiles_paciente (usuario_id, nombres, apellidos, fecha_nacimiento, sexo) "
+                            "SELECT u.id, s.nombres, s.apellidos, s.fecha_nacimiento, s.sexo "
+                            "FROM _import_usuarios s JOIN app.usuarios u ON u.email = s.email "
+                            "WHERE u.id = ANY(%s) AND s.nombres IS NOT NULL AND s.apellidos IS NOT NULL",
+                            [list(created.values())],
+                        )
+        except DatabaseError as exc:
+            for r in pending:
+                self.report.add_error(r["fila"], r["email"], f"Error de base de datos en el lote: {exc.__class__.__name__}")
+            return
+
+        self.report.created += len(created)
+        for r in pending:
+            if r["email"] not in created:
+                # Alta concurrente del mismo email entre la comprobación y el INSERT
+                self.report.add_error(r["fila"], r["email"], "Email ya registrado")
+
+
+def import_users(rows: Iterable[Dict[str, Any]], **options) -> ImportReport:
+    return UserImporter(**options).run(rows)
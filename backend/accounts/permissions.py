@@ -1,14 +1,21 @@
 from rest_framework.permissions import BasePermission
 
 
+def _has_role(request, role_name: str) -> bool:
+    """
+    Comprueba el rol contra el principal de la petición (sin consultar la BD).
+    """
+    user = getattr(request, "user", None)
+    return bool(user and getattr(user, "is_authenticated", False) and getattr(user, "role", "") == role_name)
+
+
 class IsAdmin(BasePermission):
     """
     Permite solo a rol 'admin'.
     """
 
     def has_permission(self, request, view) -> bool:
-        user = getattr(request, "user", None)
-        return bool(user and getattr(user, "is_authenticated", False) and getattr(user, "role", "") == "admin")
+        return _has_role(request, "admin")
 
 
 class IsNurse(BasePermission):
@@ -17,8 +24,7 @@ class IsNurse(BasePermission):
     """
 
     def has_permission(self, request, view) -> bool:
-        user = getattr(request, "user", None)
-        return bool(user and getattr(user, "is_authenticated", False) and getattr(user, "role", "") == "nurse")
+        return _has_role(request, "nurse")
 
 
 class IsUser(BasePermission):
@@ -27,6 +33,5 @@ class IsUser(BasePermission):
     """
 
     def has_permission(self, request, view) -> bool:
-        user = getattr(request, "user", None)
-        return bool(user and getattr(user, "is_authenticated", False) and getattr(user, "role", "") == "user")
+        return _has_role(request, "user")
 
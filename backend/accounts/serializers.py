@@ -1,9 +1,11 @@
 from dataclasses import dataclass
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Optional
 
-from django.contrib.auth.hashers import check_password, identify_hasher
+from django.contrib.auth.hashers import identify_hasher
 from rest_framework import serializers
 
+from common import catalogs
+from .hashing import pool as hashing_pool, schedule_rehash
 from .models import Usuario, Role
 
 
@@ -14,16 +16,22 @@ class AuthResult:
     error: str | None = None
 
 
-def check_passhash(stored_hash: str, raw_password: str) -> bool:
+def check_passhash(stored_hash: str, raw_password: str, setter: Optional[Callable[[str], None]] = None) -> bool:
     """
     Comprueba la contraseña comparando contra un hash estilo Django.
     Si el hash no es reconocible por Django, retorna False.
+    La verificación corre en el pool de hashing (puede lanzar HashingBusy).
+    Igual que ``check_password`` de Django, llama a ``setter`` si la contraseña es
+    correcta pero el hash usa parámetros desactualizados.
     """
     try:
         identify_hasher(stored_hash)  # valida formato
     except Exception:
         return False
-    return check_password(raw_password, stored_hash)
+    is_correct, must_update = hashing_pool.verify_password(raw_password, stored_hash)
+    if setter and is_correct and must_update:
+        setter(raw_password)
+    return is_correct
 
 
 def authenticate_user(email: str, password: str) -> AuthResult:
@@ -38,7 +46,10 @@ def authenticate_user(email: str, password: str) -> AuthResult:
     if not usuario.activo:
         return AuthResult(ok=False, error="Usuario inactivo")
 
-    if not check_passhash(usuario.pass_hash, password):
+    def _rehash(raw_password: str) -> None:
+        schedule_rehash(usuario.id, usuario.pass_hash, raw_password)
+
+    if not check_passhash(usuario.pass_hash, password, setter=_rehash):
         return AuthResult(ok=False, error="Credenciales inválidas")
 
     return AuthResult(ok=True, user=usuario)
@@ -75,7 +86,7 @@ class RegisterSerializer(serializers.Serializer):
         if not value:
             return "user"
         nombre = value.strip().lower()
-        if not Role.objects.filter(nombre=nombre).exists():
+        if catalogs.roles.get(nombre) is None:
             raise serializers.ValidationError("Rol inválido")
         return nombre
 
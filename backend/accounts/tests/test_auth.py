@@ -1,10 +1,11 @@
 from unittest import mock
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
 from django.db import connection
 
+from common import catalogs
 from accounts.jwt_utils import create_access_token, create_refresh_token, decode_token
 from accounts.serializers import AuthResult
 
@@ -19,7 +20,35 @@ class JwtUtilsTests(TestCase):
         self.assertEqual(decode_token(access)["type"], "access")
         self.assertEqual(decode_token(refresh)["type"], "refresh")
 
+    def test_decode_token_memoized_until_key_rotation(self):
+        from accounts import jwt_utils
 
+        access = create_access_token({"sub": 1, "email": "memo@example.com", "role": "user"}, expires_in_seconds=60)
+        first = decode_token(access)
+        hits = jwt_utils.verified_hits.value
+        first["email"] = "mutado@example.com"
+        self.assertEqual(decode_token(access)["email"], "memo@example.com")
+        self.assertEqual(jwt_utils.verified_hits.value, hits + 1)
+
+        # Rotar la clave descarta lo verificado: el token viejo deja de ser válido
+        with mock.patch.dict("os.environ", {"JWT_SECRET": "otra-clave-rotada-de-al-menos-32-bytes"}):
+            jwt_utils.reload_jwt_keys()
+            self.assertIsNone(decode_token(access))
+        jwt_utils.reload_jwt_keys()
+        self.assertEqual(decode_token(access)["sub"], "1")
+
+    def test_unreadable_key_file_fails_fast(self):
+        from django.core.exceptions import ImproperlyConfigured
+        from accounts import jwt_utils
+
+        with mock.patch.dict("os.environ", {"JWT_SECRET_FILE": "/nonexistent/jwt.key"}):
+            with self.assertRaises(ImproperlyConfigured):
+                jwt_utils.reload_jwt_keys()
+        jwt_utils.reload_jwt_keys()
+
+
+# Hashing en el hilo de la petición: sin pool de procesos "spawn" en los tests
+@override_settings(PASSWORD_HASHING_POOL={"WORKERS": 0, "MAX_QUEUE": 16, "QUEUE_TIMEOUT": 10})
 class AuthViewsTests(TestCase):
     """
     Pruebas de endpoints de autenticación (login, refresh, register, me).
@@ -59,6 +88,8 @@ class AuthViewsTests(TestCase):
         # Crear esquema y tablas requeridas para tests de registro
         with connection.cursor() as cursor:
             cursor.execute(cls.DDL)
+        # Las tablas de catálogo se recrean por clase de test: descartar lo cacheado
+        catalogs.invalidate_all()
 
     def setUp(self):
         self.client = APIClient()
@@ -87,6 +118,90 @@ class AuthViewsTests(TestCase):
         res = self.client.post(url, {"email": "bad@example.com", "password": "wrong"}, format="json")
         self.assertEqual(res.status_code, 401)
 
+    @mock.patch("accounts.views.authenticate_user")
+    def test_login_rejected_when_hashing_saturated(self, mock_auth):
+        from accounts.hashing import HashingBusy
+
+        mock_auth.side_effect = HashingBusy(retry_after=3)
+        res = self.client.post(reverse("auth-login"), {"email": "a@example.com", "password": "x"}, format="json")
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res["Retry-After"], "3")
+
+    def test_hashing_pool_admission_control(self):
+        from django.test import override_settings
+        from accounts.hashing import HashingBusy, PasswordHashingPool
+
+        with override_settings(PASSWORD_HASHING_POOL={"WORKERS": 0, "MAX_QUEUE": 0}):
+            pool = PasswordHashingPool()
+            encoded = pool.make_password("Secret123!")
+            self.assertTrue(pool.check_password("Secret123!", encoded))
+            # Capacidad = 1 operación en vuelo: una segunda concurrente se rechaza
+            pool._admit()
+            with self.assertRaises(HashingBusy):
+                pool.check_password("Secret123!", encoded)
+            pool._release()
+
+    def test_hashing_slot_held_until_timed_out_task_finishes(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from accounts.hashing import HashingBusy, PasswordHashingPool
+
+        with override_settings(PASSWORD_HASHING_POOL={"WORKERS": 1, "MAX_QUEUE": 0, "QUEUE_TIMEOUT": 0.05}):
+            pool = PasswordHashingPool()
+            pool._executor = ThreadPoolExecutor(max_workers=1)
+            finish = threading.Event()
+            with self.assertRaises(HashingBusy):
+                pool.run(finish.wait, 5)
+            # La tarea sigue ocupando el único proceso: no se admite otra
+            self.assertEqual(pool._in_flight, 1)
+            with self.assertRaises(HashingBusy):
+                pool.run(int, "1")
+            finish.set()
+            pool.shutdown()
+            self.assertEqual(pool._in_flight, 0)
+
+    def test_login_rehashes_outdated_hash(self):
+        from django.contrib.auth.hashers import PBKDF2PasswordHasher
+        from accounts import hashing
+        from accounts.models import Role, Usuario
+        from accounts.serializers import authenticate_user
+
+        old_hash = PBKDF2PasswordHasher().encode("Secret123!", "saltsaltsalt1234", iterations=1000)
+        role = Role.objects.get(nombre="user")
+        user = Usuario.objects.create(email="rehash@example.com", pass_hash=old_hash, rol=role, activo=True)
+
+        with mock.patch("accounts.serializers.schedule_rehash") as scheduled:
+            self.assertTrue(authenticate_user("rehash@example.com", "Secret123!").ok)
+        scheduled.assert_called_once_with(user.id, old_hash, "Secret123!")
+
+        with mock.patch("accounts.hashing.connection"):
+            hashing._rehash(user.id, old_hash, "Secret123!")
+        user.refresh_from_db()
+        self.assertNotEqual(user.pass_hash, old_hash)
+        self.assertFalse(hashing.pool.verify_password("Secret123!", user.pass_hash)[1])
+
+    def test_last_login_bulk_flush_and_inline_mode(self):
+        from datetime import timedelta
+        from django.test import override_settings
+        from django.utils import timezone
+        from accounts.login_buffer import LastLoginBuffer
+        from accounts.models import Role, Usuario
+
+        role = Role.objects.get(nombre="user")
+        users = [Usuario.objects.create(email=f"login{i}@example.com", pass_hash="x", rol=role) for i in range(3)]
+        now = timezone.now()
+        buf = LastLoginBuffer()
+        buf._pending = {u.id: now - timedelta(minutes=i) for i, u in enumerate(users)}
+        with self.assertNumQueries(1):
+            self.assertEqual(buf.flush(), 3)
+        self.assertEqual(Usuario.objects.get(id=users[0].id).ultimo_login, now)
+
+        with override_settings(LAST_LOGIN_WRITE_BEHIND={"ENABLED": False}):
+            later = now + timedelta(minutes=5)
+            buf.record(users[1].id, later)
+        self.assertEqual(buf._pending, {})
+        self.assertEqual(Usuario.objects.get(id=users[1].id).ultimo_login, later)
+
     def test_refresh_flow(self):
         claims = {"sub": 1, "email": "user@example.com", "role": "user"}
         refresh = create_refresh_token(claims, expires_in_seconds=60)
@@ -101,6 +216,59 @@ class AuthViewsTests(TestCase):
         # Sin credenciales, DRF responde 403 (Forbidden) con IsAuthenticated
         self.assertEqual(res.status_code, 403)
 
+    def test_me_single_query_per_request(self):
+        """
+        El Usuario cargado al autenticar se reutiliza en la vista (sin segunda consulta).
+        """
+        from django.contrib.auth.hashers import make_password
+        from accounts.models import Role, Usuario
+
+        role = Role.objects.get(nombre="user")
+        user = Usuario.objects.create(email="me.once@example.com", pass_hash=make_password("x"), rol=role, activo=True)
+        access = create_access_token({"sub": user.id, "email": user.email, "role": "user"}, expires_in_seconds=60)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        with self.assertNumQueries(1):
+            res = self.client.get(reverse("auth-me"))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["email"], "me.once@example.com")
+
+    def test_user_status_cache_and_invalidation(self):
+        """
+        El estado se sirve desde caché tras la primera petición y desactivar al usuario
+        lo invalida de inmediato.
+        """
+        from django.contrib.auth.hashers import make_password
+        from accounts import user_cache
+        from accounts.models import Role, Usuario
+
+        role, _ = Role.objects.get_or_create(nombre="admin")
+        user = Usuario.objects.create(email="cache.admin@example.com", pass_hash=make_password("x"), rol=role, activo=True)
+        access = create_access_token({"sub": user.id, "email": user.email, "role": "admin"}, expires_in_seconds=60)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+        misses = user_cache.misses.value
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+        user_cache.clear_local_cache()
+        # Segunda petición: el estado sale de la caché compartida, sin consultas
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse("metrics"))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(user_cache.misses.value, misses + 1)
+        self.assertIn("auth.user_status.shared_hits", res.data)
+
+        user.activo = False
+        user.save(update_fields=["activo"])
+        res = self.client.get(reverse("metrics"))
+        self.assertEqual(res.status_code, 403)
+
+    def test_user_status_ttl_capped_with_process_local_cache(self):
+        from accounts import user_cache
+
+        # LocMem (settings de test) no propaga invalidaciones entre workers: TTL corto
+        self.assertEqual(user_cache._shared_ttl(), 5)
+        with self.settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://localhost"}}):
+            self.assertEqual(user_cache._shared_ttl(), 300)
+
     def test_register_success_default_role(self):
         """
         Debe registrar un usuario con rol por defecto 'user' y devolver tokens.
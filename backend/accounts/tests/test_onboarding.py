@@ -0,0 +1,157 @@
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from common import catalogs
+from accounts.jwt_utils import create_access_token
+
+
+DDL = """
+CREATE SCHEMA IF NOT EXISTS app;
+
+CREATE TABLE IF NOT EXISTS app.roles (
+  id BIGSERIAL PRIMARY KEY,
+  nombre VARCHAR(32) NOT NULL UNIQUE
+);
+ALTER TABLE app.roles ADD COLUMN IF NOT EXISTS descripcion TEXT;
+
+CREATE TABLE IF NOT EXISTS app.usuarios (
+  id BIGSERIAL PRIMARY KEY,
+  email VARCHAR(254) NOT NULL UNIQUE,
+  pass_hash TEXT NOT NULL,
+  rol_id BIGINT NOT NULL REFERENCES app.roles(id),
+  activo BOOLEAN NOT NULL DEFAULT TRUE,
+  creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  actualizado_en TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  ultimo_login TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS app.perfiles_paciente (
+  usuario_id BIGINT PRIMARY KEY REFERENCES app.usuarios(id) ON DELETE CASCADE,
+  nombres VARCHAR(100) NOT NULL,
+  apellidos VARCHAR(100) NOT NULL,
+  fecha_nacimiento DATE,
+  sexo CHAR(1),
+  contacto_emergencia VARCHAR(100),
+  alergias TEXT,
+  antecedentes TEXT,
+  creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  actualizado_en TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO app.roles (nombre) VALUES ('user'),('nurse'),('admin') ON CONFLICT (nombre) DO NOTHING;
+"""
+
+# Hash precomputado para no pagar PBKDF2 completo en cada fila de prueba
+PRE_HASHED = "pbkdf2_sha256$1000$saltsaltsalt1234$0t4dQ0b6A3GZ5mPqB8mJ8y3rU1Jp8pWcH4c3x6Xj2aY="
+
+
+@override_settings(PASSWORD_HASHING_POOL={"WORKERS": 0, "MAX_QUEUE": 16, "QUEUE_TIMEOUT": 10})
+class UserImportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with connection.cursor() as cursor:
+            cursor.execute(DDL)
+        # Las tablas de catálogo se recrean por clase de test: descartar lo cacheado
+        catalogs.invalidate_all()
+        from accounts.models import Usuario, Role
+        admin = Usuario.objects.create(email="admin.import@example.com", pass_hash="x", rol=Role.objects.get(nombre="admin"))
+        cls.existing = Usuario.objects.create(email="ya.existe@example.com", pass_hash="x", rol=Role.objects.get(nombre="user"))
+        cls.admin_access = create_access_token({"sub": admin.id, "email": admin.email, "role": "admin"}, 600)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.admin_access}")
+
+    def test_csv_import_reports_row_errors_and_creates_profiles(self):
+        csv_body = "\n".join(
+            [
+                "email,password,pass_hash,role,nombres,apellidos,sexo",
+                f"ana@example.com,,{PRE_HASHED},,Ana,Pérez,F",
+                f"luis@example.com,,{PRE_HASHED},nurse,,,",
+                f"{self.existing.email.upper()},,{PRE_HASHED},,,,",
+                "no-es-email,,,,,,",
+                f"eva@example.com,,{PRE_HASHED},superuser,,,",
+                "corta@example.com,123,,,,,",
+                f"ANA@example.com,,{PRE_HASHED},,,,",
+            ]
+        )
+        upload = SimpleUploadedFile("alumnos.csv", csv_body.encode("utf-8"), content_type="text/csv")
+        res = self.client.post(reverse("auth-users-import"), {"file": upload, "with_profile": "true"}, format="multipart")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["total"], 7)
+        self.assertEqual(res.data["created"], 2)
+        self.assertEqual(sorted(e["fila"] for e in res.data["errors"]), [3, 4, 5, 6, 7])
+        # Un email ya registrado con otras mayúsculas se reporta, no se duplica
+        self.assertEqual({e["fila"]: e["error"] for e in res.data["errors"]}[3], "Email ya registrado")
+
+        from accounts.models import Usuario
+        from patients.models import PerfilPaciente
+
+        luis = Usuario.objects.select_related("rol").get(email="luis@example.com")
+        self.assertEqual(luis.rol.nombre, "nurse")
+        perfil = PerfilPaciente.objects.get(usuario__email="ana@example.com")
+        self.assertEqual(perfil.apellidos, "Pérez")
+        self.assertFalse(PerfilPaciente.objects.filter(usuario_id=luis.id).exists())
+
+    def test_ndjson_import_hashes_passwords(self):
+        lines = [json.dumps({"email": "nd1@example.com", "password": "Secret123!"}), "{roto", ""]
+        upload = SimpleUploadedFile("alta.ndjson", "\n".join(lines).encode("utf-8"))
+        res = self.client.post(reverse("auth-users-import"), {"file": upload}, format="multipart")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["created"], 1)
+        self.assertEqual(res.data["errors"][0]["error"], "JSON inválido")
+
+        from django.contrib.auth.hashers import check_password
+        from accounts.models import Usuario
+
+        self.assertTrue(check_password("Secret123!", Usuario.objects.get(email="nd1@example.com").pass_hash))
+
+    def test_import_hashes_through_bounded_pool_and_stops_when_full(self):
+        from accounts import hashing
+
+        rows = [{"email": f"cola{i}@example.com", "password": "Secret123!"} for i in range(3)]
+        body = "\n".join(json.dumps(r) for r in rows).encode("utf-8")
+        # Pool de login lleno: no se crean procesos propios, se responde 429 con la fila de reanudación
+        with mock.patch.object(hashing.pool, "_in_flight", hashing.pool.capacity):
+            res = self.client.post(reverse("auth-users-import"), {"file": SimpleUploadedFile("a.ndjson", body)}, format="multipart")
+        self.assertEqual(res.status_code, 429)
+        self.assertTrue(int(res["Retry-After"]) >= 1)
+        self.assertEqual((res.data["created"], res.data["reanudar_desde"]), (0, 1))
+
+        with mock.patch.object(hashing.pool, "make_password", wraps=hashing.pool.make_password) as make:
+            res = self.client.post(reverse("auth-users-import"), {"file": SimpleUploadedFile("a.ndjson", body)}, format="multipart")
+        self.assertEqual((res.status_code, res.data["created"]), (200, 3))
+        self.assertEqual(make.call_count, 3)
+
+    def test_invalid_profile_fields_fail_only_their_row(self):
+        rows = [
+            {"email": "fecha.ok@example.com", "pass_hash": PRE_HASHED, "nombres": "Ok", "apellidos": "Uno", "fecha_nacimiento": "1990-02-28"},
+            {"email": "fecha.mal@example.com", "pass_hash": PRE_HASHED, "nombres": "Mal", "apellidos": "Dos", "fecha_nacimiento": "1990-02-30"},
+            {"email": "sexo.mal@example.com", "pass_hash": PRE_HASHED, "nombres": "Mal", "apellidos": "Tres", "sexo": "Q"},
+        ]
+        upload = SimpleUploadedFile("perfiles.ndjson", "\n".join(json.dumps(r) for r in rows).encode("utf-8"))
+        res = self.client.post(reverse("auth-users-import"), {"file": upload, "with_profile": "true"}, format="multipart")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["created"], 1)
+        self.assertEqual(
+            [(e["fila"], e["error"]) for e in res.data["errors"]],
+            [(2, "Fecha de nacimiento inválida (AAAA-MM-DD)"), (3, "Sexo debe ser 'M','F' o 'X'")],
+        )
+
+        from patients.models import PerfilPaciente
+
+        self.assertEqual(str(PerfilPaciente.objects.get(usuario__email="fecha.ok@example.com").fecha_nacimiento), "1990-02-28")
+
+    def test_import_requires_admin(self):
+        self.client.credentials()
+        upload = SimpleUploadedFile("x.csv", b"email,password\n")
+        res = self.client.post(reverse("auth-users-import"), {"file": upload}, format="multipart")
+        self.assertEqual(res.status_code, 403)
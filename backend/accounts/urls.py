@@ -1,11 +1,12 @@
 from django.urls import path
 
-from .views import LoginView, MeView, RefreshView, RegisterView
+from .views import LoginView, MeView, RefreshView, RegisterView, UserImportView
 
 urlpatterns = [
     path("register", RegisterView.as_view(), name="auth-register"),
     path("login", LoginView.as_view(), name="auth-login"),
     path("refresh", RefreshView.as_view(), name="auth-refresh"),
     path("me", MeView.as_view(), name="auth-me"),
+    path("users/import", UserImportView.as_view(), name="auth-users-import"),
 ]
 
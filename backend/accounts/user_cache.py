@@ -0,0 +1,173 @@
+"""
+Caché del estado de usuario (activo, rol) para JwtAuthentication.
+
+Dos niveles:
+- Compartido: la caché de Django configurada (``CACHES["default"]``), común a todos los workers.
+- Local: LRU acotado con TTL corto por proceso, para absorber ráfagas sin ir a la caché compartida.
+
+Invalidación versionada: cada usuario tiene una clave de versión en la caché compartida.
+Una entrada solo es válida si su versión coincide con la vigente, de modo que invalidar
+(incrementar la versión) descarta también las entradas que otro worker esté escribiendo
+en ese momento con datos viejos. Las entradas locales de otros procesos caducan como
+mucho tras ``LOCAL_TTL`` segundos.
+
+La invalidación solo llega a todos los workers si ``CACHES["default"]`` es compartida
+(Redis/Memcached). Con un backend por proceso (LocMem, el de desarrollo) la versión
+incrementada solo la ve el worker que invalida, así que las entradas se guardan como mucho
+``PROCESS_LOCAL_TTL`` segundos: un usuario desactivado deja de autenticarse en el resto de
+workers tras ese plazo y no tras ``TTL``.
+
+Las señales post_save/post_delete de Usuario invalidan automáticamente. Los cambios hechos
+con ``QuerySet.update()`` o SQL directo deben llamar a ``invalidate_user_status``.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from common import cache as shared_cache
+from common.metrics import registry
+from .models import Usuario
+
+
+_KEY_PREFIX = "auth:ustatus"
+
+local_hits = registry.counter("auth.user_status.local_hits", "Estados de usuario servidos desde el LRU local")
+shared_hits = registry.counter("auth.user_status.shared_hits", "Estados de usuario servidos desde la caché compartida")
+misses = registry.counter("auth.user_status.misses", "Estados de usuario cargados desde PostgreSQL")
+invalidations = registry.counter("auth.user_status.invalidations", "Invalidaciones de estado de usuario")
+
+
+@dataclass(frozen=True)
+class UserStatus:
+    id: int
+    email: str
+    activo: bool
+    role: str
+    version: int
+
+
+def _config(name: str, default):
+    return getattr(settings, "AUTH_USER_STATUS_CACHE", {}).get(name, default)
+
+
+def _shared_ttl() -> int:
+    ttl = int(_config("TTL", 300))
+    if shared_cache.is_process_local():
+        ttl = min(ttl, int(_config("PROCESS_LOCAL_TTL", 5)))
+    return ttl
+
+
+def _status_key(user_id: int) -> str:
+    return f"{_KEY_PREFIX}:{user_id}"
+
+
+def _version_key(user_id: int) -> str:
+    return f"{_KEY_PREFIX}:v:{user_id}"
+
+
+class _LocalLRU:
+    """
+    LRU en memoria con TTL por entrada y número máximo de elementos.
+    """
+
+    def __init__(self) -> None:
+        self._data: "OrderedDict[int, Tuple[float, UserStatus]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[UserStatus]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(user_id)
+            if item is None:
+                return None
+            expires_at, status = item
+            if expires_at <= now:
+                del self._data[user_id]
+                return None
+            self._data.move_to_end(user_id)
+            return status
+
+    def put(self, status: UserStatus) -> None:
+        ttl = float(_config("LOCAL_TTL", 1.0))
+        if ttl <= 0:
+            return
+        max_entries = int(_config("LOCAL_MAX_ENTRIES", 10000))
+        with self._lock:
+            self._data[status.id] = (time.monotonic() + ttl, status)
+            self._data.move_to_end(status.id)
+            while len(self._data) > max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, user_id: int) -> None:
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_local = _LocalLRU()
+
+
+def get_user_status(user_id: int) -> Tuple[Optional[UserStatus], Optional[Usuario]]:
+    """
+    Devuelve (estado, usuario). ``usuario`` solo viene informado si hubo que ir a la BD,
+    para que el llamador pueda reutilizar la fila ya cargada. (None, None) si no existe.
+    """
+    status = _local.get(user_id)
+    if status is not None:
+        local_hits.inc()
+        return status, None
+
+    vkey, skey = _version_key(user_id), _status_key(user_id)
+    values = cache.get_many([vkey, skey])
+    version = values.get(vkey, 0)
+    entry = values.get(skey)
+    if entry is not None and entry[3] == version:
+        shared_hits.inc()
+        status = UserStatus(user_id, entry[0], entry[1], entry[2], version)
+        _local.put(status)
+        return status, None
+
+    misses.inc()
+    try:
+        usuario = Usuario.objects.select_related("rol").get(id=user_id)
+    except Usuario.DoesNotExist:
+        return None, None
+    status = UserStatus(usuario.id, usuario.email, usuario.activo, usuario.rol.nombre, version)
+    ttl = _shared_ttl()
+    if ttl > 0:
+        cache.set(skey, (status.email, status.activo, status.role, version), ttl)
+    _local.put(status)
+    return status, usuario
+
+
+def invalidate_user_status(user_id: int) -> None:
+    """
+    Invalida el estado cacheado de un usuario en todos los workers.
+    """
+    vkey = _version_key(user_id)
+    try:
+        cache.incr(vkey)
+    except ValueError:
+        # add() evita pisar un incremento concurrente de otro worker
+        if not cache.add(vkey, 1, None):
+            cache.incr(vkey)
+    cache.delete(_status_key(user_id))
+    _local.pop(user_id)
+    invalidations.inc()
+
+
+def clear_local_cache() -> None:
+    _local.clear()
+
+
+def _on_usuario_changed(sender, instance, **kwargs) -> None:
+    invalidate_user_status(instance.id)
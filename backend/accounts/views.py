@@ -2,16 +2,29 @@ from typing import Any, Dict
 
 from django.utils import timezone
 from rest_framework import status
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from common import catalogs
 from .authentication import get_user_from_request
+from .hashing import HashingBusy, pool as hashing_pool
+from .login_buffer import buffer as last_login_buffer
+from .onboarding import import_users, parse_rows
+from .permissions import IsAdmin
 from .jwt_utils import create_access_token, create_refresh_token, decode_token
 from .serializers import LoginSerializer, MeSerializer, RegisterSerializer, authenticate_user
 from django.db import transaction
-from django.contrib.auth.hashers import make_password
-from .models import Usuario, Role
+from .models import Usuario
+
+
+def _busy_response(exc: HashingBusy) -> Response:
+    return Response(
+        {"detail": "Demasiados inicios de sesión simultáneos, reintente en unos segundos"},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
 class LoginView(APIView):
@@ -30,16 +43,17 @@ class LoginView(APIView):
         email = serializer.validated_data["email"]
         password = serializer.validated_data["password"]
 
-        auth = authenticate_user(email, password)
+        try:
+            auth = authenticate_user(email, password)
+        except HashingBusy as exc:
+            return _busy_response(exc)
         if not auth.ok or not auth.user:
             return Response({"detail": auth.error or "Credenciales inválidas"}, status=status.HTTP_401_UNAUTHORIZED)
 
         user = auth.user
-        # Marcar último login (omitir silenciosamente si el objeto es un mock u otro tipo no administrado)
-        try:
-            type(user).objects.filter(id=user.id).update(ultimo_login=timezone.now())
-        except Exception:
-            pass
+        # Marcar último login vía buffer write-behind (omitir si el objeto es un mock u otro tipo no administrado)
+        if isinstance(user, Usuario):
+            last_login_buffer.record(user.id, timezone.now())
 
         base_claims: Dict[str, Any] = {"sub": user.id, "email": user.email, "role": user.rol.nombre}
         access = create_access_token(base_claims)
@@ -114,14 +128,18 @@ class RegisterView(APIView):
         password = serializer.validated_data["password"]
         role_name = serializer.validated_data.get("role", "user")
 
-        try:
-            rol = Role.objects.get(nombre=role_name)
-        except Role.DoesNotExist:
+        rol = catalogs.roles.get(role_name)
+        if rol is None:
             return Response({"detail": "Rol no encontrado"}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            pass_hash = hashing_pool.make_password(password)
+        except HashingBusy as exc:
+            return _busy_response(exc)
+
         user = Usuario.objects.create(
             email=email,
-            pass_hash=make_password(password),
+            pass_hash=pass_hash,
             rol=rol,
             activo=True,
         )
@@ -139,6 +157,41 @@ class RegisterView(APIView):
             },
             status=status.HTTP_201_CREATED,
         )
-from django.shortcuts import render
 
-# Create your views here.
+
+class UserImportView(APIView):
+    """
+    POST /api/auth/users/import  (admin, multipart/form-data)
+    Campos:
+      - file: CSV o NDJSON (email, password|pass_hash, role, activo, nombres, apellidos, fecha_nacimiento, sexo)
+      - format: csv | ndjson (opcional, por defecto según extensión)
+      - with_profile: true para crear perfiles_paciente
+    Devuelve el resumen con errores por fila; las filas válidas se cargan aunque otras fallen.
+    Las contraseñas se hashean en el pool acotado de login: si está saturado responde 429 con
+    lo ya cargado y ``reanudar_desde`` (primera fila sin procesar). Para archivos grandes, usar
+    ``manage.py import_users``.
+    """
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upfile = request.FILES.get("file")
+        if not upfile:
+            return Response({"detail": "Falta archivo 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get("format") or ("ndjson" if upfile.name.endswith((".ndjson", ".jsonl")) else "csv")
+        if fmt not in ("csv", "ndjson"):
+            return Response({"detail": "Formato inválido"}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = import_users(
+            parse_rows(upfile.file, fmt),
+            with_profile=str(request.data.get("with_profile", "")).lower() == "true",
+            hashing_pool=hashing_pool,
+        )
+        if report.resume_from is not None:
+            return Response(
+                {"detail": f"Servicio de autenticación saturado, reintente desde la fila {report.resume_from}", **report.as_dict()},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(report.retry_after)},
+            )
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
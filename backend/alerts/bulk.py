@@ -0,0 +1,67 @@
+"""
+Cambios de estado masivos (p. ej. cerrar las alertas de un turno).
+
+Coste fijo por lote en lugar de por alerta: un ``UPDATE ... RETURNING`` que bloquea las
+filas en orden de id (sin interbloqueos entre lotes solapados) y solo toca las que pueden
+pasar al estado pedido según ``ESTADO_TRANSICIONES``; un ``bulk_create`` de
+``EventoAlerta``; un upsert de contadores/latencias y un único evento de WebSocket
+(``alerts_bulk_status``) para enfermería, más uno por paciente con sus alertas.
+"""
+
+from typing import Any, Dict, List
+
+from django.db import connection
+
+from . import outbox, stats
+from .models import ESTADO_TRANSICIONES, Alerta, EventoAlerta
+from .serializers import alert_rows
+
+
+def bulk_transition(ids: List[int], estado: str, by_user_id: int) -> Dict[str, Any]:
+    """
+    Pasa a ``estado`` las alertas de ``ids`` (dentro de la transacción del llamador) y
+    devuelve el resultado por id: ``ok``, ``sin_cambio``, ``transicion_invalida`` o ``no_encontrada``.
+    """
+    ids = list(dict.fromkeys(ids))
+    sources = [current for current, targets in ESTADO_TRANSICIONES.items() if estado in targets]
+    with connection.cursor() as cur:
+        cur.execute(
+            "WITH objetivo AS ("
+            "SELECT id, estado, resuelto_en FROM app.alertas WHERE id = ANY(%s) AND estado = ANY(%s) ORDER BY id FOR UPDATE"
+            ") UPDATE app.alertas a SET estado = %s, "
+            "resuelto_en = CASE WHEN %s = 'resuelta' THEN NOW() ELSE a.resuelto_en END "
+            "FROM objetivo o WHERE a.id = o.id "
+            "RETURNING a.id, o.estado, a.tipo_alerta_id, a.fuente, a.creado_en, a.resuelto_en, o.resuelto_en IS NULL",
+            [ids, sources, estado, estado],
+        )
+        updated = cur.fetchall()
+        previous = {row[0]: row[1] for row in updated}
+        missing = [alert_id for alert_id in ids if alert_id not in previous]
+        current: Dict[int, str] = {}
+        if missing:
+            cur.execute("SELECT id, estado FROM app.alertas WHERE id = ANY(%s)", [missing])
+            current = dict(cur.fetchall())
+
+    if updated:
+        stats.record_transitions((old, estado, tipo_id, fuente) for _, old, tipo_id, fuente, *_ in updated)
+        if estado == "resuelta":
+            # Solo la primera resolución de cada alerta (las reabiertas ya tienen su muestra)
+            stats.record_latencies("resolucion", [(resuelto - creado).total_seconds() for *_, creado, resuelto, first in updated if first])
+        EventoAlerta.objects.bulk_create([
+            EventoAlerta(alerta_id=alert_id, por_usuario_id=by_user_id, tipo="cambio_estado", detalle_json={"estado": estado})
+            for alert_id in previous
+        ])
+        snapshots = alert_rows.many(alert_rows.values(Alerta.objects.filter(id__in=list(previous))).order_by("id"))
+        outbox.emit_bulk_event("alerts_bulk_status", snapshots, estado=estado)
+
+    results = []
+    for alert_id in ids:
+        if alert_id in previous:
+            results.append({"id": alert_id, "resultado": "ok", "estado_anterior": previous[alert_id]})
+        elif alert_id not in current:
+            results.append({"id": alert_id, "resultado": "no_encontrada"})
+        elif current[alert_id] == estado:
+            results.append({"id": alert_id, "resultado": "sin_cambio"})
+        else:
+            results.append({"id": alert_id, "resultado": "transicion_invalida", "estado_actual": current[alert_id]})
+    return {"estado": estado, "actualizadas": len(previous), "resultados": results}
@@ -1,15 +1,82 @@
 import json
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from rest_framework import exceptions
+
+from accounts.authentication import authenticate_token
+from . import outbox
 
 
 class AlertsConsumer(AsyncWebsocketConsumer):
+    """
+    ws/alerts?token=<access JWT>
+
+    Enfermería y administración se unen a ``alerts.nurses`` (todas las alertas); el resto de usuarios a
+    ``alerts.user.<id>`` (solo sus alertas). Sin token válido se rechaza la conexión.
+
+    Cada evento lleva ``seq``. Al reconectar con ``&last_seq=N`` se reenvían los eventos
+    perdidos; si el buffer ya no los cubre llega un único ``{"event": "resync", "seq",
+    "payload": {"alertas": [...]}}`` con las alertas abiertas (ver alerts/outbox.py).
+    """
+
     async def connect(self):
-        await self.channel_layer.group_add("alerts", self.channel_name)
+        self.alert_groups = []
+        self._replayed = set()
+        user = await self._authenticate()
+        if user is None:
+            await self.close(code=4401)
+            return
+        outbox.bind_event_loop()
+        # Unirse antes del replay: lo publicado mientras tanto queda en cola y se deduplica
+        self.alert_groups = outbox.groups_for(user)
+        for group in self.alert_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
         await self.accept()
+        last_seq = self._last_seq()
+        if last_seq is not None:
+            await self._resume(user, last_seq)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard("alerts", self.channel_name)
+        for group in self.alert_groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
 
     async def alerts_message(self, event):
-        await self.send(text_data=json.dumps({"event": event.get("event"), "payload": event.get("payload")}))
+        seq = event.get("seq")
+        if seq in self._replayed:
+            self._replayed.discard(seq)
+            return
+        await self._send_event(event)
+
+    async def _send_event(self, event):
+        await self.send(text_data=json.dumps({"event": event.get("event"), "seq": event.get("seq"), "payload": event.get("payload")}))
+
+    async def _resume(self, user, last_seq: int):
+        messages = await database_sync_to_async(outbox.replay_since)(user, last_seq)
+        if messages is None:
+            snapshot = await database_sync_to_async(outbox.snapshot_for)(user)
+            await self.send(text_data=json.dumps({"event": "resync", "seq": snapshot["seq"], "payload": {"alertas": snapshot["alertas"]}}))
+            return
+        for message in messages:
+            self._replayed.add(message["seq"])
+            await self._send_event(message)
+
+    def _params(self):
+        return parse_qs(self.scope.get("query_string", b"").decode("latin-1"))
+
+    def _last_seq(self):
+        raw = (self._params().get("last_seq") or [None])[0]
+        try:
+            return int(raw) if raw is not None else None
+        except ValueError:
+            return None
 
+    async def _authenticate(self):
+        token = (self._params().get("token") or [None])[0]
+        if not token:
+            return None
+        try:
+            return await database_sync_to_async(authenticate_token)(token)
+        except exceptions.AuthenticationFailed:
+            return None
@@ -0,0 +1,207 @@
+"""
+Despacho automático de alertas pendientes.
+
+Cola de prioridad: las alertas ``pendiente`` sin asignar se ordenan en SQL por
+
+    peso del tipo + AGE_WEIGHT * minutos de espera - DISTANCE_WEIGHT * km al enfermero
+
+(``ALERTS_DISPATCH`` en settings; la distancia solo cuenta si el enfermero publicó su
+ubicación y la alerta tiene coordenadas).
+
+Reclamo atómico: ``claim_next`` bloquea la fila de disponibilidad del enfermero (su
+carga no puede superar ``max_carga`` aunque reclame desde dos dispositivos) y toma la
+primera alerta de la cola con ``FOR UPDATE OF a SKIP LOCKED``: dos enfermeros o dos
+despachadores concurrentes nunca reciben la misma alerta ni esperan uno al otro.
+
+- Pull: ``POST /api/alerts/dispatch/next`` (el enfermero pide su siguiente alerta).
+- Push: ``manage.py dispatch_alerts`` reparte la cola entre los enfermeros disponibles,
+  empezando por los de menor carga.
+
+La asignación (manual o automática) pasa por ``assign``: mismos ``EventoAlerta``,
+estadísticas y evento de WebSocket que ``POST /api/alerts/:id/assign``.
+Métricas: ``alerts.dispatch.queue_depth``, ``alerts.dispatch.time_to_assignment``, ``alerts.dispatch.assigned``.
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from common.metrics import registry
+from . import outbox, stats
+from .models import Alerta, DisponibilidadEnfermeria, EventoAlerta
+from .serializers import AlertaReadSerializer, alert_rows
+
+KM_PER_DEGREE = 111.32
+
+queue_depth_gauge = registry.gauge("alerts.dispatch.queue_depth", "Alertas pendientes sin asignar")
+time_to_assignment = registry.summary("alerts.dispatch.time_to_assignment", "Segundos desde la creación hasta la primera asignación")
+assigned_counter = registry.counter("alerts.dispatch.assigned", "Alertas asignadas por el motor de despacho")
+
+
+class NurseAtCapacity(Exception):
+    """
+    El enfermero ya tiene ``max_carga`` alertas en curso.
+    """
+
+
+def _config(name: str, default):
+    return getattr(settings, "ALERTS_DISPATCH", {}).get(name, default)
+
+
+def _priority_sql(near: Optional[Tuple[float, float]]) -> Tuple[str, List[Any]]:
+    weights = _config("TYPE_WEIGHTS", {})
+    params: List[Any] = []
+    if weights:
+        type_sql = "CASE t.codigo " + " ".join("WHEN %s THEN %s" for _ in weights) + " ELSE %s END"
+        for code, weight in weights.items():
+            params += [code, float(weight)]
+    else:
+        type_sql = "%s"
+    params.append(float(_config("DEFAULT_TYPE_WEIGHT", 10.0)))
+
+    sql = f"({type_sql}) + EXTRACT(EPOCH FROM (NOW() - a.creado_en)) / 60.0 * %s"
+    params.append(float(_config("AGE_WEIGHT", 1.0)))
+    if near is not None:
+        # Equirectangular: suficiente a escala de campus/ciudad y sin funciones geográficas
+        sql += (
+            " - COALESCE(SQRT(POWER((a.latitud::float8 - %s) * %s, 2) + POWER((a.longitud::float8 - %s) * %s, 2)), 0) * %s"
+        )
+        params += [near[0], KM_PER_DEGREE, near[1], KM_PER_DEGREE * math.cos(math.radians(near[0])), float(_config("DISTANCE_WEIGHT", 2.0))]
+    return sql, params
+
+
+def _pending(near: Optional[Tuple[float, float]], limit: int, lock: bool) -> List[Tuple[int, float]]:
+    priority, params = _priority_sql(near)
+    with connection.cursor() as cur:
+        cur.execute(
+            f"SELECT a.id, {priority} AS prioridad FROM app.alertas a "
+            "LEFT JOIN app.tipos_alerta t ON t.id = a.tipo_alerta_id "
+            "WHERE a.estado = 'pendiente' AND a.asignado_a_id IS NULL "
+            "ORDER BY prioridad DESC, a.id LIMIT %s" + (" FOR UPDATE OF a SKIP LOCKED" if lock else ""),
+            params + [limit],
+        )
+        return [(alert_id, float(score)) for alert_id, score in cur.fetchall()]
+
+
+def queue_depth() -> int:
+    with connection.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM app.alertas WHERE estado = 'pendiente' AND asignado_a_id IS NULL")
+        depth = cur.fetchone()[0]
+    queue_depth_gauge.set(depth)
+    return depth
+
+
+def queue(limit: int = 50, near: Optional[Tuple[float, float]] = None) -> List[Dict[str, Any]]:
+    """
+    Primeras ``limit`` alertas de la cola, con su ``prioridad``, sin bloquearlas.
+    """
+    ranked = _pending(near, limit, lock=False)
+    rows = {row["id"]: row for row in alert_rows.values(Alerta.objects.filter(id__in=[i for i, _ in ranked]))}
+    results = []
+    for alert_id, score in ranked:
+        if alert_id in rows:
+            data = alert_rows.to_representation(rows[alert_id])
+            data["prioridad"] = round(score, 2)
+            results.append(data)
+    return results
+
+
+def nurses(available_only: bool = False) -> List[Dict[str, Any]]:
+    """
+    Enfermeros con disponibilidad registrada y su carga actual (alertas en curso), de menor a mayor carga.
+    """
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT d.enfermero_id, u.email, d.disponible, d.max_carga, d.latitud, d.longitud, d.actualizado_en, COUNT(a.id) "
+            "FROM app.enfermeria_disponibilidad d JOIN app.usuarios u ON u.id = d.enfermero_id "
+            "LEFT JOIN app.alertas a ON a.asignado_a_id = d.enfermero_id AND a.estado = 'en_curso' "
+            + ("WHERE d.disponible " if available_only else "")
+            + "GROUP BY d.enfermero_id, u.email ORDER BY 8, d.enfermero_id"
+        )
+        rows = cur.fetchall()
+    return [
+        {
+            "enfermero_id": nurse_id,
+            "email": email,
+            "disponible": disponible,
+            "max_carga": max_carga,
+            "carga": carga,
+            "latitud": None if lat is None else float(lat),
+            "longitud": None if lon is None else float(lon),
+            "actualizado_en": actualizado_en,
+        }
+        for nurse_id, email, disponible, max_carga, lat, lon, actualizado_en, carga in rows
+    ]
+
+
+def assign(alert: Alerta, asignado_id: int, by_user_id: int, **detail: Any) -> Dict[str, Any]:
+    """
+    Asigna ``alert`` (ya bloqueada por el llamador) y registra eventos, estadísticas y
+    el evento de WebSocket. Devuelve la instantánea de AlertaReadSerializer.
+    """
+    old_estado, first_assignment = alert.estado, alert.asignado_a_id is None
+    alert.asignado_a_id = asignado_id
+    if alert.estado == "pendiente":
+        alert.estado = "en_curso"
+    alert.save(update_fields=["asignado_a_id", "estado"])
+    stats.record_transition(alert, old_estado)
+    if first_assignment:
+        waited = (timezone.now() - alert.creado_en).total_seconds()
+        stats.record_latency("asignacion", waited)
+        time_to_assignment.observe(waited)
+
+    EventoAlerta.objects.bulk_create([
+        EventoAlerta(alerta=alert, por_usuario_id=by_user_id, tipo="asignada", detalle_json={"asignado_a_id": asignado_id, **detail}),
+        EventoAlerta(alerta=alert, por_usuario_id=by_user_id, tipo="cambio_estado", detalle_json={"estado": alert.estado}),
+    ])
+    data = AlertaReadSerializer(alert).data
+    outbox.emit_alert_event("alert_assigned", data, asignado_a_id=asignado_id)
+    return data
+
+
+@transaction.atomic
+def claim_next(nurse_id: int, automatic: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Asigna al enfermero la alerta de mayor prioridad. ``None`` si la cola está vacía;
+    ``NurseAtCapacity`` si ya tiene ``max_carga`` alertas en curso.
+    """
+    DisponibilidadEnfermeria.objects.get_or_create(enfermero_id=nurse_id)
+    slot = DisponibilidadEnfermeria.objects.select_for_update().get(enfermero_id=nurse_id)
+    load = Alerta.objects.filter(asignado_a_id=nurse_id, estado="en_curso").count()
+    if load >= slot.max_carga:
+        raise NurseAtCapacity(load)
+
+    near = None
+    if slot.latitud is not None and slot.longitud is not None:
+        near = (float(slot.latitud), float(slot.longitud))
+    ranked = _pending(near, 1, lock=True)
+    if not ranked:
+        return None
+    alert_id, score = ranked[0]
+    alert = Alerta.objects.select_related("tipo_alerta").get(id=alert_id)
+    data = assign(alert, nurse_id, nurse_id, automatica=automatic, prioridad=round(score, 2))
+    assigned_counter.inc()
+    return data
+
+
+def dispatch_round() -> int:
+    """
+    Una pasada de despacho: como mucho una alerta por enfermero disponible con
+    capacidad, empezando por los de menor carga. Devuelve cuántas se asignaron.
+    """
+    assigned = 0
+    for nurse in nurses(available_only=True):
+        if nurse["carga"] >= nurse["max_carga"]:
+            continue
+        try:
+            data = claim_next(nurse["enfermero_id"], automatic=True)
+        except NurseAtCapacity:
+            continue
+        if data is None:
+            break
+        assigned += 1
+    queue_depth()
+    return assigned
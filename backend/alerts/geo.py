@@ -0,0 +1,147 @@
+"""
+Consultas geográficas de alertas (sin PostGIS).
+
+- ``alerts_within``: alertas dentro de un radio (o caja). La caja envolvente usa el
+  índice btree ``(latitud, longitud)``; los candidatos salen ordenados por distancia
+  equirectangular aproximada (así el tope ``MAX_CANDIDATES`` descarta los más lejanos,
+  no filas arbitrarias) y la distancia exacta (haversine) se calcula solo sobre ellos.
+- ``clusters``: celdas agregadas para el mapa agrupando por prefijo del geohash
+  (``LEFT(geohash, p)``, con ``p`` según el zoom). En ventanas de tiempo ya cerradas
+  (``hasta`` en el pasado) ``total`` no cambia y se cachea ``ALERTS_GEO_CLUSTER_CACHE_TTL``
+  segundos; ``abiertas`` sí cambia (se resuelven alertas) y se cachea aparte solo
+  ``ALERTS_GEO_CLUSTER_OPEN_TTL`` segundos, recalculándose sobre las alertas no resueltas.
+
+Índices y columna: ``manage.py seed_alerts``; filas antiguas: ``manage.py backfill_alert_geohash``.
+"""
+
+import hashlib
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from common.geo import bbox_around, geohash_bbox, haversine_m, precision_for_zoom
+from common.metrics import registry
+from .models import Alerta
+from .serializers import alert_rows
+
+MAX_CANDIDATES = 5000
+MAX_CELLS = 2000
+
+cluster_cache_hits = registry.counter("alerts.geo.cluster_cache_hits", "Celdas de mapa servidas desde caché")
+
+BBox = Tuple[float, float, float, float]
+
+
+def alerts_within(*, center: Optional[Tuple[float, float]] = None, radius_m: Optional[float] = None,
+                  bbox: Optional[BBox] = None, estado: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+    """
+    Alertas en el círculo ``center``/``radius_m`` (ordenadas por distancia, con
+    ``distancia_m``) o en ``bbox`` (más recientes primero).
+    """
+    box = bbox_around(center[0], center[1], radius_m) if center is not None else bbox
+    lat_min, lon_min, lat_max, lon_max = box
+    qs = Alerta.objects.filter(
+        latitud__gte=lat_min, latitud__lte=lat_max, longitud__gte=lon_min, longitud__lte=lon_max
+    )
+    if estado:
+        qs = qs.filter(estado=estado)
+
+    if center is None:
+        return alert_rows.many(alert_rows.values(qs).order_by("-creado_en", "-id")[:limit])
+
+    # Distancia equirectangular al cuadrado: misma ordenación que haversine a escala de ciudad
+    approx = RawSQL("POWER(latitud - %s, 2) + POWER((longitud - %s) * %s, 2)", [center[0], center[1], math.cos(math.radians(center[0]))])
+    nearby = []
+    for row in alert_rows.values(qs).order_by(approx.asc(), "id")[:MAX_CANDIDATES]:
+        distance = haversine_m(center[0], center[1], float(row["latitud"]), float(row["longitud"]))
+        if distance <= radius_m:
+            nearby.append((distance, row))
+    nearby.sort(key=lambda item: item[0])
+    results = []
+    for distance, row in nearby[:limit]:
+        data = alert_rows.to_representation(row)
+        data["distancia_m"] = round(distance, 1)
+        results.append(data)
+    return results
+
+
+def _cache_key(bbox: BBox, precision: int, desde, hasta) -> str:
+    raw = "|".join([",".join(f"{v:.5f}" for v in bbox), str(precision), desde.isoformat() if desde else "", hasta.isoformat()])
+    return "alerts:clusters:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _where(bbox: BBox, desde, hasta) -> Tuple[str, List[Any]]:
+    lat_min, lon_min, lat_max, lon_max = bbox
+    where = ["geohash IS NOT NULL", "latitud BETWEEN %s AND %s", "longitud BETWEEN %s AND %s"]
+    params: List[Any] = [lat_min, lat_max, lon_min, lon_max]
+    if desde is not None:
+        where.append("creado_en >= %s")
+        params.append(desde)
+    if hasta is not None:
+        where.append("creado_en < %s")
+        params.append(hasta)
+    return " AND ".join(where), params
+
+
+def _open_counts(bbox: BBox, precision: int, desde, hasta, cells: List[str]) -> Dict[str, int]:
+    where, params = _where(bbox, desde, hasta)
+    with connection.cursor() as cur:
+        cur.execute(
+            f"SELECT LEFT(geohash, %s), COUNT(*) FROM app.alertas WHERE {where} AND estado <> 'resuelta' "
+            "AND LEFT(geohash, %s) = ANY(%s) GROUP BY 1",
+            [precision, *params, precision, cells],
+        )
+        return dict(cur.fetchall())
+
+
+def clusters(bbox: BBox, zoom: int, desde=None, hasta=None) -> Dict[str, Any]:
+    """
+    Celdas ``{celda, total, abiertas, lat, lon, bbox}`` dentro de ``bbox`` para el zoom dado.
+    """
+    precision = precision_for_zoom(zoom)
+    cacheable = hasta is not None and hasta <= timezone.now()
+    if cacheable:
+        key = _cache_key(bbox, precision, desde, hasta)
+        cached = cache.get_many([key, key + ":abiertas"])
+        result = cached.get(key)
+        if result is not None:
+            cluster_cache_hits.inc()
+            open_counts = cached.get(key + ":abiertas")
+            if open_counts is None:
+                open_counts = _open_counts(bbox, precision, desde, hasta, [cell["celda"] for cell in result["celdas"]])
+                cache.set(key + ":abiertas", open_counts, getattr(settings, "ALERTS_GEO_CLUSTER_OPEN_TTL", 30))
+            return {**result, "celdas": [{**cell, "abiertas": open_counts.get(cell["celda"], 0)} for cell in result["celdas"]]}
+
+    where, params = _where(bbox, desde, hasta)
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT LEFT(geohash, %s) AS celda, COUNT(*), COUNT(*) FILTER (WHERE estado <> 'resuelta'), "
+            "AVG(latitud), AVG(longitud) FROM app.alertas "
+            f"WHERE {where} GROUP BY 1 ORDER BY 2 DESC LIMIT %s",
+            [precision, *params, MAX_CELLS],
+        )
+        rows = cur.fetchall()
+
+    cells = [
+        {
+            "celda": cell,
+            "total": total,
+            "abiertas": open_count,
+            "lat": round(float(lat), 6),
+            "lon": round(float(lon), 6),
+            "bbox": [round(v, 6) for v in geohash_bbox(cell)],
+        }
+        for cell, total, open_count, lat, lon in rows
+    ]
+    result = {"precision": precision, "celdas": cells}
+    if cacheable:
+        cache.set_many({
+            key: {"precision": precision, "celdas": [{k: v for k, v in cell.items() if k != "abiertas"} for cell in cells]},
+        }, getattr(settings, "ALERTS_GEO_CLUSTER_CACHE_TTL", 3600))
+        cache.set(key + ":abiertas", {cell["celda"]: cell["abiertas"] for cell in cells}, getattr(settings, "ALERTS_GEO_CLUSTER_OPEN_TTL", 30))
+    return result
@@ -0,0 +1,202 @@
+"""
+Ingesta idempotente de alertas por lotes (kioscos e integraciones).
+
+Cada elemento trae una ``idempotency_key`` del cliente. La clave se guarda como un
+digest de 16 bytes de ``(usuario, clave)`` en ``app.alertas_idempotencia`` (PK del
+digest, ``alerta_id`` y ``creado_en``), así que un reintento devuelve la alerta ya
+creada en lugar de duplicarla:
+
+1. LRU por proceso con las claves recientes: los reintentos en ráfaga no tocan la BD.
+2. ``INSERT ... ON CONFLICT DO NOTHING RETURNING`` reclama en una sola sentencia las
+   claves nuevas; si otra petición concurrente reclamó la misma, esta espera su commit
+   y la ve como duplicada.
+3. Las alertas nuevas se escriben con un único INSERT multi-fila (``bulk_create``), sus
+   ``EventoAlerta`` con otro, y sale un solo evento de WebSocket ``alerts_bulk_created``.
+
+Las claves caducan a las ``ALERTS_INGEST["KEY_TTL"]`` segundos; la limpieza la hace la
+propia ingesta como mucho una vez por ``PURGE_INTERVAL`` y por proceso.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from common.geo import geohash_encode
+from common.metrics import registry
+from . import outbox, stats
+from .models import Alerta, EventoAlerta
+from .serializers import AlertaReadSerializer
+
+created_counter = registry.counter("alerts.ingest.created", "Alertas creadas por la ingesta idempotente")
+duplicate_counter = registry.counter("alerts.ingest.duplicates", "Elementos de ingesta descartados por clave repetida")
+lru_hits = registry.counter("alerts.ingest.lru_hits", "Duplicados resueltos desde el LRU local")
+
+
+def _config(name: str, default):
+    return getattr(settings, "ALERTS_INGEST", {}).get(name, default)
+
+
+def key_digest(user_id: int, key: str) -> bytes:
+    return hashlib.blake2b(f"{user_id}:{key}".encode("utf-8"), digest_size=16).digest()
+
+
+class _RecentKeys:
+    """
+    LRU acotado digest -> alerta_id de las claves vistas recientemente en este proceso.
+    """
+
+    def __init__(self) -> None:
+        self._data: "OrderedDict[bytes, Tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: bytes) -> Optional[int]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(digest)
+            if item is None:
+                return None
+            expires_at, alerta_id = item
+            if expires_at <= now:
+                del self._data[digest]
+                return None
+            self._data.move_to_end(digest)
+            return alerta_id
+
+    def put_many(self, items: List[Tuple[bytes, int]]) -> None:
+        max_entries = int(_config("LRU_SIZE", 10000))
+        if max_entries <= 0:
+            return
+        expires_at = time.monotonic() + float(_config("KEY_TTL", 86400))
+        with self._lock:
+            for digest, alerta_id in items:
+                self._data[digest] = (expires_at, alerta_id)
+                self._data.move_to_end(digest)
+            while len(self._data) > max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+recent_keys = _RecentKeys()
+_last_purge = 0.0
+
+
+def purge_expired_keys(force: bool = False) -> int:
+    """
+    Borra (por tandas) las claves más viejas que ``KEY_TTL``.
+    """
+    global _last_purge
+    now = time.monotonic()
+    if not force and now - _last_purge < float(_config("PURGE_INTERVAL", 300)):
+        return 0
+    _last_purge = now
+    cutoff = timezone.now() - timedelta(seconds=float(_config("KEY_TTL", 86400)))
+    with connection.cursor() as cur:
+        cur.execute(
+            "DELETE FROM app.alertas_idempotencia WHERE clave IN "
+            "(SELECT clave FROM app.alertas_idempotencia WHERE creado_en < %s LIMIT 5000)",
+            [cutoff],
+        )
+        return cur.rowcount
+
+
+def _claim(digests: List[bytes]) -> Tuple[set, Dict[bytes, int]]:
+    """
+    Reclama las claves; devuelve (nuevas, {duplicada: alerta_id}).
+    """
+    values = ", ".join(["(%s)"] * len(digests))
+    with connection.cursor() as cur:
+        cur.execute(
+            f"INSERT INTO app.alertas_idempotencia (clave) VALUES {values} ON CONFLICT (clave) DO NOTHING RETURNING clave",
+            digests,
+        )
+        claimed = {bytes(row[0]) for row in cur.fetchall()}
+        existing: Dict[bytes, int] = {}
+        taken = [d for d in digests if d not in claimed]
+        if taken:
+            cur.execute("SELECT clave, alerta_id FROM app.alertas_idempotencia WHERE clave = ANY(%s)", [taken])
+            existing = {bytes(clave): alerta_id for clave, alerta_id in cur.fetchall()}
+    return claimed, existing
+
+
+def ingest(user_id: int, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Crea las alertas de ``items`` (validadas por AlertaIngestItemSerializer) que no se
+    hayan recibido antes. Debe llamarse dentro de una transacción.
+    """
+    purge_expired_keys()
+    digests = [key_digest(user_id, item["idempotency_key"]) for item in items]
+
+    known: Dict[bytes, int] = {}
+    pending: List[bytes] = []
+    for digest in dict.fromkeys(digests):
+        alerta_id = recent_keys.get(digest)
+        if alerta_id is not None:
+            known[digest] = alerta_id
+            lru_hits.inc()
+        else:
+            pending.append(digest)
+
+    claimed, existing = _claim(pending) if pending else (set(), {})
+    known.update(existing)
+
+    first_item: Dict[bytes, Dict[str, Any]] = {}
+    for digest, item in zip(digests, items):
+        if digest in claimed:
+            first_item.setdefault(digest, item)
+
+    new_alerts: List[Alerta] = []
+    for digest, item in first_item.items():
+        lat, lon = item.get("latitud"), item.get("longitud")
+        new_alerts.append(Alerta(
+            paciente_id=user_id,
+            tipo_alerta=item.get("_tipo_obj"),
+            estado="pendiente",
+            latitud=lat,
+            longitud=lon,
+            geohash=geohash_encode(float(lat), float(lon)) if lat is not None and lon is not None else None,
+            descripcion=item.get("descripcion", ""),
+            fuente=item.get("fuente", "kiosco"),
+        ))
+
+    created: Dict[bytes, int] = {}
+    if new_alerts:
+        Alerta.objects.bulk_create(new_alerts)
+        created = {digest: alert.id for digest, alert in zip(first_item, new_alerts)}
+        with connection.cursor() as cur:
+            values = ", ".join(["(%s, %s)"] * len(created))
+            cur.execute(
+                f"UPDATE app.alertas_idempotencia i SET alerta_id = v.alerta_id FROM (VALUES {values}) AS v(clave, alerta_id) "
+                "WHERE i.clave = v.clave::bytea",
+                [v for digest, alerta_id in created.items() for v in (digest, alerta_id)],
+            )
+        EventoAlerta.objects.bulk_create([
+            EventoAlerta(alerta_id=alert.id, por_usuario_id=user_id, tipo="creada", detalle_json={}) for alert in new_alerts
+        ])
+        stats.record_created_many(new_alerts)
+        outbox.emit_bulk_event("alerts_bulk_created", AlertaReadSerializer(new_alerts, many=True).data)
+        created_counter.inc(len(new_alerts))
+
+    remembered = [*known.items(), *created.items()]
+    transaction.on_commit(lambda: recent_keys.put_many(remembered))
+
+    results, seen = [], set()
+    for digest, item in zip(digests, items):
+        if digest in created and digest not in seen:
+            results.append({"idempotency_key": item["idempotency_key"], "resultado": "creada", "alerta_id": created[digest]})
+        else:
+            results.append({"idempotency_key": item["idempotency_key"], "resultado": "duplicada", "alerta_id": known.get(digest, created.get(digest))})
+        seen.add(digest)
+    duplicates = len(items) - len(created)
+    if duplicates:
+        duplicate_counter.inc(duplicates)
+    return {"creadas": len(created), "duplicadas": duplicates, "resultados": results}
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from alerts.models import Alerta
+from common.geo import geohash_encode
+
+
+class Command(BaseCommand):
+    help = "Calcula app.alertas.geohash para alertas con coordenadas creadas antes de la columna."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Alertas actualizadas por transacción")
+
+    def handle(self, *args, **options):
+        batch_size, total = options["batch_size"], 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    Alerta.objects.filter(geohash__isnull=True, latitud__isnull=False, longitud__isnull=False)
+                    .only("id", "latitud", "longitud")
+                    .order_by("id")[:batch_size]
+                )
+                if not batch:
+                    break
+                for alert in batch:
+                    alert.geohash = geohash_encode(float(alert.latitud), float(alert.longitud))
+                Alerta.objects.bulk_update(batch, ["geohash"])
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"geohash calculado para {total} alertas."))
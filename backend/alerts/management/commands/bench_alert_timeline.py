@@ -0,0 +1,93 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from accounts.models import Usuario
+from alerts.models import Alerta, EventoAlerta
+from alerts.serializers import AlertaReadSerializer
+from alerts.timeline import fetch_timeline
+from medical.models import Adjunto
+from medical.serializers import attachment_rows
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(data, q: float) -> float:
+    return data[min(len(data) - 1, int(round(q * (len(data) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Compara GET /api/alerts/:id/timeline (una consulta JSON) con detalle + eventos + adjuntos por separado."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=500, help="Eventos de la alerta de prueba")
+        parser.add_argument("--attachments", type=int, default=20, help="Adjuntos de la alerta de prueba")
+        parser.add_argument("--iterations", type=int, default=200, help="Repeticiones por escenario")
+
+    def _run(self, label: str, fn, iterations: int) -> None:
+        samples, queries = [], 0
+        for _ in range(iterations):
+            before = len(connection.queries)
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+            queries = len(connection.queries) - before
+        samples.sort()
+        self.stdout.write(
+            f"{label:<34} p50={_percentile(samples, 0.5):7.2f} ms  p95={_percentile(samples, 0.95):7.2f} ms  consultas={queries}"
+        )
+
+    def handle(self, *args, **options):
+        user = Usuario.objects.order_by("id").first()
+        if user is None:
+            raise CommandError("Se necesita al menos un usuario (manage.py init_app_schema)")
+        iterations = options["iterations"]
+
+        try:
+            with transaction.atomic():
+                alert = Alerta.objects.create(paciente_id=user.id, latitud="-17.780000", longitud="-63.190000", descripcion="bench")
+                EventoAlerta.objects.bulk_create([
+                    EventoAlerta(alerta=alert, por_usuario_id=user.id, tipo="nota", detalle_json={"texto": f"nota {i}"})
+                    for i in range(options["events"])
+                ])
+                Adjunto.objects.bulk_create([
+                    Adjunto(propietario_tabla="alertas", propietario_id=alert.id, nombre_archivo=f"f{i}.jpg", mime="image/jpeg",
+                            ruta_storage=f"bench/{alert.id}/{i}.jpg", tamano_bytes=1024, creado_por_id=user.id)
+                    for i in range(options["attachments"])
+                ])
+
+                def separate():
+                    # Lo que hace hoy un cliente: detalle, eventos y adjuntos por separado
+                    data = AlertaReadSerializer(Alerta.objects.select_related("tipo_alerta").get(id=alert.id)).data
+                    eventos = list(EventoAlerta.objects.filter(alerta_id=alert.id).order_by("creado_en", "id")
+                                   .values("id", "tipo", "por_usuario_id", "detalle_json", "creado_en"))
+                    adjuntos = attachment_rows.many(attachment_rows.values(
+                        Adjunto.objects.filter(propietario_tabla="alertas", propietario_id=alert.id).order_by("creado_en", "id")))
+                    return json.dumps({"alerta": data, "eventos": eventos, "adjuntos": adjuntos}, cls=DjangoJSONEncoder)
+
+                def single():
+                    return fetch_timeline(alert.id)[1]
+
+                self.stdout.write(f"alerta con {options['events']} eventos y {options['attachments']} adjuntos, {iterations} repeticiones")
+                with _force_debug_cursor():
+                    self._run("detalle + eventos + adjuntos", separate, iterations)
+                    self._run("timeline (json_agg)", single, iterations)
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(self.style.SUCCESS("Datos de prueba descartados."))
+
+
+class _force_debug_cursor:
+    # Cuenta consultas sin DEBUG=True
+    def __enter__(self):
+        self._previous = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+
+    def __exit__(self, *exc):
+        connection.force_debug_cursor = self._previous
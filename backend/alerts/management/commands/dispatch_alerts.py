@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from alerts import dispatch
+
+
+class Command(BaseCommand):
+    help = "Reparte las alertas pendientes entre los enfermeros disponibles (cola de prioridad con SKIP LOCKED)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=None, help="Segundos entre rondas (por defecto ALERTS_DISPATCH['INTERVAL'])")
+        parser.add_argument("--once", action="store_true", help="Reparte hasta vaciar la cola o la capacidad, y termina")
+        parser.add_argument("--status", action="store_true", help="Muestra la cola y la carga de enfermería, y termina")
+
+    def handle(self, *args, **options):
+        if options["status"]:
+            self.stdout.write(f"pendientes={dispatch.queue_depth()}")
+            for nurse in dispatch.nurses():
+                flag = "disponible" if nurse["disponible"] else "no disponible"
+                self.stdout.write(f"  {nurse['email']}: {nurse['carga']}/{nurse['max_carga']} ({flag})")
+            return
+
+        if options["once"]:
+            total = 0
+            while True:
+                assigned = dispatch.dispatch_round()
+                total += assigned
+                if not assigned:
+                    break
+            self.stdout.write(self.style.SUCCESS(f"{total} alertas asignadas; pendientes={dispatch.queue_depth_gauge.value}"))
+            return
+
+        interval = options["interval"] if options["interval"] is not None else float(dispatch._config("INTERVAL", 2.0))
+        self.stdout.write(f"Despacho de alertas en marcha (intervalo {interval}s)")
+        while True:
+            try:
+                assigned = dispatch.dispatch_round()
+            except Exception as exc:
+                self.stderr.write(f"Error en la ronda de despacho: {exc!r}; reintento en {interval}s")
+                connection.close()
+                assigned = 0
+            if assigned and options["verbosity"] >= 2:
+                tta = dispatch.time_to_assignment.snapshot()
+                self.stdout.write(f"asignadas={assigned} pendientes={dispatch.queue_depth_gauge.value} tta_p50={tta['p50']} tta_p99={tta['p99']}")
+            if not assigned:
+                time.sleep(interval)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from alerts import partitions
+
+
+class Command(BaseCommand):
+    help = "Particiona app.eventos_alerta si hace falta, crea particiones mensuales y aplica la retención desacoplando las antiguas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=None, help="Meses futuros a preparar (por defecto ALERTS_EVENTS['MONTHS_AHEAD'])")
+        parser.add_argument("--retention-months", type=int, default=None, help="Desacopla particiones más antiguas (por defecto ALERTS_EVENTS['RETENTION_MONTHS']; 0 = nunca)")
+        parser.add_argument("--drop", action="store_true", help="Elimina las particiones desacopladas en lugar de conservarlas como tablas sueltas")
+
+    def handle(self, *args, **options):
+        # Primera ejecución tras seed_alerts (o en instalaciones anteriores): tabla sin particionar
+        if not partitions.is_partitioned():
+            copied = partitions.convert_legacy()
+            if copied is not None:
+                self.stdout.write(self.style.SUCCESS(f"app.eventos_alerta particionada; {copied} eventos copiados."))
+
+        created = partitions.ensure(options["months_ahead"])
+        for name in created:
+            self.stdout.write(f"creada app.{name}")
+
+        retention = options["retention_months"]
+        if retention is None:
+            retention = int(partitions._config("RETENTION_MONTHS", 0))
+        if retention > 0:
+            for name in partitions.detach_older_than(retention, drop=options["drop"]):
+                self.stdout.write(f"{'eliminada' if options['drop'] else 'desacoplada'} app.{name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(partitions.partitions())} particiones mensuales activas."))
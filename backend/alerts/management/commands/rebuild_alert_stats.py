@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from alerts import stats
+
+
+class Command(BaseCommand):
+    help = "Recalcula app.alertas_contadores y app.alertas_latencias desde app.alertas/app.eventos_alerta."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            stats.rebuild()
+        snap = stats.snapshot()
+        self.stdout.write(f"abiertas={snap['abiertas']} por_estado={snap['por_estado']}")
+        self.stdout.write(self.style.SUCCESS("Estadísticas de alertas recalculadas."))
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from alerts import outbox
+
+
+class Command(BaseCommand):
+    help = "Publica por WebSocket los eventos del outbox de alertas (app.alertas_outbox) en lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Eventos por lote (por defecto ALERTS_OUTBOX['BATCH_SIZE'])")
+        parser.add_argument("--interval", type=float, default=None, help="Segundos de espera con la cola vacía (por defecto ALERTS_OUTBOX['POLL_INTERVAL'])")
+        parser.add_argument("--once", action="store_true", help="Drena la cola una vez y termina")
+        parser.add_argument("--status", action="store_true", help="Muestra eventos pendientes y lag actual, y termina")
+
+    def handle(self, *args, **options):
+        if options["status"]:
+            status = outbox.outbox_status()
+            self.stdout.write(f"pendientes={status['pending']} lag={status['lag_seconds']}s")
+            return
+
+        if options["once"]:
+            sent = outbox.drain(options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"{sent} eventos publicados."))
+            return
+
+        interval = options["interval"] if options["interval"] is not None else float(outbox._config("POLL_INTERVAL", 1.0))
+        report_every = 60.0
+        purge_every = float(outbox._config("PURGE_INTERVAL", 300))
+        last_report = last_purge = time.monotonic()
+        self.stdout.write(f"Relay de alertas en marcha (intervalo {interval}s)")
+        while True:
+            try:
+                sent = outbox.drain(options["batch_size"])
+            except Exception as exc:
+                self.stderr.write(f"Error publicando el outbox: {exc!r}; reintento en {interval}s")
+                connection.close()
+                sent = 0
+            now = time.monotonic()
+            if now - last_purge >= purge_every:
+                outbox.purge_published()
+                last_purge = now
+            if now - last_report >= report_every or (sent and options["verbosity"] >= 2):
+                lag = outbox.lag_summary.snapshot()
+                self.stdout.write(
+                    f"publicados={outbox.published_counter.value} lag_p50={lag['p50']} lag_p99={lag['p99']} lag_max={lag['max']}"
+                )
+                last_report = now
+            if not sent:
+                time.sleep(interval)
@@ -1,6 +1,9 @@
 from django.core.management.base import BaseCommand
 from django.db import connection, transaction
 
+from alerts import partitions
+from common import catalogs
+
 
 SQL = """
 CREATE SCHEMA IF NOT EXISTS app;
@@ -26,6 +29,10 @@ CREATE TABLE IF NOT EXISTS app.alertas (
   fuente VARCHAR(16) NOT NULL DEFAULT 'app' CHECK (fuente IN ('app','kiosco','admin'))
 );
 
+ALTER TABLE app.alertas ADD COLUMN IF NOT EXISTS geohash VARCHAR(12);
+CREATE INDEX IF NOT EXISTS alertas_lat_lon_idx ON app.alertas (latitud, longitud) WHERE latitud IS NOT NULL;
+CREATE INDEX IF NOT EXISTS alertas_geohash_idx ON app.alertas (geohash text_pattern_ops, creado_en) WHERE geohash IS NOT NULL;
+
 CREATE TABLE IF NOT EXISTS app.eventos_alerta (
   id BIGSERIAL PRIMARY KEY,
   alerta_id BIGINT NOT NULL REFERENCES app.alertas(id) ON DELETE CASCADE,
@@ -35,6 +42,70 @@ CREATE TABLE IF NOT EXISTS app.eventos_alerta (
   creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
+CREATE TABLE IF NOT EXISTS app.alertas_outbox (
+  id BIGSERIAL PRIMARY KEY,
+  evento VARCHAR(32) NOT NULL,
+  payload JSONB NOT NULL DEFAULT '{}'::JSONB,
+  creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  publicado_en TIMESTAMPTZ
+);
+ALTER TABLE app.alertas_outbox ADD COLUMN IF NOT EXISTS paciente_id BIGINT;
+ALTER TABLE app.alertas_outbox ADD COLUMN IF NOT EXISTS solo_paciente BOOLEAN NOT NULL DEFAULT FALSE;
+CREATE INDEX IF NOT EXISTS alertas_outbox_pendientes_idx ON app.alertas_outbox (id) WHERE publicado_en IS NULL;
+ALTER TABLE app.alertas_outbox ADD COLUMN IF NOT EXISTS publicado_seq BIGINT;
+CREATE SEQUENCE IF NOT EXISTS app.alertas_outbox_publicado_seq;
+-- Filas publicadas antes de publicado_seq: su seq era el id; la secuencia sigue por encima
+UPDATE app.alertas_outbox SET publicado_seq = id WHERE publicado_en IS NOT NULL AND publicado_seq IS NULL;
+SELECT setval('app.alertas_outbox_publicado_seq', GREATEST(COALESCE(MAX(id), 1), (SELECT last_value FROM app.alertas_outbox_publicado_seq)))
+FROM app.alertas_outbox;
+CREATE UNIQUE INDEX IF NOT EXISTS alertas_outbox_publicado_seq_idx ON app.alertas_outbox (publicado_seq);
+DROP INDEX IF EXISTS app.alertas_outbox_paciente_idx;
+CREATE INDEX IF NOT EXISTS alertas_outbox_paciente_seq_idx ON app.alertas_outbox (paciente_id, publicado_seq);
+
+CREATE TABLE IF NOT EXISTS app.alertas_contadores (
+  estado VARCHAR(20) NOT NULL,
+  tipo_alerta_id BIGINT NOT NULL DEFAULT 0,
+  fuente VARCHAR(16) NOT NULL,
+  shard SMALLINT NOT NULL DEFAULT 0,
+  total BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (estado, tipo_alerta_id, fuente, shard)
+);
+-- Tablas anteriores a los contadores repartidos: añadir shard a la clave
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                 WHERE table_schema = 'app' AND table_name = 'alertas_contadores' AND column_name = 'shard') THEN
+    ALTER TABLE app.alertas_contadores ADD COLUMN shard SMALLINT NOT NULL DEFAULT 0;
+    ALTER TABLE app.alertas_contadores DROP CONSTRAINT alertas_contadores_pkey;
+    ALTER TABLE app.alertas_contadores ADD PRIMARY KEY (estado, tipo_alerta_id, fuente, shard);
+  END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS app.alertas_latencias (
+  metrica VARCHAR(16) NOT NULL,
+  bucket INTEGER NOT NULL,
+  total BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (metrica, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS app.alertas_idempotencia (
+  clave BYTEA PRIMARY KEY,
+  alerta_id BIGINT,
+  creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS alertas_idempotencia_creado_idx ON app.alertas_idempotencia USING brin (creado_en);
+
+CREATE TABLE IF NOT EXISTS app.enfermeria_disponibilidad (
+  enfermero_id BIGINT PRIMARY KEY REFERENCES app.usuarios(id) ON DELETE CASCADE,
+  disponible BOOLEAN NOT NULL DEFAULT FALSE,
+  latitud NUMERIC(9,6),
+  longitud NUMERIC(9,6),
+  max_carga SMALLINT NOT NULL DEFAULT 3 CHECK (max_carga >= 0),
+  actualizado_en TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS alertas_cola_idx ON app.alertas (creado_en) WHERE estado = 'pendiente' AND asignado_a_id IS NULL;
+CREATE INDEX IF NOT EXISTS alertas_carga_idx ON app.alertas (asignado_a_id) WHERE estado = 'en_curso';
+
 INSERT INTO app.tipos_alerta (codigo, nombre, activo) VALUES
 ('trauma','Trauma', TRUE),
 ('cardio','Cardiovascular', TRUE),
@@ -44,11 +115,19 @@ ON CONFLICT (codigo) DO NOTHING;
 
 
 class Command(BaseCommand):
-    help = "Crea tablas de alertas y semillas de tipos_alerta."
+    help = "Crea tablas de alertas (incl. outbox de eventos) y semillas de tipos_alerta."
 
     def handle(self, *args, **options):
         with transaction.atomic():
             with connection.cursor() as cursor:
                 cursor.execute(SQL)
+                cursor.execute(partitions.INDEX_SQL)
+            if partitions.is_partitioned():
+                partitions.ensure()
+            else:
+                self.stdout.write(self.style.WARNING(
+                    "app.eventos_alerta aún no está particionada: `manage.py maintain_alert_events` la convierte en su primera ejecución."
+                ))
+        catalogs.invalidate_all()
         self.stdout.write(self.style.SUCCESS("Esquema de alertas listo y tipos_alerta sembrados."))
 
@@ -1,5 +1,6 @@
 from django.db import models
 from accounts.models import Usuario
+from common.geo import geohash_encode
 
 
 class TipoAlerta(models.Model):
@@ -15,6 +16,14 @@ class TipoAlerta(models.Model):
         verbose_name_plural = "Tipos de alerta"
 
 
+# Máquina de estados: estado actual -> estados a los que puede pasar (POST /status y /bulk-status)
+ESTADO_TRANSICIONES = {
+    "pendiente": ("en_curso", "resuelta"),
+    "en_curso": ("resuelta",),
+    "resuelta": ("en_curso",),
+}
+
+
 class Alerta(models.Model):
     id = models.BigAutoField(primary_key=True)
     paciente = models.ForeignKey(Usuario, on_delete=models.SET_NULL, db_column="paciente_id", blank=True, null=True, related_name="alertas")
@@ -27,6 +36,7 @@ class Alerta(models.Model):
     asignado_a = models.ForeignKey(Usuario, on_delete=models.SET_NULL, db_column="asignado_a_id", blank=True, null=True, related_name="alertas_asignadas")
     resuelto_en = models.DateTimeField(blank=True, null=True)
     fuente = models.CharField(max_length=16, default="app")
+    geohash = models.CharField(max_length=12, blank=True, null=True)
 
     class Meta:
         managed = False
@@ -34,6 +44,17 @@ class Alerta(models.Model):
         verbose_name = "Alerta"
         verbose_name_plural = "Alertas"
 
+    def save(self, *args, **kwargs):
+        # Celda geohash derivada de las coordenadas (índice de las consultas geográficas)
+        if self.latitud is not None and self.longitud is not None:
+            self.geohash = geohash_encode(float(self.latitud), float(self.longitud))
+        else:
+            self.geohash = None
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitud", "longitud"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"geohash"}
+        super().save(*args, **kwargs)
+
 
 class EventoAlerta(models.Model):
     id = models.BigAutoField(primary_key=True)
@@ -51,3 +72,43 @@ class EventoAlerta(models.Model):
 from django.db import models
 
 # Create your models here.
+
+
+class AlertaOutbox(models.Model):
+    """
+    Eventos pendientes de publicar por WebSocket (ver alerts/outbox.py).
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    evento = models.CharField(max_length=32)
+    payload = models.JSONField(default=dict)
+    paciente_id = models.BigIntegerField(blank=True, null=True)
+    solo_paciente = models.BooleanField(default=False)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    publicado_en = models.DateTimeField(blank=True, null=True)
+    publicado_seq = models.BigIntegerField(blank=True, null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'app"."alertas_outbox'
+        verbose_name = "Evento de alerta en outbox"
+        verbose_name_plural = "Outbox de alertas"
+
+
+class DisponibilidadEnfermeria(models.Model):
+    """
+    Disponibilidad, ubicación y carga máxima de cada enfermero para el despacho automático (ver alerts/dispatch.py).
+    """
+
+    enfermero = models.OneToOneField(Usuario, on_delete=models.CASCADE, db_column="enfermero_id", primary_key=True, related_name="disponibilidad")
+    disponible = models.BooleanField(default=False)
+    latitud = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    longitud = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    max_carga = models.PositiveSmallIntegerField(default=3)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        managed = False
+        db_table = 'app"."enfermeria_disponibilidad'
+        verbose_name = "Disponibilidad de enfermería"
+        verbose_name_plural = "Disponibilidad de enfermería"
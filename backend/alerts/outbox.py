@@ -0,0 +1,364 @@
+"""
+Outbox transaccional para los eventos de alertas.
+
+Las vistas no publican en la capa de canales: ``enqueue`` escribe el evento en
+``app.alertas_outbox`` dentro de la misma transacción que ``Alerta``/``EventoAlerta``.
+Si la petición hace rollback el evento desaparece con ella, y la respuesta HTTP no
+espera al fan-out por WebSocket.
+
+Un relay drena la tabla por lotes con ``SELECT ... FOR UPDATE SKIP LOCKED``, marca
+``publicado_en``/``publicado_seq``, confirma y solo entonces publica en los grupos destino:
+la transacción no espera a la capa de canales. Si la capa falla (o el relay cae) tras el
+commit, el lote no se reenvía en vivo; sigue en el buffer de replay y los clientes lo
+recuperan al reconectar con ``last_seq``.
+
+- Producción: ``manage.py relay_alert_outbox`` con una capa de canales compartida (``CHANNEL_LAYER=postgres`` o Redis)
+  y ``ALERTS_OUTBOX["IN_PROCESS"] = False``.
+- Desarrollo (``IN_PROCESS``): cada commit despierta un hilo daemon del propio worker
+  que drena la tabla; necesario con InMemoryChannelLayer, que no se comparte entre procesos.
+  Sus colas son ``asyncio.Queue`` del bucle del servidor ASGI, así que el hilo no publica
+  desde un bucle propio: los consumidores registran ese bucle (``bind_event_loop``) y el
+  envío se programa en él con ``run_coroutine_threadsafe``.
+
+En ambos casos el relay borra los eventos ya publicados fuera de ``RETENTION`` como mucho
+una vez cada ``PURGE_INTERVAL`` segundos (``purge_published``).
+
+Grupos: ``alerts.nurses`` (enfermería y administración, todas las alertas) y ``alerts.user.<paciente_id>``
+(cada paciente, solo las suyas); las filas ``solo_paciente`` (p. ej. el resumen por
+paciente de un cambio masivo) van únicamente al grupo del paciente. El payload lleva la
+instantánea de ``AlertaReadSerializer`` en ``"alerta"``, así que los clientes no necesitan
+volver a pedir ``GET /api/alerts/:id``.
+
+Reanudación: cada evento lleva como ``seq`` su ``publicado_seq``, que el relay toma de la
+secuencia ``app.alertas_outbox_publicado_seq`` al publicarlo. No sirve el id: se asigna en
+el INSERT y dos transacciones pueden confirmar en orden inverso, así que un cliente que ya
+vio el id 101 nunca recibiría el 100 al reanudar. Cada lote se confirma y se envía bajo un
+advisory lock de sesión (``RELAY_LOCK``), de modo que los relays se turnan: ``publicado_seq``
+crece en el mismo orden en que se confirman los lotes (cuando un ``seq`` es visible, todos
+los menores ya lo son) y los sockets reciben los eventos en ese orden.
+
+Los eventos publicados se conservan ``RETENTION`` segundos como buffer de replay. Un socket
+que reconecta con ``?last_seq=N`` recibe solo los eventos de su ámbito con ``seq > N``
+(``replay_since``); si el buffer ya no llega hasta N o faltan más de ``REPLAY_LIMIT``
+eventos, recibe en su lugar una instantánea de las alertas abiertas (``snapshot_for``).
+
+Lag del relay: ``publicado_en - creado_en`` (métrica ``alerts.outbox.lag``);
+``outbox_status()`` devuelve la cola pendiente y la antigüedad del evento más viejo.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from common.metrics import registry
+from .models import Alerta, AlertaOutbox
+from .serializers import alert_rows
+
+logger = logging.getLogger(__name__)
+
+NURSES_GROUP = "alerts.nurses"
+# Roles que ven todas las alertas (los mismos que pueden actuar sobre ellas en la API REST)
+STAFF_ROLES = ("nurse", "admin")
+
+# Clave del advisory lock (de sesión) que serializa los lotes de todos los relays
+RELAY_LOCK = 0x616C7274  # "alrt"
+
+published_counter = registry.counter("alerts.outbox.published", "Eventos de alertas publicados por el relay")
+lag_summary = registry.summary("alerts.outbox.lag", "Segundos entre la escritura en el outbox y la publicación")
+enqueued_counter = registry.counter("alerts.outbox.enqueued", "Eventos de alertas escritos en el outbox")
+publish_failures = registry.counter("alerts.outbox.publish_failures", "Lotes confirmados que no se pudieron enviar a la capa de canales")
+pending_gauge = registry.gauge("alerts.outbox.pending", "Eventos pendientes vistos por el relay en el último lote")
+
+
+def _config(name: str, default):
+    return getattr(settings, "ALERTS_OUTBOX", {}).get(name, default)
+
+
+# Bucle del servidor ASGI de este proceso, donde viven las colas de los consumidores
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def bind_event_loop() -> None:
+    """
+    Registra el bucle en curso como destino de las publicaciones del relay en este proceso.
+    La llaman los consumidores (WebSocket y SSE) al conectar.
+    """
+    global _event_loop
+    _event_loop = asyncio.get_running_loop()
+
+
+def user_group(user_id: int) -> str:
+    return f"alerts.user.{user_id}"
+
+
+def sees_all(user) -> bool:
+    return user.role in STAFF_ROLES
+
+
+def groups_for(user) -> List[str]:
+    """
+    Grupos a los que se suscribe un socket según el rol del usuario autenticado.
+    """
+    if sees_all(user):
+        return [NURSES_GROUP]
+    return [user_group(user.id)]
+
+
+def enqueue(event_type: str, payload: Dict[str, Any], paciente_id: Optional[int] = None, solo_paciente: bool = False) -> AlertaOutbox:
+    """
+    Registra un evento en la transacción en curso. Se publica tras el commit a
+    enfermería y, si la alerta tiene paciente, a su grupo (``solo_paciente``: únicamente a su grupo).
+    """
+    row = AlertaOutbox.objects.create(evento=event_type, payload=payload, paciente_id=paciente_id, solo_paciente=solo_paciente)
+    enqueued_counter.inc()
+    if _config("IN_PROCESS", True):
+        transaction.on_commit(in_process_relay.wake)
+    return row
+
+
+def emit_alert_event(event_type: str, snapshot: Dict[str, Any], **extra: Any) -> None:
+    """
+    Encola el evento de WebSocket en la transacción en curso; el relay lo publica
+    tras el commit a enfermería y al paciente de la alerta.
+
+    ``snapshot`` es la salida de AlertaReadSerializer y viaja en ``payload["alerta"]``.
+    """
+    payload = {"id": snapshot["id"], **extra, "alerta": snapshot}
+    enqueue(event_type, payload, paciente_id=snapshot["paciente_id"])
+
+
+def emit_bulk_event(event_type: str, snapshots: List[Dict[str, Any]], **extra: Any) -> None:
+    """
+    Un único evento para enfermería con todas las alertas afectadas y, por cada
+    paciente, otro solo con las suyas (filas ``solo_paciente``), en un solo INSERT.
+    """
+    by_patient: Dict[int, List[Dict[str, Any]]] = {}
+    for snapshot in snapshots:
+        if snapshot["paciente_id"] is not None:
+            by_patient.setdefault(snapshot["paciente_id"], []).append(snapshot)
+
+    def payload(items):
+        return {**extra, "ids": [item["id"] for item in items], "alertas": items}
+
+    rows = [AlertaOutbox(evento=event_type, payload=payload(snapshots))]
+    rows += [
+        AlertaOutbox(evento=event_type, payload=payload(items), paciente_id=paciente_id, solo_paciente=True)
+        for paciente_id, items in by_patient.items()
+    ]
+    AlertaOutbox.objects.bulk_create(rows)
+    enqueued_counter.inc(len(rows))
+    if _config("IN_PROCESS", True):
+        transaction.on_commit(in_process_relay.wake)
+
+
+async def _publish(messages: List[Tuple[str, Dict[str, Any]]]) -> None:
+    channel_layer = get_channel_layer()
+    for group, message in messages:
+        await channel_layer.group_send(group, message)
+
+
+def _send(messages: List[Tuple[str, Dict[str, Any]]]) -> None:
+    loop = _event_loop
+    if loop is None or not loop.is_running():
+        # Sin consumidores en este proceso (relay dedicado): la capa es compartida entre procesos
+        async_to_sync(_publish)(messages)
+        return
+    future = asyncio.run_coroutine_threadsafe(_publish(messages), loop)
+    try:
+        future.result(timeout=float(_config("PUBLISH_TIMEOUT", 10)))
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def _message(seq: int, event_type: str, payload: Any) -> Dict[str, Any]:
+    # Django desactiva la decodificación de JSONB en el driver: llega como texto
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+    return {"type": "alerts.message", "seq": seq, "event": event_type, "payload": payload}
+
+
+def _targets(paciente_id: Optional[int], solo_paciente: bool = False) -> List[str]:
+    if paciente_id is None:
+        return [NURSES_GROUP]
+    if solo_paciente:
+        return [user_group(paciente_id)]
+    return [NURSES_GROUP, user_group(paciente_id)]
+
+
+def relay_batch(batch_size: Optional[int] = None) -> int:
+    """
+    Publica un lote de eventos pendientes. Devuelve cuántos se publicaron.
+    """
+    size = batch_size or int(_config("BATCH_SIZE", 200))
+    with connection.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", [RELAY_LOCK])
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cur:
+                cur.execute(
+                    "SELECT id, evento, payload, paciente_id, solo_paciente, creado_en FROM app.alertas_outbox "
+                    "WHERE publicado_en IS NULL ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED",
+                    [size],
+                )
+                rows: List[Tuple[int, str, Any, Optional[int], bool, Any]] = cur.fetchall()
+                pending_gauge.set(len(rows))
+                if not rows:
+                    return 0
+                cur.execute("SELECT nextval('app.alertas_outbox_publicado_seq') FROM generate_series(1, %s)", [len(rows)])
+                seqs = sorted(seq for (seq,) in cur.fetchall())
+                now = timezone.now()
+                cur.execute(
+                    "UPDATE app.alertas_outbox o SET publicado_en = %s, publicado_seq = p.seq "
+                    "FROM unnest(%s::bigint[], %s::bigint[]) AS p(id, seq) WHERE o.id = p.id",
+                    [now, [r[0] for r in rows], seqs],
+                )
+        messages = []
+        for seq, (_, event, payload, paciente_id, solo_paciente, _) in zip(seqs, rows):
+            message = _message(seq, event, payload)
+            messages.extend((group, message) for group in _targets(paciente_id, solo_paciente))
+        try:
+            _send(messages)
+        except Exception:
+            publish_failures.inc()
+            logger.exception("No se pudieron enviar en vivo los eventos %s-%s; quedan en el buffer de replay", seqs[0], seqs[-1])
+    finally:
+        with connection.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", [RELAY_LOCK])
+    for *_, created in rows:
+        lag_summary.observe(max(0.0, (now - created).total_seconds()))
+    published_counter.inc(len(rows))
+    return len(rows)
+
+
+def drain(batch_size: Optional[int] = None) -> int:
+    """
+    Publica lotes hasta vaciar la cola (o hasta que otro relay tenga bloqueado el resto).
+    """
+    size = batch_size or int(_config("BATCH_SIZE", 200))
+    total = 0
+    while True:
+        sent = relay_batch(size)
+        total += sent
+        if sent < size:
+            return total
+
+
+def purge_published(retention: Optional[float] = None) -> int:
+    """
+    Borra eventos publicados hace más de ``RETENTION`` segundos. El último publicado se
+    conserva siempre: marca hasta dónde llega el buffer de replay.
+    """
+    seconds = float(_config("RETENTION", 3600) if retention is None else retention)
+    cutoff = timezone.now() - timedelta(seconds=seconds)
+    with connection.cursor() as cur:
+        cur.execute(
+            "DELETE FROM app.alertas_outbox WHERE publicado_en IS NOT NULL AND publicado_en < %s "
+            "AND publicado_seq < (SELECT MAX(publicado_seq) FROM app.alertas_outbox)",
+            [cutoff],
+        )
+        return cur.rowcount
+
+
+def replay_since(user, last_seq: int, limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Eventos con ``seq > last_seq`` visibles para ``user``, en orden. None si el buffer
+    ya no cubre esa posición o si faltan más de ``limit`` eventos (hay que resincronizar).
+    """
+    limit = limit or int(_config("REPLAY_LIMIT", 500))
+    scope, params = ("AND NOT solo_paciente", []) if sees_all(user) else ("AND paciente_id = %s", [user.id])
+    with connection.cursor() as cur:
+        cur.execute("SELECT MIN(publicado_seq) FROM app.alertas_outbox")
+        (oldest,) = cur.fetchone()
+        if oldest is not None and last_seq + 1 < oldest:
+            return None
+        cur.execute(
+            f"SELECT publicado_seq, evento, payload FROM app.alertas_outbox WHERE publicado_seq > %s {scope} "
+            "ORDER BY publicado_seq LIMIT %s",
+            [last_seq, *params, limit + 1],
+        )
+        rows = cur.fetchall()
+    if len(rows) > limit:
+        return None
+    return [_message(seq, event, payload) for seq, event, payload in rows]
+
+
+def snapshot_for(user) -> Dict[str, Any]:
+    """
+    Alertas abiertas visibles para ``user`` y el ``seq`` actual, para resincronizar un cliente.
+    """
+    with connection.cursor() as cur:
+        cur.execute("SELECT COALESCE(MAX(publicado_seq), 0) FROM app.alertas_outbox")
+        (seq,) = cur.fetchone()
+    qs = Alerta.objects.exclude(estado="resuelta")
+    if not sees_all(user):
+        qs = qs.filter(paciente_id=user.id)
+    rows = alert_rows.values(qs).order_by("-creado_en", "-id")[: int(_config("REPLAY_LIMIT", 500))]
+    return {"seq": seq, "alertas": alert_rows.many(rows)}
+
+
+def outbox_status() -> Dict[str, Any]:
+    """
+    Eventos pendientes y segundos de antigüedad del más viejo (lag actual del relay).
+    """
+    with connection.cursor() as cur:
+        cur.execute("SELECT COUNT(*), MIN(creado_en) FROM app.alertas_outbox WHERE publicado_en IS NULL")
+        pending, oldest = cur.fetchone()
+    lag = (timezone.now() - oldest).total_seconds() if oldest is not None else 0.0
+    return {"pending": pending, "lag_seconds": round(max(0.0, lag), 3)}
+
+
+class InProcessRelay:
+    """
+    Hilo daemon que drena el outbox tras cada commit (y cada ``POLL_INTERVAL`` segundos).
+    """
+
+    def __init__(self) -> None:
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._last_purge = time.monotonic()
+
+    def wake(self) -> None:
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="alerts-outbox-relay", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(float(_config("POLL_INTERVAL", 1.0)))
+            self._wakeup.clear()
+            try:
+                drain()
+                self._purge()
+            except Exception:
+                logger.exception("No se pudo publicar el outbox de alertas; se reintentará")
+            finally:
+                connection.close()
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        if now - self._last_purge < float(_config("PURGE_INTERVAL", 300)):
+            return
+        self._last_purge = now
+        purge_published()
+
+
+in_process_relay = InProcessRelay()
@@ -0,0 +1,200 @@
+"""
+Particionado mensual de ``app.eventos_alerta`` (solo se añaden filas).
+
+La tabla queda particionada por rango de ``creado_en`` (meses UTC):
+``app.eventos_alerta_YYYYMM`` más ``app.eventos_alerta_default``, que recoge las filas
+de meses sin partición para que un INSERT nunca falle. Índices definidos en la tabla
+padre (se propagan a cada partición): BRIN sobre ``creado_en`` y
+``(alerta_id, creado_en)`` para la línea de tiempo de una alerta.
+
+- ``ensure``: crea las particiones del mes en curso y ``MONTHS_AHEAD`` siguientes, y
+  mueve a su partición lo que haya caído en la default.
+- ``detach_older_than``: retención por desacople de particiones completas (``DETACH`` +
+  opcionalmente ``DROP``) en lugar de un ``DELETE`` masivo.
+- ``convert_legacy``: convierte la tabla no particionada que crea ``seed_alerts`` (y la de
+  instalaciones anteriores); no hace nada si ya está particionada.
+
+Para el ORM no cambia nada: ``EventoAlerta`` sigue apuntando a ``app.eventos_alerta``.
+Mantenimiento periódico: ``manage.py maintain_alert_events`` (cron diario), que en su primera
+ejecución hace la conversión.
+"""
+
+import re
+from datetime import date, datetime, timezone as dt_timezone
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+PARENT = "app.eventos_alerta"
+DEFAULT_PARTITION = "eventos_alerta_default"
+NAME_RE = re.compile(r"^eventos_alerta_(\d{4})(\d{2})$")
+
+COLUMNS = "id, alerta_id, por_usuario_id, tipo, detalle_json, creado_en"
+
+
+def _config(name: str, default):
+    return getattr(settings, "ALERTS_EVENTS", {}).get(name, default)
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"eventos_alerta_{month:%Y%m}"
+
+
+def _bound(month: date) -> datetime:
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def is_partitioned() -> bool:
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = 'app' AND c.relname = 'eventos_alerta'"
+        )
+        row = cur.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def partitions() -> List[Tuple[str, date]]:
+    """
+    Particiones mensuales adjuntas, ``(nombre, primer día del mes)`` en orden.
+    """
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [PARENT],
+        )
+        names = [name for (name,) in cur.fetchall()]
+    result = []
+    for name in names:
+        match = NAME_RE.match(name)
+        if match:
+            result.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(result, key=lambda item: item[1])
+
+
+def _has_default(cur) -> bool:
+    cur.execute(
+        "SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass AND c.relname = %s",
+        [PARENT, DEFAULT_PARTITION],
+    )
+    return cur.fetchone() is not None
+
+
+def _create_partition(cur, month: date) -> None:
+    name, lo, hi = partition_name(month), _bound(month), _bound(add_months(month, 1))
+    cur.execute(f"SELECT COUNT(*) FROM app.{DEFAULT_PARTITION} WHERE creado_en >= %s AND creado_en < %s", [lo, hi])
+    if not cur.fetchone()[0]:
+        cur.execute(f"CREATE TABLE app.{name} PARTITION OF {PARENT} FOR VALUES FROM (%s) TO (%s)", [lo, hi])
+        return
+    # Filas de ese mes ya en la default: sacarla, crear la partición, mover y volver a adjuntarla
+    cur.execute(f"ALTER TABLE {PARENT} DETACH PARTITION app.{DEFAULT_PARTITION}")
+    cur.execute(f"CREATE TABLE app.{name} PARTITION OF {PARENT} FOR VALUES FROM (%s) TO (%s)", [lo, hi])
+    cur.execute(
+        f"WITH movidas AS (DELETE FROM app.{DEFAULT_PARTITION} WHERE creado_en >= %s AND creado_en < %s RETURNING {COLUMNS}) "
+        f"INSERT INTO app.{name} ({COLUMNS}) SELECT {COLUMNS} FROM movidas",
+        [lo, hi],
+    )
+    cur.execute(f"ALTER TABLE {PARENT} ATTACH PARTITION app.{DEFAULT_PARTITION} DEFAULT")
+
+
+@transaction.atomic
+def ensure(months_ahead: Optional[int] = None, since: Optional[date] = None) -> List[str]:
+    """
+    Crea las particiones que falten desde ``since`` (o el mes en curso) hasta
+    ``months_ahead`` meses vista y las de los meses con filas en la default. Devuelve las creadas.
+    """
+    months_ahead = int(_config("MONTHS_AHEAD", 2)) if months_ahead is None else months_ahead
+    current = month_start(timezone.now().astimezone(dt_timezone.utc))
+    first = min(month_start(since), current) if since else current
+    wanted = set()
+    month = first
+    while month <= add_months(current, months_ahead):
+        wanted.add(month)
+        month = add_months(month, 1)
+
+    created = []
+    with connection.cursor() as cur:
+        if not _has_default(cur):
+            cur.execute(f"CREATE TABLE app.{DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT")
+        cur.execute(f"SELECT DISTINCT date_trunc('month', creado_en AT TIME ZONE 'UTC')::date FROM app.{DEFAULT_PARTITION}")
+        wanted.update(row[0] for row in cur.fetchall())
+        existing = {month for _, month in partitions()}
+        for month in sorted(wanted - existing):
+            _create_partition(cur, month)
+            created.append(partition_name(month))
+    return created
+
+
+def detach_older_than(months: int, drop: bool = False) -> List[str]:
+    """
+    Desacopla (y con ``drop`` elimina) las particiones cuyo mes terminó hace más de ``months`` meses.
+    """
+    cutoff = add_months(month_start(timezone.now().astimezone(dt_timezone.utc)), -months)
+    detached = []
+    for name, month in partitions():
+        if add_months(month, 1) > cutoff:
+            break
+        with transaction.atomic(), connection.cursor() as cur:
+            cur.execute(f"ALTER TABLE {PARENT} DETACH PARTITION app.{name}")
+            if drop:
+                cur.execute(f"DROP TABLE app.{name}")
+        detached.append(name)
+    return detached
+
+
+@transaction.atomic
+def convert_legacy() -> Optional[int]:
+    """
+    Pasa una ``app.eventos_alerta`` no particionada al esquema particionado conservando
+    ids y secuencia. Devuelve las filas copiadas, o ``None`` si ya estaba particionada.
+    """
+    with connection.cursor() as cur:
+        # Bloqueo exclusivo antes de comprobar: dos ejecuciones simultáneas no convierten dos veces
+        cur.execute(f"LOCK TABLE {PARENT} IN ACCESS EXCLUSIVE MODE")
+        if is_partitioned():
+            return None
+        cur.execute("ALTER TABLE app.eventos_alerta RENAME TO eventos_alerta_legacy")
+        cur.execute("ALTER TABLE app.eventos_alerta_legacy RENAME CONSTRAINT eventos_alerta_pkey TO eventos_alerta_legacy_pkey")
+        cur.execute("DROP INDEX IF EXISTS app.eventos_alerta_alerta_idx, app.eventos_alerta_creado_brin")
+        cur.execute(
+            f"""
+            CREATE TABLE {PARENT} (
+              id BIGINT NOT NULL DEFAULT nextval('app.eventos_alerta_id_seq'),
+              alerta_id BIGINT NOT NULL REFERENCES app.alertas(id) ON DELETE CASCADE,
+              por_usuario_id BIGINT REFERENCES app.usuarios(id),
+              tipo VARCHAR(32) NOT NULL CHECK (tipo IN ('creada','asignada','cambio_estado','nota','adjunto')),
+              detalle_json JSONB NOT NULL DEFAULT '{{}}'::JSONB,
+              creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              PRIMARY KEY (id, creado_en)
+            ) PARTITION BY RANGE (creado_en)
+            """
+        )
+        cur.execute(f"ALTER SEQUENCE app.eventos_alerta_id_seq OWNED BY {PARENT}.id")
+        cur.execute(INDEX_SQL)
+        cur.execute("SELECT MIN(creado_en) FROM app.eventos_alerta_legacy")
+        (oldest,) = cur.fetchone()
+    ensure(since=month_start(oldest.astimezone(dt_timezone.utc)) if oldest else None)
+    with connection.cursor() as cur:
+        cur.execute(f"INSERT INTO {PARENT} ({COLUMNS}) SELECT {COLUMNS} FROM app.eventos_alerta_legacy")
+        copied = cur.rowcount
+        cur.execute("DROP TABLE app.eventos_alerta_legacy")
+    return copied
+
+
+INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS eventos_alerta_alerta_idx ON app.eventos_alerta (alerta_id, creado_en);
+CREATE INDEX IF NOT EXISTS eventos_alerta_creado_brin ON app.eventos_alerta USING brin (creado_en);
+"""
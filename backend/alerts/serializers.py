@@ -1,9 +1,12 @@
 from typing import Any, Dict
 
+from django.conf import settings
 from rest_framework import serializers
 
 from accounts.models import Usuario
-from .models import TipoAlerta, Alerta, EventoAlerta
+from common import catalogs
+from common.fastread import RowSerializer
+from .models import TipoAlerta, Alerta, EventoAlerta, DisponibilidadEnfermeria
 
 
 class TipoAlertaSerializer(serializers.ModelSerializer):
@@ -14,8 +17,8 @@ class TipoAlertaSerializer(serializers.ModelSerializer):
 
 class AlertaReadSerializer(serializers.ModelSerializer):
     tipo_alerta = TipoAlertaSerializer()
-    paciente_id = serializers.IntegerField(source="paciente.id", allow_null=True)
-    asignado_a_id = serializers.IntegerField(source="asignado_a.id", allow_null=True)
+    paciente_id = serializers.IntegerField(allow_null=True)
+    asignado_a_id = serializers.IntegerField(allow_null=True)
 
     class Meta:
         model = Alerta
@@ -44,22 +47,106 @@ class AlertaCreateSerializer(serializers.Serializer):
     def validate(self, data: Dict[str, Any]) -> Dict[str, Any]:
         code = data.get("tipo_alerta_codigo", "")
         if code:
-            tipo = TipoAlerta.objects.filter(codigo__iexact=code, activo=True).first()
+            tipo = catalogs.tipos_alerta.get(code)
             if not tipo:
                 raise serializers.ValidationError({"tipo_alerta_codigo": "Tipo de alerta inválido"})
             data["_tipo_obj"] = tipo
         return data
 
 
+class AlertaIngestItemSerializer(AlertaCreateSerializer):
+    idempotency_key = serializers.CharField(max_length=128)
+    fuente = serializers.ChoiceField(choices=("app", "kiosco", "admin"), default="kiosco")
+
+
+class AlertaIngestSerializer(serializers.Serializer):
+    alertas = AlertaIngestItemSerializer(many=True, allow_empty=False)
+
+    def validate_alertas(self, value):
+        max_batch = int(getattr(settings, "ALERTS_INGEST", {}).get("MAX_BATCH", 500))
+        if len(value) > max_batch:
+            raise serializers.ValidationError(f"Máximo {max_batch} alertas por lote")
+        return value
+
+
+def _parse_bbox(value: str):
+    try:
+        lat_min, lon_min, lat_max, lon_max = (float(v) for v in value.split(","))
+    except ValueError:
+        raise serializers.ValidationError("Formato: lat_min,lon_min,lat_max,lon_max")
+    if not (-90 <= lat_min <= lat_max <= 90 and -180 <= lon_min <= lon_max <= 180):
+        raise serializers.ValidationError("Caja fuera de rango")
+    return lat_min, lon_min, lat_max, lon_max
+
+
+class AlertaGeoQuerySerializer(serializers.Serializer):
+    """
+    Radio (lat, lon, radius en metros) o caja (bbox=lat_min,lon_min,lat_max,lon_max).
+    """
+
+    lat = serializers.FloatField(required=False, min_value=-90, max_value=90)
+    lon = serializers.FloatField(required=False, min_value=-180, max_value=180)
+    radius = serializers.FloatField(required=False, min_value=1, max_value=50000)
+    bbox = serializers.CharField(required=False)
+    estado = serializers.ChoiceField(choices=("pendiente", "en_curso", "resuelta"), required=False)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=500, default=200)
+
+    def validate_bbox(self, value: str):
+        return _parse_bbox(value)
+
+    def validate(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        has_circle = all(data.get(k) is not None for k in ("lat", "lon", "radius"))
+        if has_circle == ("bbox" in data):
+            raise serializers.ValidationError("Indique lat/lon/radius o bbox (uno de los dos)")
+        return data
+
+
+class AlertaClustersQuerySerializer(serializers.Serializer):
+    bbox = serializers.CharField()
+    zoom = serializers.IntegerField(min_value=0, max_value=22)
+    desde = serializers.DateTimeField(required=False)
+    hasta = serializers.DateTimeField(required=False)
+
+    def validate_bbox(self, value: str):
+        return _parse_bbox(value)
+
+    def validate(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        if data.get("desde") and data.get("hasta") and data["desde"] >= data["hasta"]:
+            raise serializers.ValidationError({"hasta": "Debe ser posterior a desde"})
+        return data
+
+
 class AlertaAssignSerializer(serializers.Serializer):
     asignado_a_id = serializers.IntegerField(required=False)
 
 
+class DisponibilidadSerializer(serializers.ModelSerializer):
+    max_carga = serializers.IntegerField(min_value=0, max_value=20, required=False)
+
+    class Meta:
+        model = DisponibilidadEnfermeria
+        fields = ["disponible", "latitud", "longitud", "max_carga", "actualizado_en"]
+        read_only_fields = ["actualizado_en"]
+
+    def validate(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        if ("latitud" in data) != ("longitud" in data):
+            raise serializers.ValidationError("latitud y longitud van juntas")
+        return data
+
+
 class AlertaStatusSerializer(serializers.Serializer):
     estado = serializers.ChoiceField(choices=("en_curso", "resuelta"))
 
 
+class AlertaBulkStatusSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=1, max_length=500)
+    estado = serializers.ChoiceField(choices=("en_curso", "resuelta"))
+
+
 class AlertaEventSerializer(serializers.Serializer):
     tipo = serializers.ChoiceField(choices=("nota", "adjunto", "cambio_estado"))
     detalle_json = serializers.JSONField(required=False)
 
+
+# Listados: misma salida que los serializers de lectura, desde filas values() (ver common.fastread)
+alert_rows = RowSerializer(AlertaReadSerializer)
@@ -0,0 +1,147 @@
+"""
+Server-Sent Events de alertas: alternativa al WebSocket para redes cuyos proxies lo cortan.
+
+``GET /api/alerts/stream?token=<access JWT>`` (``text/event-stream``). Es una app ASGI
+propia montada en ``config.asgi`` delante de Django: cada conexión es una corrutina y un
+canal de la capa de canales, igual que un socket de ``AlertsConsumer``; no ocupa un hilo
+de worker síncrono mientras espera.
+
+- Mismos grupos y mensajes que el WebSocket (``alerts.outbox``): cada evento sale como
+  ``id: <seq>``, ``event: <evento>`` y ``data: {"event", "seq", "payload"}``.
+- Reanudación: ``EventSource`` reenvía ``Last-Event-ID`` al reconectar (o ``?last_event_id=``
+  en la primera conexión); se reenvía lo perdido o un ``resync`` con las alertas abiertas.
+- Latido: un comentario ``: ping`` cada ``ALERTS_SSE["HEARTBEAT"]`` segundos mantiene viva la
+  conexión a través de proxies y detecta clientes caídos.
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from rest_framework import exceptions
+
+from accounts.authentication import authenticate_token
+from common.metrics import registry
+from . import outbox
+
+open_streams = registry.gauge("alerts.sse.open", "Conexiones SSE de alertas abiertas")
+
+
+def _config(name: str, default):
+    return getattr(settings, "ALERTS_SSE", {}).get(name, default)
+
+
+def format_event(event: Optional[str], seq: Optional[int], payload: Any) -> bytes:
+    data = json.dumps({"event": event, "seq": seq, "payload": payload})
+    head = f"id: {seq}\n" if seq is not None else ""
+    return f"{head}event: {event}\ndata: {data}\n\n".encode("utf-8")
+
+
+class AlertsEventStream:
+    """
+    App ASGI (scope ``http``) del stream de alertas.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope.get("method") != "GET":
+            await self._respond(send, 405, {"detail": "Método no permitido"})
+            return
+        params = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        user = await self._authenticate(params, headers)
+        if user is None:
+            await self._respond(send, 401, {"detail": "No autenticado"})
+            return
+
+        outbox.bind_event_loop()
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        groups = outbox.groups_for(user)
+        for group in groups:
+            await layer.group_add(group, channel)
+        open_streams.inc()
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": f"retry: {int(_config('RETRY_MS', 3000))}\n\n".encode(), "more_body": True})
+            replayed = await self._resume(send, user, self._last_event_id(params, headers))
+            await self._pump(layer, channel, receive, send, replayed)
+        finally:
+            open_streams.dec()
+            for group in groups:
+                await layer.group_discard(group, channel)
+
+    async def _pump(self, layer, channel: str, receive, send, replayed: set) -> None:
+        heartbeat = float(_config("HEARTBEAT", 15))
+        disconnect = asyncio.ensure_future(receive())
+        incoming = asyncio.ensure_future(layer.receive(channel))
+        try:
+            while True:
+                done, _ = await asyncio.wait({disconnect, incoming}, timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED)
+                if disconnect in done:
+                    if disconnect.result().get("type") == "http.disconnect":
+                        return
+                    disconnect = asyncio.ensure_future(receive())
+                if incoming in done:
+                    message: Dict[str, Any] = incoming.result()
+                    incoming = asyncio.ensure_future(layer.receive(channel))
+                    seq = message.get("seq")
+                    if seq in replayed:
+                        replayed.discard(seq)
+                        continue
+                    await send({"type": "http.response.body", "body": format_event(message.get("event"), seq, message.get("payload")), "more_body": True})
+                elif not done:
+                    await send({"type": "http.response.body", "body": b": ping\n\n", "more_body": True})
+        finally:
+            for task in (disconnect, incoming):
+                task.cancel()
+
+    async def _resume(self, send, user, last_seq: Optional[int]) -> set:
+        if last_seq is None:
+            return set()
+        messages = await database_sync_to_async(outbox.replay_since)(user, last_seq)
+        if messages is None:
+            snapshot = await database_sync_to_async(outbox.snapshot_for)(user)
+            body = format_event("resync", snapshot["seq"], {"alertas": snapshot["alertas"]})
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+            return set()
+        for message in messages:
+            await send({"type": "http.response.body", "body": format_event(message["event"], message["seq"], message["payload"]), "more_body": True})
+        return {message["seq"] for message in messages}
+
+    @staticmethod
+    def _last_event_id(params, headers) -> Optional[int]:
+        raw = headers.get("last-event-id") or (params.get("last_event_id") or [None])[0]
+        try:
+            return int(raw) if raw else None
+        except ValueError:
+            return None
+
+    @staticmethod
+    async def _authenticate(params, headers):
+        token = (params.get("token") or [None])[0]
+        auth = headers.get("authorization", "")
+        if not token and auth.lower().startswith("bearer "):
+            token = auth[7:].strip()
+        if not token:
+            return None
+        try:
+            return await database_sync_to_async(authenticate_token)(token)
+        except exceptions.AuthenticationFailed:
+            return None
+
+    @staticmethod
+    async def _respond(send, status: int, body: Dict[str, Any]) -> None:
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": json.dumps(body).encode("utf-8")})
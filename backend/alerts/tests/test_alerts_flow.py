@@ -1,9 +1,17 @@
-from django.test import TestCase
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.db import connection
 from rest_framework.test import APIClient
 from django.contrib.auth.hashers import make_password
 
+from common import catalogs
 from accounts.jwt_utils import create_access_token
 
 
@@ -45,7 +53,8 @@ CREATE TABLE IF NOT EXISTS app.alertas (
   creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW(),
   asignado_a_id BIGINT REFERENCES app.usuarios(id),
   resuelto_en TIMESTAMPTZ,
-  fuente VARCHAR(16) NOT NULL DEFAULT 'app'
+  fuente VARCHAR(16) NOT NULL DEFAULT 'app',
+  geohash VARCHAR(12)
 );
 
 CREATE TABLE IF NOT EXISTS app.eventos_alerta (
@@ -57,7 +66,62 @@ CREATE TABLE IF NOT EXISTS app.eventos_alerta (
   creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
-INSERT INTO app.roles (nombre) VALUES ('user'),('nurse') ON CONFLICT (nombre) DO NOTHING;
+CREATE TABLE IF NOT EXISTS app.alertas_outbox (
+  id BIGSERIAL PRIMARY KEY,
+  evento VARCHAR(32) NOT NULL,
+  payload JSONB NOT NULL DEFAULT '{}'::JSONB,
+  paciente_id BIGINT,
+  solo_paciente BOOLEAN NOT NULL DEFAULT FALSE,
+  creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  publicado_en TIMESTAMPTZ,
+  publicado_seq BIGINT UNIQUE
+);
+CREATE SEQUENCE IF NOT EXISTS app.alertas_outbox_publicado_seq;
+
+CREATE TABLE IF NOT EXISTS app.alertas_contadores (
+  estado VARCHAR(20) NOT NULL,
+  tipo_alerta_id BIGINT NOT NULL DEFAULT 0,
+  fuente VARCHAR(16) NOT NULL,
+  shard SMALLINT NOT NULL DEFAULT 0,
+  total BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (estado, tipo_alerta_id, fuente, shard)
+);
+
+CREATE TABLE IF NOT EXISTS app.alertas_latencias (
+  metrica VARCHAR(16) NOT NULL,
+  bucket INTEGER NOT NULL,
+  total BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (metrica, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS app.alertas_idempotencia (
+  clave BYTEA PRIMARY KEY,
+  alerta_id BIGINT,
+  creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS app.adjuntos (
+  id BIGSERIAL PRIMARY KEY,
+  propietario_tabla VARCHAR(32) NOT NULL,
+  propietario_id BIGINT NOT NULL,
+  nombre_archivo TEXT NOT NULL,
+  mime VARCHAR(100) NOT NULL,
+  ruta_storage TEXT NOT NULL UNIQUE,
+  tamano_bytes INTEGER NOT NULL,
+  creado_por_id BIGINT NOT NULL REFERENCES app.usuarios(id),
+  creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS app.enfermeria_disponibilidad (
+  enfermero_id BIGINT PRIMARY KEY REFERENCES app.usuarios(id) ON DELETE CASCADE,
+  disponible BOOLEAN NOT NULL DEFAULT FALSE,
+  latitud NUMERIC(9,6),
+  longitud NUMERIC(9,6),
+  max_carga SMALLINT NOT NULL DEFAULT 3,
+  actualizado_en TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO app.roles (nombre) VALUES ('user'),('nurse'),('admin') ON CONFLICT (nombre) DO NOTHING;
 INSERT INTO app.tipos_alerta (codigo, nombre, activo) VALUES ('trauma','Trauma', TRUE) ON CONFLICT (codigo) DO NOTHING;
 """
 
@@ -68,6 +132,8 @@ class AlertsFlowTests(TestCase):
         super().setUpClass()
         with connection.cursor() as cursor:
             cursor.execute(DDL)
+        # Las tablas de catálogo se recrean por clase de test: descartar lo cacheado
+        catalogs.invalidate_all()
         from accounts.models import Usuario, Role
         nurse_role = Role.objects.get(nombre="nurse")
         user_role = Role.objects.get(nombre="user")
@@ -75,6 +141,8 @@ class AlertsFlowTests(TestCase):
         cls.patient = Usuario.objects.create(email="patient3@example.com", pass_hash=make_password("Secret123!"), rol=user_role, activo=True)
         cls.user_access = create_access_token({"sub": str(cls.patient.id), "email": cls.patient.email, "role": "user"}, 600)
         cls.nurse_access = create_access_token({"sub": str(cls.nurse.id), "email": cls.nurse.email, "role": "nurse"}, 600)
+        cls.admin = Usuario.objects.create(email="admin3@example.com", pass_hash="x", rol=Role.objects.get(nombre="admin"), activo=True)
+        cls.admin_access = create_access_token({"sub": str(cls.admin.id), "email": cls.admin.email, "role": "admin"}, 600)
 
     def test_full_alert_flow(self):
         # User crea alerta
@@ -101,3 +169,717 @@ class AlertsFlowTests(TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(res.data["estado"], "resuelta")
 
+
+    def test_alerts_cursor_pagination(self):
+        from alerts.models import Alerta
+
+        ids = [Alerta.objects.create(paciente_id=self.patient.id, descripcion=f"p{i}").id for i in range(3)]
+        # Mismo creado_en para forzar el desempate por id
+        Alerta.objects.filter(id__in=ids).update(creado_en=Alerta.objects.get(id=ids[0]).creado_en)
+
+        c = APIClient()
+        c.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user_access}")
+        res = c.get(reverse("alerts"), {"page_size": 2})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([a["id"] for a in res.data["results"]], [ids[2], ids[1]])
+        self.assertIsNotNone(res.data["next_cursor"])
+
+        res = c.get(reverse("alerts"), {"page_size": 2, "cursor": res.data["next_cursor"]})
+        self.assertEqual([a["id"] for a in res.data["results"]], [ids[0]])
+        self.assertIsNone(res.data["next"])
+
+        # Clientes antiguos: lista plana, con cursor en cabeceras si hay más
+        with self.settings(KEYSET_LEGACY_MAX_PAGE_SIZE=1):
+            res = c.get(reverse("alerts"))
+        self.assertEqual([a["id"] for a in res.data], [ids[2]])
+        self.assertIn("X-Next-Cursor", res)
+
+        self.assertEqual(c.get(reverse("alerts"), {"cursor": "basura"}).status_code, 400)
+
+    def test_alerts_list_constant_queries(self):
+        from alerts.models import Alerta, TipoAlerta
+        from alerts.serializers import AlertaReadSerializer
+
+        trauma = TipoAlerta.objects.get(codigo="trauma")
+        c = APIClient()
+        c.credentials(HTTP_AUTHORIZATION=f"Bearer {self.nurse_access}")
+
+        def list_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                res = c.get(reverse("alerts"))
+            self.assertEqual(res.status_code, 200)
+            return res, len(ctx.captured_queries)
+
+        Alerta.objects.create(paciente_id=self.patient.id, tipo_alerta=trauma, asignado_a_id=self.nurse.id, latitud="-17.780000")
+        _, baseline = list_queries()
+        for i in range(10):
+            Alerta.objects.create(paciente_id=self.patient.id, tipo_alerta=trauma if i % 2 else None, descripcion=f"n{i}")
+        res, queries = list_queries()
+        self.assertEqual(queries, baseline)
+
+        # Misma salida que el serializer de modelos
+        expected = AlertaReadSerializer(Alerta.objects.order_by("-creado_en", "-id"), many=True).data
+        self.assertEqual(json.loads(res.content), json.loads(json.dumps(expected, cls=DjangoJSONEncoder)))
+
+    def test_events_go_through_outbox(self):
+        from channels.layers import get_channel_layer
+        from django.db import transaction
+        from alerts import outbox
+        from alerts.models import AlertaOutbox
+
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(outbox.user_group(self.patient.id), channel)
+
+        c = APIClient()
+        c.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user_access}")
+        res = c.post(reverse("alerts"), {"descripcion": "Outbox", "tipo_alerta_codigo": "trauma"}, format="json")
+        self.assertEqual(res.status_code, 201)
+        row = AlertaOutbox.objects.get(evento="alert_created", payload__id=res.data["id"])
+        self.assertIsNone(row.publicado_en)
+
+        # Una transacción que hace rollback no deja eventos
+        pending = AlertaOutbox.objects.filter(publicado_en__isnull=True).count()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                outbox.enqueue("alert_created", {"id": -1})
+                raise RuntimeError
+        self.assertEqual(AlertaOutbox.objects.filter(publicado_en__isnull=True).count(), pending)
+
+        lag_count = outbox.lag_summary.snapshot()["count"]
+        self.assertEqual(outbox.drain(batch_size=2), pending)
+        self.assertEqual(outbox.outbox_status()["pending"], 0)
+        self.assertEqual(outbox.lag_summary.snapshot()["count"], lag_count + pending)
+        row.refresh_from_db()
+        self.assertIsNotNone(row.publicado_en)
+
+        # El evento llega al grupo del paciente con la instantánea completa
+        message = async_to_sync(layer.receive)(channel)
+        self.assertEqual(message["event"], "alert_created")
+        self.assertEqual(message["payload"]["alerta"], json.loads(json.dumps(res.data)))
+        async_to_sync(layer.group_discard)(outbox.user_group(self.patient.id), channel)
+
+        # El relay en proceso purga los publicados a intervalos, no en cada lote
+        relay = outbox.InProcessRelay()
+        with mock.patch.object(outbox, "purge_published") as purge:
+            relay._purge()
+            purge.assert_not_called()
+            with self.settings(ALERTS_OUTBOX={"PURGE_INTERVAL": 0}):
+                relay._purge()
+            purge.assert_called_once_with()
+
+    def test_websocket_groups_by_role(self):
+        from asgiref.testing import ApplicationCommunicator
+        from channels.db import database_sync_to_async
+        from alerts import outbox
+        from alerts.consumers import AlertsConsumer
+        from alerts.models import Alerta
+        from alerts.serializers import AlertaReadSerializer
+        from alerts.outbox import emit_alert_event
+
+        def socket(query: str = ""):
+            scope = {"type": "websocket", "path": "/ws/alerts", "query_string": query.encode(), "headers": [], "subprotocols": []}
+            return ApplicationCommunicator(AlertsConsumer.as_asgi(), scope)
+
+        async def connect(comm):
+            await comm.send_input({"type": "websocket.connect"})
+            return (await comm.receive_output(1))["type"]
+
+        async def receive_json(comm):
+            return json.loads((await comm.receive_output(1))["text"])
+
+        async def scenario(own_id, other_id):
+            self.assertEqual(await connect(socket()), "websocket.close")
+            nurse, patient, admin = socket(f"token={self.nurse_access}"), socket(f"token={self.user_access}"), socket(f"token={self.admin_access}")
+            self.assertEqual(await connect(nurse), "websocket.accept")
+            self.assertEqual(await connect(patient), "websocket.accept")
+            self.assertEqual(await connect(admin), "websocket.accept")
+
+            await database_sync_to_async(outbox.drain)()
+            # Enfermería y administración reciben ambas alertas; el paciente solo la suya, con la instantánea completa
+            for staff in (nurse, admin):
+                staff_events = [await receive_json(staff), await receive_json(staff)]
+                self.assertEqual({e["payload"]["id"] for e in staff_events}, {own_id, other_id})
+            own_event = await receive_json(patient)
+            self.assertEqual(own_event["payload"]["alerta"]["paciente_id"], self.patient.id)
+            self.assertTrue(await patient.receive_nothing())
+            for comm in (nurse, patient, admin):
+                await comm.send_input({"type": "websocket.disconnect", "code": 1000})
+                await comm.wait(1)
+
+        outbox.drain()
+        own = Alerta.objects.create(paciente_id=self.patient.id, descripcion="propia")
+        other = Alerta.objects.create(paciente_id=self.nurse.id, descripcion="ajena")
+        for alert in (own, other):
+            emit_alert_event("alert_created", AlertaReadSerializer(alert).data)
+        # database_sync_to_async cerraría la conexión de la transacción del test
+        with mock.patch("channels.db.close_old_connections"):
+            async_to_sync(scenario)(own.id, other.id)
+
+    def test_websocket_resume_from_last_seq(self):
+        from asgiref.testing import ApplicationCommunicator
+        from alerts import outbox
+        from alerts.consumers import AlertsConsumer
+        from alerts.models import Alerta, AlertaOutbox
+        from alerts.serializers import AlertaReadSerializer
+        from alerts.outbox import emit_alert_event
+
+        outbox.drain()
+        own = Alerta.objects.create(paciente_id=self.patient.id, descripcion="propia")
+        other = Alerta.objects.create(paciente_id=self.nurse.id, descripcion="ajena")
+        emit_alert_event("alert_created", AlertaReadSerializer(own).data)
+        emit_alert_event("alert_created", AlertaReadSerializer(other).data)
+        emit_alert_event("alert_status", AlertaReadSerializer(own).data, estado="pendiente")
+        outbox.drain()
+        seqs = list(AlertaOutbox.objects.order_by("publicado_seq").values_list("publicado_seq", flat=True))[-3:]
+
+        async def resume(token, last_seq):
+            scope = {"type": "websocket", "path": "/ws/alerts", "query_string": f"token={token}&last_seq={last_seq}".encode(), "headers": [], "subprotocols": []}
+            comm = ApplicationCommunicator(AlertsConsumer.as_asgi(), scope)
+            await comm.send_input({"type": "websocket.connect"})
+            self.assertEqual((await comm.receive_output(1))["type"], "websocket.accept")
+            received = []
+            while not await comm.receive_nothing(0.2):
+                received.append(json.loads((await comm.receive_output(1))["text"]))
+            await comm.send_input({"type": "websocket.disconnect", "code": 1000})
+            await comm.wait(1)
+            return received
+
+        with mock.patch("channels.db.close_old_connections"):
+            # Paciente: solo sus eventos posteriores a last_seq
+            received = async_to_sync(resume)(self.user_access, seqs[0])
+            self.assertEqual([(m["seq"], m["event"]) for m in received], [(seqs[2], "alert_status")])
+            # Enfermería: todos
+            received = async_to_sync(resume)(self.nurse_access, seqs[0])
+            self.assertEqual([m["seq"] for m in received], seqs[1:])
+
+            # El buffer ya no cubre la posición: instantánea de alertas abiertas
+            outbox.purge_published(retention=-1)
+            self.assertEqual(AlertaOutbox.objects.count(), 1)
+            received = async_to_sync(resume)(self.user_access, seqs[0])
+        self.assertEqual([m["event"] for m in received], ["resync"])
+        self.assertEqual(received[0]["seq"], seqs[2])
+        self.assertIn(own.id, [a["id"] for a in received[0]["payload"]["alertas"]])
+        self.assertNotIn(other.id, [a["id"] for a in received[0]["payload"]["alertas"]])
+
+    def test_sse_stream_resume_and_heartbeat(self):
+        from asgiref.testing import ApplicationCommunicator
+        from alerts import outbox
+        from alerts.models import Alerta, AlertaOutbox
+        from alerts.serializers import AlertaReadSerializer
+        from alerts.sse import AlertsEventStream
+
+        outbox.drain()
+        own = Alerta.objects.create(paciente_id=self.patient.id, descripcion="propia")
+        other = Alerta.objects.create(paciente_id=self.nurse.id, descripcion="ajena")
+        outbox.emit_alert_event("alert_created", AlertaReadSerializer(own).data)
+        outbox.emit_alert_event("alert_created", AlertaReadSerializer(other).data)
+        outbox.emit_alert_event("alert_status", AlertaReadSerializer(own).data, estado="pendiente")
+        outbox.drain()
+        seqs = list(AlertaOutbox.objects.order_by("publicado_seq").values_list("publicado_seq", flat=True))[-3:]
+
+        def frames(body):
+            parsed = []
+            for block in body.split("\n\n"):
+                fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line and not line.startswith(":"))
+                if "data" in fields:
+                    parsed.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+            return parsed
+
+        async def stream(headers, query=b""):
+            scope = {"type": "http", "method": "GET", "path": "/api/alerts/stream", "query_string": query, "headers": headers}
+            comm = ApplicationCommunicator(AlertsEventStream(), scope)
+            await comm.send_input({"type": "http.request", "body": b"", "more_body": False})
+            start = await comm.receive_output(1)
+            body = ""
+            if start["status"] == 200:
+                # Los latidos no dejan el stream en silencio: leer durante una ventana fija
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + 0.35
+                while loop.time() < deadline:
+                    if not await comm.receive_nothing(0.05):
+                        body += (await comm.receive_output(1))["body"].decode()
+                await comm.send_input({"type": "http.disconnect"})
+            else:
+                body = (await comm.receive_output(1))["body"].decode()
+            await comm.wait(1)
+            return start, body
+
+        with mock.patch("channels.db.close_old_connections"), self.settings(ALERTS_SSE={"HEARTBEAT": 0.1, "RETRY_MS": 500}):
+            start, _ = async_to_sync(stream)([])
+            self.assertEqual(start["status"], 401)
+
+            # Paciente reanudando con Last-Event-ID: solo lo suyo posterior, y latidos mientras espera
+            start, body = async_to_sync(stream)([(b"last-event-id", str(seqs[0]).encode())], f"token={self.user_access}".encode())
+            self.assertEqual(start["status"], 200)
+            self.assertIn((b"content-type", b"text/event-stream; charset=utf-8"), start["headers"])
+            self.assertTrue(body.startswith("retry: 500\n\n"))
+            self.assertIn(": ping\n\n", body)
+            self.assertEqual([(seq, event) for seq, event, _ in frames(body)], [(seqs[2], "alert_status")])
+
+            # Enfermería con Authorization y ?last_event_id=
+            _, body = async_to_sync(stream)([(b"authorization", f"Bearer {self.nurse_access}".encode())], f"last_event_id={seqs[0]}".encode())
+            self.assertEqual([seq for seq, _, _ in frames(body)], seqs[1:])
+
+            # Fuera del buffer: resync con las alertas abiertas del paciente
+            outbox.purge_published(retention=-1)
+            _, body = async_to_sync(stream)([(b"last-event-id", str(seqs[0]).encode())], f"token={self.user_access}".encode())
+        ((seq, event, data),) = frames(body)
+        self.assertEqual((seq, event), (seqs[2], "resync"))
+        self.assertIn(own.id, [a["id"] for a in data["payload"]["alertas"]])
+        self.assertNotIn(other.id, [a["id"] for a in data["payload"]["alertas"]])
+
+    def test_stats_maintained_incrementally(self):
+        from alerts import stats
+
+        user = APIClient()
+        user.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user_access}")
+        nurse = APIClient()
+        nurse.credentials(HTTP_AUTHORIZATION=f"Bearer {self.nurse_access}")
+        self.assertEqual(user.get(reverse("alert-stats")).status_code, 403)
+
+        before = nurse.get(reverse("alert-stats")).data
+        ids = [user.post(reverse("alerts"), {"tipo_alerta_codigo": "trauma"}, format="json").data["id"] for _ in range(2)]
+        nurse.post(reverse("alert-assign", args=[ids[0]]), {}, format="json")
+        nurse.post(reverse("alert-status", args=[ids[0]]), {"estado": "resuelta"}, format="json")
+
+        with self.assertNumQueries(3):  # contadores + histogramas (+ carga del catálogo)
+            catalogs.tipos_alerta.invalidate()
+            res = nurse.get(reverse("alert-stats"))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["abiertas"], before["abiertas"] + 1)
+        self.assertEqual(res.data["por_tipo"]["trauma"]["resuelta"], before["por_tipo"].get("trauma", {}).get("resuelta", 0) + 1)
+        self.assertEqual(res.data["por_fuente"]["app"]["pendiente"], before["por_fuente"].get("app", {}).get("pendiente", 0) + 1)
+        for metric in ("asignacion", "resolucion"):
+            self.assertEqual(res.data["latencias"][metric]["count"], before["latencias"][metric]["count"] + 1)
+            self.assertLess(res.data["latencias"][metric]["p50"], 60)
+
+        # Reabrir y volver a resolver (individual y en lote) no añade muestras de resolución
+        nurse.post(reverse("alert-status", args=[ids[0]]), {"estado": "en_curso"}, format="json")
+        nurse.post(reverse("alert-status", args=[ids[0]]), {"estado": "resuelta"}, format="json")
+        nurse.post(reverse("alert-status", args=[ids[0]]), {"estado": "en_curso"}, format="json")
+        nurse.post(reverse("alert-bulk-status"), {"ids": ids, "estado": "resuelta"}, format="json")
+        resolutions = stats.snapshot()["latencias"]["resolucion"]["count"]
+        self.assertEqual(resolutions, before["latencias"]["resolucion"]["count"] + 2)
+
+        # Contadores repartidos en varias filas (otro hilo/proceso): se suman al leer
+        counts = stats.snapshot()["por_estado"]
+        with mock.patch.object(stats, "_shard", return_value=7):
+            stats.record_transitions([("resuelta", "pendiente", None, "app")])
+        self.assertEqual(stats.snapshot()["por_estado"]["pendiente"], counts.get("pendiente", 0) + 1)
+        stats.record_transitions([("pendiente", "resuelta", None, "app")])
+        self.assertEqual(stats.snapshot()["por_estado"], counts)
+
+        # El recálculo completo coincide con lo mantenido incrementalmente
+        stats.rebuild()
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot["por_estado"], counts)
+        self.assertEqual(snapshot["latencias"]["resolucion"]["count"], resolutions)
+
+    def test_geo_radius_and_clusters(self):
+        from datetime import timedelta
+        from django.core.cache import cache
+        from django.utils import timezone
+        from alerts.models import Alerta
+
+        cache.clear()
+        base = (-17.780000, -63.190000)
+        near = Alerta.objects.create(paciente_id=self.patient.id, latitud="-17.782000", longitud="-63.190000")  # ~222 m
+        here = Alerta.objects.create(paciente_id=self.patient.id, latitud="-17.780000", longitud="-63.190000")
+        far = Alerta.objects.create(paciente_id=self.patient.id, latitud="-17.830000", longitud="-63.190000")  # ~5.5 km
+        Alerta.objects.create(paciente_id=self.patient.id)  # sin coordenadas
+        self.assertTrue(here.geohash.startswith("6"))
+
+        c = APIClient()
+        c.credentials(HTTP_AUTHORIZATION=f"Bearer {self.nurse_access}")
+        res = c.get(reverse("alerts-geo"), {"lat": base[0], "lon": base[1], "radius": 1000})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([a["id"] for a in res.data], [here.id, near.id])
+        self.assertAlmostEqual(res.data[1]["distancia_m"], 222.4, delta=1)
+        # Con más candidatos que el tope se conservan los más cercanos
+        with mock.patch("alerts.geo.MAX_CANDIDATES", 1):
+            res = c.get(reverse("alerts-geo"), {"lat": base[0], "lon": base[1], "radius": 10000})
+        self.assertEqual([a["id"] for a in res.data], [here.id])
+
+        res = c.get(reverse("alerts-geo"), {"bbox": "-17.9,-63.3,-17.7,-63.1"})
+        self.assertEqual({a["id"] for a in res.data}, {here.id, near.id, far.id})
+        self.assertEqual(c.get(reverse("alerts-geo"), {"lat": base[0]}).status_code, 400)
+
+        user = APIClient()
+        user.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user_access}")
+        self.assertEqual(user.get(reverse("alert-clusters"), {"bbox": "-18,-64,-17,-63", "zoom": 12}).status_code, 403)
+
+        res = c.get(reverse("alert-clusters"), {"bbox": "-18,-64,-17,-63", "zoom": 12})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["precision"], 5)
+        self.assertEqual(sum(cell["total"] for cell in res.data["celdas"]), 3)
+        self.assertEqual(len(res.data["celdas"]), 2)
+        self.assertEqual(res.data["celdas"][0]["total"], 2)
+
+        # Ventanas cerradas: segunda consulta sin tocar la BD
+        params = {"bbox": "-18,-64,-17,-63", "zoom": 12, "hasta": (timezone.now() - timedelta(minutes=1)).isoformat()}
+        c.get(reverse("alert-clusters"), params)
+        with CaptureQueriesContext(connection) as ctx:
+            res = c.get(reverse("alert-clusters"), params)
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if "alertas" in q["sql"]])
+
+        # `total` sigue cacheado; `abiertas` se recalcula al caducar su TTL corto
+        Alerta.objects.filter(paciente_id=self.patient.id).update(creado_en=timezone.now() - timedelta(hours=1))
+        params["hasta"] = (timezone.now() - timedelta(minutes=2)).isoformat()
+        with self.settings(ALERTS_GEO_CLUSTER_OPEN_TTL=0):
+            before = c.get(reverse("alert-clusters"), params).data["celdas"]
+            Alerta.objects.filter(id__in=[here.id, near.id]).update(estado="resuelta")
+            after = c.get(reverse("alert-clusters"), params).data["celdas"]
+        self.assertEqual([cell["total"] for cell in after], [cell["total"] for cell in before])
+        self.assertEqual(before[0]["abiertas"], 2)
+        self.assertEqual(after[0]["abiertas"], 0)
+
+    def test_dispatch_priority_and_capacity(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from accounts.models import Usuario, Role
+        from alerts import dispatch
+        from alerts.models import Alerta, EventoAlerta, TipoAlerta
+
+        other = Usuario.objects.create(email="nurse3@example.com", pass_hash="x", rol=Role.objects.get(nombre="nurse"), activo=True)
+        other_access = create_access_token({"sub": str(other.id), "email": other.email, "role": "nurse"}, 600)
+        trauma = TipoAlerta.objects.get(codigo="trauma")
+        Alerta.objects.filter(estado="pendiente").update(estado="resuelta")
+        urgent = Alerta.objects.create(paciente_id=self.patient.id, tipo_alerta=trauma)
+        waiting = Alerta.objects.create(paciente_id=self.patient.id)
+        Alerta.objects.filter(id=waiting.id).update(creado_en=timezone.now() - timedelta(minutes=30))  # 10 + 30 > 30
+
+        c = APIClient()
+        c.credentials(HTTP_AUTHORIZATION=f"Bearer {self.nurse_access}")
+        res = c.get(reverse("alert-dispatch-queue"))
+        self.assertEqual(res.data["pendientes"], 2)
+        self.assertEqual([a["id"] for a in res.data["cola"]], [waiting.id, urgent.id])
+
+        self.assertEqual(c.put(reverse("alert-dispatch-availability"), {"disponible": True, "max_carga": 1}, format="json").status_code, 200)
+        res = c.post(reverse("alert-dispatch-next"))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data["id"], res.data["asignado_a_id"], res.data["estado"]), (waiting.id, self.nurse.id, "en_curso"))
+        self.assertEqual(c.post(reverse("alert-dispatch-next")).status_code, 409)
+        ev = EventoAlerta.objects.get(alerta_id=waiting.id, tipo="asignada")
+        self.assertEqual(ev.detalle_json["asignado_a_id"], self.nurse.id)
+
+        o = APIClient()
+        o.credentials(HTTP_AUTHORIZATION=f"Bearer {other_access}")
+        self.assertEqual(o.post(reverse("alert-dispatch-next")).data["id"], urgent.id)
+        self.assertEqual(o.post(reverse("alert-dispatch-next")).status_code, 204)
+
+        # Push: la ronda reparte entre los disponibles con capacidad
+        fresh = Alerta.objects.create(paciente_id=self.patient.id)
+        o.put(reverse("alert-dispatch-availability"), {"disponible": True}, format="json")
+        self.assertEqual(dispatch.dispatch_round(), 1)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.asignado_a_id, other.id)
+        self.assertEqual(dispatch.queue_depth_gauge.value, 0)
+        loads = {n["enfermero_id"]: n["carga"] for n in c.get(reverse("alert-dispatch-nurses")).data}
+        self.assertEqual(loads, {self.nurse.id: 1, other.id: 2})
+
+    def test_bulk_status_single_statement(self):
+        from alerts import outbox, stats
+        from alerts.models import Alerta, AlertaOutbox, EventoAlerta
+
+        c = APIClient()
+        c.credentials(HTTP_AUTHORIZATION=f"Bearer {self.nurse_access}")
+        user = APIClient()
+        user.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user_access}")
+
+        def create(n):
+            return [user.post(reverse("alerts"), {"tipo_alerta_codigo": "trauma"}, format="json").data["id"] for _ in range(n)]
+
+        def resolve(ids):
+            with CaptureQueriesContext(connection) as ctx:
+                res = c.post(reverse("alert-bulk-status"), {"ids": ids, "estado": "resuelta"}, format="json")
+            self.assertEqual(res.status_code, 200)
+            return res, len(ctx.captured_queries)
+
+        _, small = resolve(create(2))
+        ids = create(6)
+        c.post(reverse("alert-status", args=[ids[0]]), {"estado": "resuelta"}, format="json")
+        seq = AlertaOutbox.objects.order_by("-id").values_list("id", flat=True).first()
+        res, large = resolve(ids + [999999])
+        self.assertEqual(large, small + 1)  # + consulta de estado de los ids no actualizados
+        self.assertEqual(res.data["actualizadas"], 5)
+        results = {r["id"]: r["resultado"] for r in res.data["resultados"]}
+        self.assertEqual(results[ids[0]], "sin_cambio")
+        self.assertEqual(results[ids[1]], "ok")
+        self.assertEqual(results[999999], "no_encontrada")
+        self.assertEqual(EventoAlerta.objects.filter(alerta_id__in=ids[1:], tipo="cambio_estado").count(), 5)
+        self.assertTrue(all(a.resuelto_en for a in Alerta.objects.filter(id__in=ids[1:])))
+
+        # Un evento para enfermería con las 5 alertas y uno solo para el paciente
+        rows = list(AlertaOutbox.objects.filter(id__gt=seq).order_by("id"))
+        self.assertEqual([(r.evento, r.paciente_id, r.solo_paciente) for r in rows], [
+            ("alerts_bulk_status", None, False), ("alerts_bulk_status", self.patient.id, True),
+        ])
+        self.assertEqual(rows[0].payload["ids"], ids[1:])
+        self.assertEqual(outbox._targets(self.patient.id, True), [outbox.user_group(self.patient.id)])
+
+        self.assertEqual(c.post(reverse("alert-bulk-status"), {"ids": [], "estado": "resuelta"}, format="json").status_code, 400)
+        res = c.post(reverse("alert-bulk-status"), {"ids": [ids[1]], "estado": "en_curso"}, format="json")
+        self.assertEqual(res.data["resultados"][0]["resultado"], "ok")
+
+        snap = stats.snapshot()
+        stats.rebuild()
+        self.assertEqual(stats.snapshot()["por_estado"], snap["por_estado"])
+
+    def test_event_partitions_and_retention(self):
+        from datetime import datetime, timezone as dt_timezone
+        from io import StringIO
+        from django.core.management import call_command
+        from alerts import partitions
+        from alerts.models import Alerta, EventoAlerta
+
+        # Tabla sin particionar, como la crea seed_alerts: el comando la convierte en su primera ejecución
+        self.assertFalse(partitions.is_partitioned())
+        alert = Alerta.objects.create(paciente_id=self.patient.id)
+        legacy = EventoAlerta.objects.create(alerta=alert, tipo="creada", detalle_json={})
+        out = StringIO()
+        call_command("maintain_alert_events", stdout=out)
+        self.assertIn("1 eventos copiados", out.getvalue())
+        self.assertTrue(partitions.is_partitioned())
+        self.assertEqual(partitions.convert_legacy(), None)
+        call_command("maintain_alert_events", stdout=StringIO())
+        self.assertEqual(EventoAlerta.objects.get(alerta=alert).id, legacy.id)
+        EventoAlerta.objects.filter(id=legacy.id).delete()
+
+        old = EventoAlerta.objects.create(alerta=alert, tipo="nota", detalle_json={})
+        self.assertGreater(old.id, legacy.id)
+        EventoAlerta.objects.filter(id=old.id).update(creado_en=datetime(2020, 3, 15, tzinfo=dt_timezone.utc))  # cae en la default
+
+        created = partitions.ensure(months_ahead=1)
+        self.assertIn("eventos_alerta_202003", created)
+        now = partitions.month_start(datetime.now(dt_timezone.utc))
+        self.assertIn(partitions.add_months(now, 1), [month for _, month in partitions.partitions()])
+        self.assertEqual(partitions.ensure(months_ahead=1), [])
+        with connection.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM app.eventos_alerta_202003 WHERE id = %s", [old.id])
+            self.assertEqual(cur.fetchone()[0], 1)
+            cur.execute("SELECT COUNT(*) FROM app.eventos_alerta_default")
+            self.assertEqual(cur.fetchone()[0], 0)
+
+        # El ORM no cambia: los nuevos eventos van a la partición del mes
+        c = APIClient()
+        c.credentials(HTTP_AUTHORIZATION=f"Bearer {self.nurse_access}")
+        res = c.post(reverse("alert-event", args=[alert.id]), {"tipo": "nota", "detalle_json": {}}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(EventoAlerta.objects.filter(alerta=alert).count(), 2)
+
+        self.assertEqual(partitions.detach_older_than(12, drop=True), ["eventos_alerta_202003"])
+        self.assertEqual(list(EventoAlerta.objects.filter(alerta=alert).values_list("tipo", flat=True)), ["nota"])
+
+    def test_ingest_is_idempotent(self):
+        from alerts import ingest, stats
+        from alerts.models import Alerta, AlertaOutbox, EventoAlerta
+
+        ingest.recent_keys.clear()
+        c = APIClient()
+        c.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user_access}")
+        before = stats.snapshot()["por_fuente"].get("kiosco", {}).get("pendiente", 0)
+        seq = AlertaOutbox.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        items = [
+            {"idempotency_key": "k1", "tipo_alerta_codigo": "trauma", "latitud": "-17.78", "longitud": "-63.19"},
+            {"idempotency_key": "k2"},
+            {"idempotency_key": "k1", "descripcion": "repetida en el mismo lote"},
+        ]
+        res = c.post(reverse("alerts-ingest"), {"alertas": items}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual((res.data["creadas"], res.data["duplicadas"]), (2, 1))
+        first = {r["idempotency_key"]: r for r in res.data["resultados"][:2]}
+        self.assertEqual(res.data["resultados"][2], {"idempotency_key": "k1", "resultado": "duplicada", "alerta_id": first["k1"]["alerta_id"]})
+        alert = Alerta.objects.get(id=first["k1"]["alerta_id"])
+        self.assertEqual((alert.fuente, alert.tipo_alerta.codigo, alert.paciente_id), ("kiosco", "trauma", self.patient.id))
+        self.assertTrue(alert.geohash)
+        self.assertEqual(EventoAlerta.objects.filter(alerta_id__in=[r["alerta_id"] for r in first.values()], tipo="creada").count(), 2)
+        self.assertEqual(AlertaOutbox.objects.filter(id__gt=seq, evento="alerts_bulk_created", solo_paciente=False).count(), 1)
+        self.assertEqual(stats.snapshot()["por_fuente"]["kiosco"]["pendiente"], before + 2)
+
+        # Reintento: resuelto desde la tabla (LRU vacío) y luego desde el LRU, sin crear nada
+        ingest.recent_keys.clear()
+        for _ in range(2):
+            res = c.post(reverse("alerts-ingest"), {"alertas": items[:2] + [{"idempotency_key": "k3"}]}, format="json")
+            self.assertEqual([r["resultado"] for r in res.data["resultados"][:2]], ["duplicada", "duplicada"])
+            self.assertEqual([r["alerta_id"] for r in res.data["resultados"][:2]], [first["k1"]["alerta_id"], first["k2"]["alerta_id"]])
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(Alerta.objects.filter(fuente="kiosco", paciente_id=self.patient.id).count(), 3)
+
+        # Las claves son por usuario
+        n = APIClient()
+        n.credentials(HTTP_AUTHORIZATION=f"Bearer {self.nurse_access}")
+        self.assertEqual(n.post(reverse("alerts-ingest"), {"alertas": [{"idempotency_key": "k1"}]}, format="json").data["creadas"], 1)
+        self.assertEqual(c.post(reverse("alerts-ingest"), {"alertas": []}, format="json").status_code, 400)
+
+    def test_timeline_single_query(self):
+        from django.utils import timezone
+        from alerts.models import Alerta, EventoAlerta, TipoAlerta
+        from alerts.serializers import AlertaReadSerializer
+        from medical.models import Adjunto
+
+        alert = Alerta.objects.create(paciente_id=self.patient.id, tipo_alerta=TipoAlerta.objects.get(codigo="trauma"), latitud="-17.780000", longitud="-63.190000")
+        EventoAlerta.objects.bulk_create([
+            EventoAlerta(alerta=alert, por_usuario_id=self.nurse.id, tipo="nota", detalle_json={"n": i}) for i in range(300)
+        ])
+        Adjunto.objects.create(propietario_tabla="alertas", propietario_id=alert.id, nombre_archivo="foto.jpg", mime="image/jpeg",
+                               ruta_storage=f"alertas/{alert.id}/foto.jpg", tamano_bytes=1234, creado_por_id=self.nurse.id)
+        Adjunto.objects.create(propietario_tabla="registros_clinicos", propietario_id=alert.id, nombre_archivo="otro.pdf", mime="application/pdf",
+                               ruta_storage=f"registros/{alert.id}/otro.pdf", tamano_bytes=1, creado_por_id=self.nurse.id)
+
+        c = APIClient()
+        c.credentials(HTTP_AUTHORIZATION=f"Bearer {self.nurse_access}")
+        c.get(reverse("alert-timeline", args=[alert.id]))  # calienta caché de usuario/catálogos
+        with CaptureQueriesContext(connection) as ctx:
+            res = c.get(reverse("alert-timeline", args=[alert.id]))
+        self.assertEqual(res.status_code, 200)
+        # get_user_from_request (usuario + rol) y la línea de tiempo completa
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertIn("json_agg", ctx.captured_queries[-1]["sql"])
+
+        body = json.loads(res.content)
+        expected = AlertaReadSerializer(Alerta.objects.get(id=alert.id)).data
+        self.assertEqual(body["alerta"], json.loads(json.dumps(expected, cls=DjangoJSONEncoder)))
+        self.assertEqual([e["detalle_json"]["n"] for e in body["eventos"]], list(range(300)))
+        self.assertEqual([a["nombre_archivo"] for a in body["adjuntos"]], ["foto.jpg"])
+
+        # Con otra zona horaria activa los instantes llevan su desfase, igual que en DRF
+        for tz in ("America/La_Paz", "Asia/Kolkata"):
+            with timezone.override(tz):
+                body = json.loads(c.get(reverse("alert-timeline", args=[alert.id])).content)
+                expected = AlertaReadSerializer(Alerta.objects.get(id=alert.id)).data
+            self.assertEqual(body["alerta"]["creado_en"], expected["creado_en"])
+            self.assertFalse(body["alerta"]["creado_en"].endswith("Z"))
+
+        self.assertEqual(c.get(reverse("alert-timeline", args=[999999])).status_code, 404)
+        owner = APIClient()
+        owner.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user_access}")
+        self.assertEqual(owner.get(reverse("alert-timeline", args=[alert.id])).status_code, 200)
+        Alerta.objects.filter(id=alert.id).update(paciente_id=self.nurse.id)
+        self.assertEqual(owner.get(reverse("alert-timeline", args=[alert.id])).status_code, 403)
+
+
+OUTBOX_DDL = """
+CREATE SCHEMA IF NOT EXISTS app;
+CREATE TABLE app.alertas_outbox (
+  id BIGSERIAL PRIMARY KEY,
+  evento VARCHAR(32) NOT NULL,
+  payload JSONB NOT NULL DEFAULT '{}'::JSONB,
+  paciente_id BIGINT,
+  solo_paciente BOOLEAN NOT NULL DEFAULT FALSE,
+  creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  publicado_en TIMESTAMPTZ,
+  publicado_seq BIGINT UNIQUE
+);
+CREATE SEQUENCE app.alertas_outbox_publicado_seq;
+"""
+
+
+class OutboxCommitOrderTests(TransactionTestCase):
+    """
+    Transacciones reales (confirmadas): el orden de publicación depende de qué es visible para el relay.
+    """
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute(OUTBOX_DDL)
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE app.alertas_outbox; DROP SEQUENCE app.alertas_outbox_publicado_seq")
+
+    def test_replay_covers_events_committed_in_reverse_id_order(self):
+        from types import SimpleNamespace
+        from django.db import connections
+        from alerts import outbox
+
+        nurse = SimpleNamespace(id=0, role="nurse")
+        other = connections.create_connection("default")
+        try:
+            # Transacción lenta: obtiene el id menor pero confirma después
+            other.set_autocommit(False)
+            with other.cursor() as cur:
+                cur.execute("INSERT INTO app.alertas_outbox (evento, payload) VALUES ('lenta', '{}') RETURNING id")
+                (slow_id,) = cur.fetchone()
+            with connection.cursor() as cur:
+                cur.execute("INSERT INTO app.alertas_outbox (evento, payload) VALUES ('rapida', '{}') RETURNING id")
+                (fast_id,) = cur.fetchone()
+            self.assertLess(slow_id, fast_id)
+
+            self.assertEqual(outbox.relay_batch(), 1)
+            (first,) = outbox.replay_since(nurse, 0)
+            self.assertEqual(first["event"], "rapida")
+
+            other.commit()
+            self.assertEqual(outbox.relay_batch(), 1)
+        finally:
+            other.close()
+
+        # Un cliente que ya vio el evento rápido recibe el lento al reanudar
+        replayed = outbox.replay_since(nurse, first["seq"])
+        self.assertEqual([m["event"] for m in replayed], ["lenta"])
+        self.assertGreater(replayed[0]["seq"], first["seq"])
+
+    def test_batch_is_committed_before_fan_out(self):
+        from django.db import connections
+        from alerts import outbox
+
+        with connection.cursor() as cur:
+            cur.execute("INSERT INTO app.alertas_outbox (evento, payload) VALUES ('a', '{}'), ('b', '{}')")
+        other = connections.create_connection("default")
+        seen = {}
+
+        def send(messages):
+            # Desde otra conexión: el lote ya está confirmado y el advisory lock sigue tomado
+            with other.cursor() as cur:
+                cur.execute("SELECT COUNT(*) FROM app.alertas_outbox WHERE publicado_seq IS NOT NULL")
+                seen["committed"] = cur.fetchone()[0]
+                cur.execute("SELECT pg_try_advisory_lock(%s)", [outbox.RELAY_LOCK])
+                seen["lock_free"] = cur.fetchone()[0]
+
+        try:
+            with mock.patch.object(outbox, "_send", side_effect=send):
+                self.assertEqual(outbox.relay_batch(), 2)
+        finally:
+            other.close()
+        self.assertEqual(seen["committed"], 2)
+        self.assertFalse(seen["lock_free"])
+
+        # Si la capa falla tras el commit, el lote no se reintenta: queda para el replay
+        with connection.cursor() as cur:
+            cur.execute("INSERT INTO app.alertas_outbox (evento, payload) VALUES ('c', '{}')")
+        failures = outbox.publish_failures.value
+        with mock.patch.object(outbox, "_send", side_effect=RuntimeError("capa caída")):
+            self.assertEqual(outbox.relay_batch(), 1)
+        self.assertEqual(outbox.publish_failures.value, failures + 1)
+        self.assertEqual(outbox.relay_batch(), 0)
+
+    def test_in_process_publish_runs_on_the_server_loop(self):
+        import threading
+        from alerts import outbox
+
+        with connection.cursor() as cur:
+            cur.execute("INSERT INTO app.alertas_outbox (evento, payload) VALUES ('a', '{}')")
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        loops = []
+
+        async def group_send(group, message):
+            loops.append(asyncio.get_running_loop())
+
+        try:
+            asyncio.run_coroutine_threadsafe(self._bind(outbox), loop).result(1)
+            with mock.patch("alerts.outbox.get_channel_layer", return_value=mock.Mock(group_send=group_send)):
+                self.assertEqual(outbox.relay_batch(), 1)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(1)
+            loop.close()
+            outbox._event_loop = None
+        self.assertEqual(loops, [loop])
+
+    @staticmethod
+    async def _bind(outbox):
+        outbox.bind_event_loop()
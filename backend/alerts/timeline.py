@@ -0,0 +1,77 @@
+"""
+Línea de tiempo de una alerta en una sola consulta.
+
+PostgreSQL arma el documento completo con ``json_build_object``/``json_agg``: la alerta
+(mismos campos y formato que ``AlertaReadSerializer``), sus ``EventoAlerta`` en orden
+(índice ``(alerta_id, creado_en)`` de la tabla particionada) y los metadatos de sus
+``Adjunto`` (``propietario_tabla = 'alertas'``). La vista devuelve el texto JSON tal cual:
+ni varias idas y vueltas a la BD ni serialización en Python de cientos de eventos.
+
+Benchmark frente a detalle + eventos + adjuntos por separado: ``manage.py bench_alert_timeline``.
+"""
+
+from typing import Optional, Tuple
+
+from django.db import connection
+from django.utils import timezone
+
+
+def _ts(column: str) -> str:
+    # Mismo formato que DRF: ISO 8601 en la zona horaria activa (%(tz)s), microsegundos solo
+    # si los hay y desfase "+HH:MM" ("Z" si es cero)
+    local = f"({column} AT TIME ZONE %(tz)s)"
+    offset = f"EXTRACT(EPOCH FROM {local} - ({column} AT TIME ZONE 'UTC'))::int"
+    return (
+        f"CASE WHEN {column} IS NULL THEN NULL ELSE "
+        f"to_char({local}, 'YYYY-MM-DD\"T\"HH24:MI:SS') "
+        f"|| CASE WHEN date_part('microseconds', {column})::int %% 1000000 = 0 THEN '' "
+        f"ELSE to_char({local}, '.US') END "
+        f"|| CASE WHEN {offset} = 0 THEN 'Z' "
+        f"ELSE CASE WHEN {offset} < 0 THEN '-' ELSE '+' END || to_char(make_interval(secs => abs({offset})), 'HH24:MI') END END"
+    )
+
+
+TIMELINE_SQL = f"""
+SELECT a.paciente_id, json_build_object(
+  'alerta', json_build_object(
+    'id', a.id,
+    'paciente_id', a.paciente_id,
+    'tipo_alerta', CASE WHEN t.id IS NULL THEN NULL ELSE json_build_object('id', t.id, 'codigo', t.codigo, 'nombre', t.nombre) END,
+    'estado', a.estado,
+    'latitud', a.latitud::text,
+    'longitud', a.longitud::text,
+    'descripcion', a.descripcion,
+    'creado_en', {_ts('a.creado_en')},
+    'asignado_a_id', a.asignado_a_id,
+    'resuelto_en', {_ts('a.resuelto_en')},
+    'fuente', a.fuente
+  ),
+  'eventos', COALESCE((
+    SELECT json_agg(json_build_object(
+      'id', e.id, 'tipo', e.tipo, 'por_usuario_id', e.por_usuario_id,
+      'detalle_json', e.detalle_json, 'creado_en', {_ts('e.creado_en')}
+    ) ORDER BY e.creado_en, e.id)
+    FROM app.eventos_alerta e WHERE e.alerta_id = a.id
+  ), '[]'::json),
+  'adjuntos', COALESCE((
+    SELECT json_agg(json_build_object(
+      'id', d.id, 'propietario_tabla', d.propietario_tabla, 'propietario_id', d.propietario_id,
+      'nombre_archivo', d.nombre_archivo, 'mime', d.mime, 'ruta_storage', d.ruta_storage,
+      'tamano_bytes', d.tamano_bytes, 'creado_por_id', d.creado_por_id, 'creado_en', {_ts('d.creado_en')}
+    ) ORDER BY d.creado_en, d.id)
+    FROM app.adjuntos d WHERE d.propietario_tabla = 'alertas' AND d.propietario_id = a.id
+  ), '[]'::json)
+)::text
+FROM app.alertas a
+LEFT JOIN app.tipos_alerta t ON t.id = a.tipo_alerta_id
+WHERE a.id = %(id)s
+"""
+
+
+def fetch_timeline(alert_id: int) -> Optional[Tuple[Optional[int], str]]:
+    """
+    ``(paciente_id, documento JSON)`` de la alerta, o None si no existe.
+    """
+    with connection.cursor() as cur:
+        cur.execute(TIMELINE_SQL, {"id": alert_id, "tz": timezone.get_current_timezone_name()})
+        return cur.fetchone()
@@ -1,10 +1,36 @@
 from django.urls import path
 
-from .views import AlertsView, AlertDetailView, AlertAssignView, AlertStatusView, AlertEventView
+from .views import (
+    AlertsView,
+    AlertDetailView,
+    AlertIngestView,
+    AlertTimelineView,
+    AlertAssignView,
+    AlertStatusView,
+    AlertBulkStatusView,
+    AlertEventView,
+    AlertStatsView,
+    AlertsGeoView,
+    AlertClustersView,
+    AlertDispatchNextView,
+    NurseAvailabilityView,
+    DispatchQueueView,
+    DispatchNursesView,
+)
 
 urlpatterns = [
     path("alerts", AlertsView.as_view(), name="alerts"),
+    path("alerts/stats", AlertStatsView.as_view(), name="alert-stats"),
+    path("alerts/ingest", AlertIngestView.as_view(), name="alerts-ingest"),
+    path("alerts/bulk-status", AlertBulkStatusView.as_view(), name="alert-bulk-status"),
+    path("alerts/geo", AlertsGeoView.as_view(), name="alerts-geo"),
+    path("alerts/clusters", AlertClustersView.as_view(), name="alert-clusters"),
+    path("alerts/dispatch/next", AlertDispatchNextView.as_view(), name="alert-dispatch-next"),
+    path("alerts/dispatch/availability", NurseAvailabilityView.as_view(), name="alert-dispatch-availability"),
+    path("alerts/dispatch/queue", DispatchQueueView.as_view(), name="alert-dispatch-queue"),
+    path("alerts/dispatch/nurses", DispatchNursesView.as_view(), name="alert-dispatch-nurses"),
     path("alerts/<int:id>", AlertDetailView.as_view(), name="alert-detail"),
+    path("alerts/<int:id>/timeline", AlertTimelineView.as_view(), name="alert-timeline"),
     path("alerts/<int:id>/assign", AlertAssignView.as_view(), name="alert-assign"),
     path("alerts/<int:id>/status", AlertStatusView.as_view(), name="alert-status"),
     path("alerts/<int:id>/event", AlertEventView.as_view(), name="alert-event"),
@@ -1,44 +1,39 @@
-from typing import Any
-
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from accounts.authentication import get_user_from_request
-from accounts.permissions import IsNurse
-from .models import Alerta, TipoAlerta, EventoAlerta
+from accounts.permissions import IsAdmin, IsNurse
+from common.metrics import registry
+from common.pagination import KeysetPagination
+from . import bulk, dispatch, geo, ingest, outbox, stats, timeline
+from .models import ESTADO_TRANSICIONES, Alerta, TipoAlerta, EventoAlerta, DisponibilidadEnfermeria
 from .serializers import (
     AlertaReadSerializer,
     AlertaCreateSerializer,
+    AlertaIngestSerializer,
     AlertaAssignSerializer,
     AlertaStatusSerializer,
+    AlertaBulkStatusSerializer,
     AlertaEventSerializer,
+    AlertaGeoQuerySerializer,
+    AlertaClustersQuerySerializer,
+    DisponibilidadSerializer,
+    alert_rows,
 )
 
-
-def _emit_alert_event(event_type: str, payload: dict) -> None:
-    """
-    Emite eventos por el canal de WebSocket 'alerts'.
-    """
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        "alerts",
-        {
-            "type": "alerts.message",
-            "event": event_type,
-            "payload": payload,
-        },
-    )
+# Relación refetch/evento: alerts.detail_requests frente a alerts.outbox.enqueued
+detail_requests_counter = registry.counter("alerts.detail_requests", "GET /api/alerts/:id atendidos")
 
 
 class AlertsView(APIView):
     """
     POST /api/alerts  -> usuario crea alerta (estado=pendiente)
-    GET /api/alerts   -> usuario ve propias, enfermería ve todas
+    GET /api/alerts   -> usuario ve propias, enfermería ve todas (paginado por cursor, ver common.pagination)
     """
 
     permission_classes = [IsAuthenticated]
@@ -48,10 +43,12 @@ class AlertsView(APIView):
         if not user:
             return Response({"detail": "No autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
         if user.rol.nombre == "nurse":
-            qs = Alerta.objects.select_related("tipo_alerta").order_by("-creado_en")
+            qs = Alerta.objects.all()
         else:
-            qs = Alerta.objects.select_related("tipo_alerta").filter(paciente_id=user.id).order_by("-creado_en")
-        return Response(AlertaReadSerializer(qs, many=True).data, status=status.HTTP_200_OK)
+            qs = Alerta.objects.filter(paciente_id=user.id)
+        paginator = KeysetPagination("creado_en")
+        page = paginator.paginate_queryset(alert_rows.values(qs), request)
+        return paginator.get_paginated_response(alert_rows.many(page))
 
     @transaction.atomic
     def post(self, request):
@@ -74,14 +71,37 @@ class AlertsView(APIView):
             fuente=ser.validated_data.get("fuente", "app"),
         )
         EventoAlerta.objects.create(alerta=alert, por_usuario_id=user.id, tipo="creada", detalle_json={})
-        _emit_alert_event("alert_created", {"id": alert.id})
-        return Response(AlertaReadSerializer(alert).data, status=status.HTTP_201_CREATED)
+        stats.record_created(alert)
+        data = AlertaReadSerializer(alert).data
+        outbox.emit_alert_event("alert_created", data)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class AlertIngestView(APIView):
+    """
+    POST /api/alerts/ingest {alertas: [{idempotency_key, ...}]} -> kioscos/integraciones crean
+    alertas por lotes; los reintentos con la misma clave no duplican (ver alerts.ingest)
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @transaction.atomic
+    def post(self, request):
+        user = get_user_from_request(request)
+        if not user:
+            return Response({"detail": "No autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
+        ser = AlertaIngestSerializer(data=request.data)
+        if not ser.is_valid():
+            return Response({"detail": "Datos inválidos", "errors": ser.errors}, status=status.HTTP_400_BAD_REQUEST)
+        result = ingest.ingest(user.id, ser.validated_data["alertas"])
+        return Response(result, status=status.HTTP_201_CREATED if result["creadas"] else status.HTTP_200_OK)
 
 
 class AlertDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, id: int):
+        detail_requests_counter.inc()
         user = get_user_from_request(request)
         try:
             alert = Alerta.objects.select_related("tipo_alerta").get(id=id)
@@ -92,6 +112,25 @@ class AlertDetailView(APIView):
         return Response(AlertaReadSerializer(alert).data, status=status.HTTP_200_OK)
 
 
+class AlertTimelineView(APIView):
+    """
+    GET /api/alerts/:id/timeline -> alerta + eventos en orden + adjuntos, en una sola consulta (ver alerts.timeline)
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, id: int):
+        user = get_user_from_request(request)
+        row = timeline.fetch_timeline(id)
+        if row is None:
+            return Response({"detail": "No encontrada"}, status=status.HTTP_404_NOT_FOUND)
+        paciente_id, document = row
+        if user.rol.nombre != "nurse" and paciente_id != user.id:
+            return Response({"detail": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
+        # El documento ya es JSON armado por PostgreSQL: se devuelve sin volver a serializar
+        return HttpResponse(document, content_type="application/json")
+
+
 class AlertAssignView(APIView):
     """
     POST /api/alerts/:id/assign -> enfermería asigna (por defecto a sí mismo)
@@ -105,7 +144,7 @@ class AlertAssignView(APIView):
             return Response({"detail": "Permisos insuficientes"}, status=status.HTTP_403_FORBIDDEN)
         nurse = get_user_from_request(request)
         try:
-            alert = Alerta.objects.get(id=id)
+            alert = Alerta.objects.select_for_update().get(id=id)
         except Alerta.DoesNotExist:
             return Response({"detail": "No encontrada"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -113,15 +152,8 @@ class AlertAssignView(APIView):
         ser.is_valid(raise_exception=False)
         asignado_id = ser.validated_data.get("asignado_a_id", nurse.id) if ser.validated_data else nurse.id
 
-        alert.asignado_a_id = asignado_id
-        if alert.estado == "pendiente":
-            alert.estado = "en_curso"
-        alert.save(update_fields=["asignado_a_id", "estado"])
-
-        EventoAlerta.objects.create(alerta=alert, por_usuario_id=nurse.id, tipo="asignada", detalle_json={"asignado_a_id": asignado_id})
-        EventoAlerta.objects.create(alerta=alert, por_usuario_id=nurse.id, tipo="cambio_estado", detalle_json={"estado": alert.estado})
-        _emit_alert_event("alert_assigned", {"id": alert.id, "asignado_a_id": asignado_id})
-        return Response(AlertaReadSerializer(alert).data, status=status.HTTP_200_OK)
+        data = dispatch.assign(alert, asignado_id, nurse.id)
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class AlertStatusView(APIView):
@@ -137,7 +169,7 @@ class AlertStatusView(APIView):
             return Response({"detail": "Permisos insuficientes"}, status=status.HTTP_403_FORBIDDEN)
         nurse = get_user_from_request(request)
         try:
-            alert = Alerta.objects.get(id=id)
+            alert = Alerta.objects.select_for_update().get(id=id)
         except Alerta.DoesNotExist:
             return Response({"detail": "No encontrada"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -148,16 +180,44 @@ class AlertStatusView(APIView):
         new_state = ser.validated_data["estado"]
         if new_state == alert.estado:
             return Response(AlertaReadSerializer(alert).data, status=status.HTTP_200_OK)
+        if new_state not in ESTADO_TRANSICIONES.get(alert.estado, ()):
+            return Response({"detail": f"Transición no permitida desde {alert.estado}"}, status=status.HTTP_409_CONFLICT)
 
+        old_estado = alert.estado
+        first_resolution = new_state == "resuelta" and alert.resuelto_en is None
         alert.estado = new_state
         if new_state == "resuelta":
-            from django.utils import timezone
             alert.resuelto_en = timezone.now()
         alert.save(update_fields=["estado", "resuelto_en"])
+        stats.record_transition(alert, old_estado)
+        if first_resolution:
+            # Una alerta reabierta y vuelta a resolver no añade otra muestra
+            stats.record_latency("resolucion", (alert.resuelto_en - alert.creado_en).total_seconds())
 
         EventoAlerta.objects.create(alerta=alert, por_usuario_id=nurse.id, tipo="cambio_estado", detalle_json={"estado": new_state})
-        _emit_alert_event("alert_status", {"id": alert.id, "estado": new_state})
-        return Response(AlertaReadSerializer(alert).data, status=status.HTTP_200_OK)
+        data = AlertaReadSerializer(alert).data
+        outbox.emit_alert_event("alert_status", data, estado=new_state)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class AlertBulkStatusView(APIView):
+    """
+    POST /api/alerts/bulk-status {ids: [...], estado} -> enfermería cambia el estado de varias alertas
+    en una sola sentencia; responde el resultado por id (ver alerts.bulk)
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @transaction.atomic
+    def post(self, request):
+        if not IsNurse().has_permission(request, self):
+            return Response({"detail": "Permisos insuficientes"}, status=status.HTTP_403_FORBIDDEN)
+        nurse = get_user_from_request(request)
+        ser = AlertaBulkStatusSerializer(data=request.data)
+        if not ser.is_valid():
+            return Response({"detail": "Datos inválidos", "errors": ser.errors}, status=status.HTTP_400_BAD_REQUEST)
+        result = bulk.bulk_transition(ser.validated_data["ids"], ser.validated_data["estado"], nurse.id)
+        return Response(result, status=status.HTTP_200_OK)
 
 
 class AlertEventView(APIView):
@@ -173,7 +233,7 @@ class AlertEventView(APIView):
             return Response({"detail": "Permisos insuficientes"}, status=status.HTTP_403_FORBIDDEN)
         nurse = get_user_from_request(request)
         try:
-            alert = Alerta.objects.get(id=id)
+            alert = Alerta.objects.select_related("tipo_alerta").get(id=id)
         except Alerta.DoesNotExist:
             return Response({"detail": "No encontrada"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -184,8 +244,126 @@ class AlertEventView(APIView):
         ev = EventoAlerta.objects.create(
             alerta=alert, por_usuario_id=nurse.id, tipo=ser.validated_data["tipo"], detalle_json=ser.validated_data.get("detalle_json", {})
         )
-        _emit_alert_event("alert_event", {"id": alert.id, "event_id": ev.id, "tipo": ev.tipo})
+        outbox.emit_alert_event("alert_event", AlertaReadSerializer(alert).data, event_id=ev.id, tipo=ev.tipo, detalle_json=ev.detalle_json)
         return Response({"ok": True, "event_id": ev.id}, status=status.HTTP_201_CREATED)
-from django.shortcuts import render
 
-# Create your views here.
+
+class AlertStatsView(APIView):
+    """
+    GET /api/alerts/stats -> enfermería/admin: alertas por estado/tipo/fuente y
+    percentiles de tiempo hasta asignación y resolución (agregados incrementales, ver alerts.stats)
+    """
+
+    permission_classes = [IsAuthenticated, IsNurse | IsAdmin]
+
+    def get(self, request):
+        return Response(stats.snapshot(), status=status.HTTP_200_OK)
+
+
+class AlertsGeoView(APIView):
+    """
+    GET /api/alerts/geo?lat=&lon=&radius=  -> alertas a menos de ``radius`` metros (por distancia)
+    GET /api/alerts/geo?bbox=lat_min,lon_min,lat_max,lon_max  -> alertas dentro de la caja
+    """
+
+    permission_classes = [IsAuthenticated, IsNurse | IsAdmin]
+
+    def get(self, request):
+        ser = AlertaGeoQuerySerializer(data=request.query_params)
+        if not ser.is_valid():
+            return Response({"detail": "Datos inválidos", "errors": ser.errors}, status=status.HTTP_400_BAD_REQUEST)
+        params = ser.validated_data
+        if "bbox" in params:
+            results = geo.alerts_within(bbox=params["bbox"], estado=params.get("estado"), limit=params["limit"])
+        else:
+            results = geo.alerts_within(
+                center=(params["lat"], params["lon"]), radius_m=params["radius"], estado=params.get("estado"), limit=params["limit"]
+            )
+        return Response(results, status=status.HTTP_200_OK)
+
+
+class AlertClustersView(APIView):
+    """
+    GET /api/alerts/clusters?bbox=...&zoom=&desde=&hasta=  -> celdas agregadas (geohash) para el mapa
+    """
+
+    permission_classes = [IsAuthenticated, IsNurse | IsAdmin]
+
+    def get(self, request):
+        ser = AlertaClustersQuerySerializer(data=request.query_params)
+        if not ser.is_valid():
+            return Response({"detail": "Datos inválidos", "errors": ser.errors}, status=status.HTTP_400_BAD_REQUEST)
+        params = ser.validated_data
+        result = geo.clusters(params["bbox"], params["zoom"], desde=params.get("desde"), hasta=params.get("hasta"))
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class AlertDispatchNextView(APIView):
+    """
+    POST /api/alerts/dispatch/next -> enfermería toma la alerta pendiente de mayor prioridad
+    (204 si la cola está vacía, 409 si ya tiene su carga máxima)
+    """
+
+    permission_classes = [IsAuthenticated, IsNurse]
+
+    def post(self, request):
+        nurse = get_user_from_request(request)
+        try:
+            data = dispatch.claim_next(nurse.id)
+        except dispatch.NurseAtCapacity:
+            return Response({"detail": "Carga máxima alcanzada"}, status=status.HTTP_409_CONFLICT)
+        if data is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class NurseAvailabilityView(APIView):
+    """
+    GET/PUT /api/alerts/dispatch/availability -> disponibilidad, ubicación y carga máxima propias
+    """
+
+    permission_classes = [IsAuthenticated, IsNurse]
+
+    def get(self, request):
+        nurse = get_user_from_request(request)
+        slot, _ = DisponibilidadEnfermeria.objects.get_or_create(enfermero_id=nurse.id)
+        return Response(DisponibilidadSerializer(slot).data, status=status.HTTP_200_OK)
+
+    def put(self, request):
+        nurse = get_user_from_request(request)
+        slot, _ = DisponibilidadEnfermeria.objects.get_or_create(enfermero_id=nurse.id)
+        ser = DisponibilidadSerializer(slot, data=request.data, partial=True)
+        if not ser.is_valid():
+            return Response({"detail": "Datos inválidos", "errors": ser.errors}, status=status.HTTP_400_BAD_REQUEST)
+        ser.save()
+        return Response(ser.data, status=status.HTTP_200_OK)
+
+
+class DispatchQueueView(APIView):
+    """
+    GET /api/alerts/dispatch/queue -> enfermería/admin: profundidad y cabeza de la cola de despacho
+    (``?lat=&lon=`` ordena con la distancia a ese punto)
+    """
+
+    permission_classes = [IsAuthenticated, IsNurse | IsAdmin]
+
+    def get(self, request):
+        near = None
+        try:
+            if request.query_params.get("lat") and request.query_params.get("lon"):
+                near = (float(request.query_params["lat"]), float(request.query_params["lon"]))
+            limit = min(int(request.query_params.get("limit", 50)), 200)
+        except ValueError:
+            return Response({"detail": "Parámetros inválidos"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"pendientes": dispatch.queue_depth(), "cola": dispatch.queue(limit, near)}, status=status.HTTP_200_OK)
+
+
+class DispatchNursesView(APIView):
+    """
+    GET /api/alerts/dispatch/nurses -> enfermería/admin: disponibilidad y carga actual de cada enfermero
+    """
+
+    permission_classes = [IsAuthenticated, IsNurse | IsAdmin]
+
+    def get(self, request):
+        return Response(dispatch.nurses(), status=status.HTTP_200_OK)
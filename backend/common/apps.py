@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class CommonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'common'
+
+    def ready(self):
+        from django.apps import apps
+        from django.db.models.signals import post_delete, post_save
+
+        from .catalogs import CATALOGS, _on_catalog_changed
+
+        # Ediciones de catálogos (p. ej. desde el admin) invalidan la caché en todos los workers
+        for label in CATALOGS:
+            model = apps.get_model(label)
+            post_save.connect(_on_catalog_changed, sender=model, dispatch_uid=f"catalogs.save.{label}")
+            post_delete.connect(_on_catalog_changed, sender=model, dispatch_uid=f"catalogs.delete.{label}")
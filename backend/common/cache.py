@@ -0,0 +1,16 @@
+"""
+Utilidades sobre la caché de Django compartida entre workers.
+"""
+
+from django.conf import settings
+
+# Backends cuyo contenido vive en la memoria de cada proceso: lo que un worker escribe
+# (p. ej. un incremento de versión) no lo ven los demás.
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def is_process_local(alias: str = "default") -> bool:
+    return settings.CACHES.get(alias, {}).get("BACKEND") in PROCESS_LOCAL_BACKENDS
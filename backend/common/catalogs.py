@@ -0,0 +1,128 @@
+"""
+Caché de proceso para catálogos casi estáticos (roles y tablas tipo_*).
+
+Cada catálogo se carga una vez por worker (en el primer uso) en un diccionario
+inmutable indexado por código normalizado con ``casefold()``; los serializers
+resuelven códigos en memoria en lugar de consultar la BD en cada escritura.
+
+Invalidación entre workers: cada catálogo tiene una versión en la caché de Django.
+``invalidate()`` la incrementa y cada worker la revisa como mucho cada
+``CATALOG_CACHE_CHECK_INTERVAL`` segundos. Los comandos seed_* / init_app_schema
+y las señales post_save/post_delete de los modelos (admin) invalidan automáticamente.
+
+Como red de seguridad cada catálogo se recarga igualmente tras ``CATALOG_CACHE_MAX_AGE``
+segundos. Si la caché de Django es por proceso (LocMem) la versión no se comparte entre
+workers y el catálogo se recarga en cada comprobación.
+"""
+
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+from . import cache as shared_cache
+from .metrics import registry
+
+loads_counter = registry.counter("catalogs.loads", "Cargas de catálogos desde PostgreSQL")
+
+
+def _normalize(code: str) -> str:
+    return code.strip().casefold()
+
+
+class Catalog:
+    def __init__(self, name: str, model_label: str, key_field: str = "codigo", fields: Tuple[str, ...] = ("id", "codigo", "nombre", "activo")) -> None:
+        self.name = name
+        self.model_label = model_label
+        self.key_field = key_field
+        self.fields = fields
+        self._lock = threading.Lock()
+        self._entries: Optional[Mapping[str, Tuple[Any, ...]]] = None
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def _version_key(self) -> str:
+        return f"catalogs:{self.name}:version"
+
+    def _shared_version(self) -> int:
+        return cache.get(self._version_key, 0)
+
+    def _snapshot(self) -> Mapping[str, Tuple[Any, ...]]:
+        now = time.monotonic()
+        entries = self._entries
+        interval = getattr(settings, "CATALOG_CACHE_CHECK_INTERVAL", 5.0)
+        if entries is not None and now - self._checked_at < interval:
+            return entries
+        max_age = interval if shared_cache.is_process_local() else getattr(settings, "CATALOG_CACHE_MAX_AGE", 300.0)
+        version = self._shared_version()
+        with self._lock:
+            if self._entries is None or self._version != version or now - self._loaded_at >= max_age:
+                rows = self.model.objects.values_list(*self.fields)
+                key_idx = self.fields.index(self.key_field)
+                self._entries = MappingProxyType({_normalize(row[key_idx]): tuple(row) for row in rows})
+                self._version = version
+                self._loaded_at = now
+                loads_counter.inc()
+            self._checked_at = now
+            return self._entries
+
+    def _build(self, values: Tuple[Any, ...]):
+        return self.model(**dict(zip(self.fields, values)))
+
+    def get(self, code: Optional[str], active_only: bool = True):
+        """
+        Devuelve una instancia (sin consultar la BD) para el código dado, o None.
+        """
+        if not code:
+            return None
+        values = self._snapshot().get(_normalize(code))
+        if values is None:
+            return None
+        if active_only and "activo" in self.fields and not values[self.fields.index("activo")]:
+            return None
+        return self._build(values)
+
+    def all(self, active_only: bool = True) -> List[Any]:
+        items = [self._build(v) for v in self._snapshot().values()]
+        if active_only and "activo" in self.fields:
+            items = [i for i in items if i.activo]
+        return items
+
+    def invalidate(self) -> None:
+        try:
+            cache.incr(self._version_key)
+        except ValueError:
+            if not cache.add(self._version_key, 1, None):
+                cache.incr(self._version_key)
+        with self._lock:
+            self._entries = None
+            self._version = None
+
+
+roles = Catalog("roles", "accounts.Role", key_field="nombre", fields=("id", "nombre", "descripcion"))
+tipos_alerta = Catalog("tipos_alerta", "alerts.TipoAlerta")
+tipos_nota = Catalog("tipos_nota", "medical.TipoNota")
+tipos_servicio = Catalog("tipos_servicio", "scheduling.TipoServicio")
+
+CATALOGS: Dict[str, Catalog] = {c.model_label: c for c in (roles, tipos_alerta, tipos_nota, tipos_servicio)}
+
+
+def invalidate_all() -> None:
+    for catalog in CATALOGS.values():
+        catalog.invalidate()
+
+
+def _on_catalog_changed(sender, **kwargs) -> None:
+    catalog = CATALOGS.get(sender._meta.label)
+    if catalog is not None:
+        catalog.invalidate()
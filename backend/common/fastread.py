@@ -0,0 +1,78 @@
+"""
+Serialización rápida de listados a partir de filas ``values()``.
+
+``RowSerializer`` reutiliza los campos (y por tanto el formato de salida) de un
+serializer DRF de lectura, pero trabaja sobre diccionarios de ``QuerySet.values()``:
+no instancia modelos ni sigue claves foráneas fila a fila. Las columnas se derivan
+del ``source`` de cada campo (``"tipo_servicio.codigo"`` -> ``"tipo_servicio__codigo"``)
+y los serializers anidados se leen con el prefijo de su relación (JOIN en la misma consulta).
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from rest_framework.serializers import BaseSerializer
+
+
+class RowSerializer:
+    """
+    Uso en una vista::
+
+        rows = RowSerializer(AlertaReadSerializer)
+        page = paginator.paginate_queryset(rows.values(qs), request)
+        return paginator.get_paginated_response(rows.many(page))
+
+    Los campos se resuelven en el primer uso (no al importar el módulo).
+    """
+
+    def __init__(self, serializer_class, prefix: str = "") -> None:
+        self.serializer_class = serializer_class
+        self.prefix = prefix
+        self._ready = False
+        self._plain: List[Tuple[str, str, Any]] = []
+        self._nested: List[Tuple[str, "RowSerializer", str]] = []
+
+    def _setup(self) -> None:
+        if self._ready:
+            return
+        prefix = self.prefix
+        for name, field in self.serializer_class().fields.items():
+            column = prefix + field.source.replace(".", "__")
+            if isinstance(field, BaseSerializer):
+                child = RowSerializer(type(field), prefix=f"{column}__")
+                self._nested.append((name, child, f"{column}__id"))
+            else:
+                self._plain.append((name, column, field.to_representation))
+        self._ready = True
+
+    def columns(self) -> List[str]:
+        """
+        Columnas a pedir en ``QuerySet.values(...)``.
+        """
+        self._setup()
+        cols = [column for _, column, _ in self._plain]
+        for _, child, _ in self._nested:
+            cols.extend(child.columns())
+        return cols
+
+    def to_representation(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        self._setup()
+        data: Dict[str, Any] = {}
+        for name, column, represent in self._plain:
+            value = row[column]
+            data[name] = None if value is None else represent(value)
+        for name, child, null_column in self._nested:
+            data[name] = None if row[null_column] is None else child.to_representation(row)
+        return data
+
+    def many(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [self.to_representation(row) for row in rows]
+
+    def values(self, queryset, extra: Optional[List[str]] = None):
+        """
+        ``queryset.values(...)`` con las columnas necesarias (más ``extra``).
+        """
+        cols = self.columns()
+        for col in extra or []:
+            if col not in cols:
+                cols.append(col)
+        return queryset.values(*cols)
@@ -0,0 +1,86 @@
+"""
+Utilidades geográficas sin PostGIS: geohash, distancias y cajas envolventes.
+
+El geohash intercala bits de longitud y latitud en base32; los prefijos comunes
+identifican celdas anidadas (precisión 6 ≈ 1.2 km x 0.6 km, 7 ≈ 153 m x 153 m,
+9 ≈ 4.8 m x 4.8 m), así que agrupar por ``LEFT(geohash, p)`` da celdas de cualquier
+tamaño con un índice btree normal.
+"""
+
+import math
+from typing import Tuple
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_M = 6_371_008.8
+DEFAULT_PRECISION = 9
+
+
+def geohash_encode(lat: float, lon: float, precision: int = DEFAULT_PRECISION) -> str:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value, lon_lo = (value << 1) | 1, mid
+            else:
+                value, lon_hi = value << 1, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value, lat_lo = (value << 1) | 1, mid
+            else:
+                value, lat_hi = value << 1, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def geohash_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """
+    (lat_min, lon_min, lat_max, lon_max) de la celda.
+    """
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lat_lo, lon_lo, lat_hi, lon_hi
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlmb = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bbox_around(lat: float, lon: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """
+    Caja (lat_min, lon_min, lat_max, lon_max) que contiene el círculo de ``radius_m``.
+    """
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    dlon = min(180.0, math.degrees(radius_m / (EARTH_RADIUS_M * cos_lat)))
+    return max(-90.0, lat - dlat), max(-180.0, lon - dlon), min(90.0, lat + dlat), min(180.0, lon + dlon)
+
+
+def precision_for_zoom(zoom: int) -> int:
+    """
+    Precisión de geohash adecuada para un nivel de zoom de mapa web (0-22).
+    """
+    for max_zoom, precision in ((2, 1), (5, 2), (7, 3), (10, 4), (12, 5), (15, 6), (17, 7), (19, 8)):
+        if zoom <= max_zoom:
+            return precision
+    return 9
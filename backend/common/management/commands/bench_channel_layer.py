@@ -0,0 +1,107 @@
+import asyncio
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+GROUP = "bench.fanout"
+
+
+def _receiver(ready, results, messages: int, timeout: float) -> None:
+    """
+    Proceso worker: se une al grupo y mide la latencia de cada mensaje recibido.
+    """
+    import django
+
+    django.setup()
+    from common.pg_channel_layer import PostgresChannelLayer
+
+    layer = PostgresChannelLayer(capacity=messages + 1)
+
+    async def run():
+        channel = await layer.new_channel()
+        await layer.group_add(GROUP, channel)
+        ready.release()
+        latencies, last = [], None
+        try:
+            for _ in range(messages):
+                message = await asyncio.wait_for(layer.receive(channel), timeout)
+                last = time.time()
+                latencies.append(last - message["ts"])
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await layer.close()
+        return latencies, last
+
+    results.put(asyncio.run(run()))
+
+
+def _percentile(data, q: float) -> float:
+    idx = min(len(data) - 1, int(round(q * (len(data) - 1))))
+    return data[idx]
+
+
+class Command(BaseCommand):
+    help = "Mide latencia y throughput de fan-out de la capa de canales PostgreSQL con N procesos receptores."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Procesos receptores (simulan workers ASGI)")
+        parser.add_argument("--messages", type=int, default=1000, help="Mensajes enviados al grupo")
+        parser.add_argument("--size", type=int, default=256, help="Bytes de payload por mensaje (>7800 usa la tabla de desborde)")
+        parser.add_argument("--timeout", type=float, default=10.0, help="Segundos sin mensajes tras los que un receptor termina")
+
+    def handle(self, *args, **options):
+        from common.pg_channel_layer import PostgresChannelLayer
+
+        workers, messages = options["workers"], options["messages"]
+        if workers < 1 or messages < 1:
+            raise CommandError("--workers y --messages deben ser positivos")
+
+        ctx = multiprocessing.get_context("spawn")
+        ready, results = ctx.Semaphore(0), ctx.Queue()
+        procs = [ctx.Process(target=_receiver, args=(ready, results, messages, options["timeout"]), daemon=True) for _ in range(workers)]
+        for proc in procs:
+            proc.start()
+        for _ in procs:
+            if not ready.acquire(timeout=60):
+                raise CommandError("Los receptores no se suscribieron a tiempo")
+
+        layer = PostgresChannelLayer()
+        body = "x" * options["size"]
+
+        async def send_all():
+            try:
+                for seq in range(messages):
+                    await layer.group_send(GROUP, {"type": "bench", "seq": seq, "ts": time.time(), "body": body})
+            finally:
+                await layer.close()
+
+        start = time.time()
+        asyncio.run(send_all())
+        send_elapsed = time.time() - start
+
+        latencies, last = [], start
+        for _ in procs:
+            lat, proc_last = results.get()
+            latencies.extend(lat)
+            if proc_last:
+                last = max(last, proc_last)
+        for proc in procs:
+            proc.join(5)
+
+        expected = workers * messages
+        self.stdout.write(f"workers={workers} mensajes={messages} payload={options['size']}B")
+        self.stdout.write(f"envío:     {messages / send_elapsed:,.0f} group_send/s")
+        self.stdout.write(f"entregas:  {len(latencies)}/{expected} ({len(latencies) / max(last - start, 1e-9):,.0f} entregas/s)")
+        if latencies:
+            latencies.sort()
+            self.stdout.write(
+                "latencia:  p50={:.2f} ms  p95={:.2f} ms  p99={:.2f} ms  max={:.2f} ms".format(
+                    *(v * 1000 for v in (_percentile(latencies, 0.5), _percentile(latencies, 0.95), _percentile(latencies, 0.99), latencies[-1]))
+                )
+            )
+        if len(latencies) < expected:
+            self.stdout.write(self.style.WARNING("Hubo mensajes no entregados (capacidad o timeout)"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Fan-out completo."))
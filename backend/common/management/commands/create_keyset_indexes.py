@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+
+# (tabla, nombre del índice, columnas). Deben coincidir con el orden de common.pagination.KeysetPagination.
+INDEXES = [
+    ("app.alertas", "alertas_creado_id_idx", "creado_en DESC, id DESC"),
+    ("app.alertas", "alertas_paciente_creado_id_idx", "paciente_id, creado_en DESC, id DESC"),
+    ("app.citas", "citas_inicio_id_idx", "inicio DESC, id DESC"),
+    ("app.citas", "citas_enfermero_inicio_id_idx", "enfermero_id, inicio DESC, id DESC"),
+    ("app.citas", "citas_paciente_inicio_id_idx", "paciente_id, inicio DESC, id DESC"),
+    ("app.registros_clinicos", "registros_paciente_creado_id_idx", "paciente_id, creado_en DESC, id DESC"),
+    ("app.signos_vitales", "signos_paciente_tomado_id_idx", "paciente_id, tomado_en DESC, id DESC"),
+    ("app.adjuntos", "adjuntos_propietario_creado_id_idx", "propietario_tabla, propietario_id, creado_en DESC, id DESC"),
+]
+
+
+class Command(BaseCommand):
+    help = "Crea (CONCURRENTLY) los índices compuestos que usa la paginación por cursor de los listados."
+
+    def handle(self, *args, **options):
+        # Sin transacción: CREATE INDEX CONCURRENTLY no bloquea escrituras pero no admite bloques transaccionales
+        with connection.cursor() as cursor:
+            for table, name, columns in INDEXES:
+                cursor.execute("SELECT to_regclass(%s)", [table])
+                if cursor.fetchone()[0] is None:
+                    self.stdout.write(self.style.WARNING(f"{table} no existe; se omite {name}"))
+                    continue
+                cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+                self.stdout.write(f"{name} listo")
+        self.stdout.write(self.style.SUCCESS("Índices de paginación keyset creados."))
@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.db import connection, transaction
 
+from common import catalogs
+
 
 SQL = """
 CREATE SCHEMA IF NOT EXISTS app;
@@ -21,6 +23,8 @@ CREATE TABLE IF NOT EXISTS app.usuarios (
   actualizado_en TIMESTAMPTZ NOT NULL DEFAULT NOW(),
   ultimo_login TIMESTAMPTZ
 );
+-- Búsquedas de email sin distinguir mayúsculas (alta masiva, accounts/onboarding.py)
+CREATE INDEX IF NOT EXISTS usuarios_email_lower_idx ON app.usuarios (lower(email));
 
 INSERT INTO app.roles (nombre, descripcion) VALUES
 ('user','Usuario estándar'),
@@ -38,5 +42,6 @@ class Command(BaseCommand):
         with transaction.atomic():
             with connection.cursor() as cursor:
                 cursor.execute(SQL)
+        catalogs.invalidate_all()
         self.stdout.write(self.style.SUCCESS("Esquema y tablas base creadas (app.roles, app.usuarios)."))
 
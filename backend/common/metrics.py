@@ -0,0 +1,144 @@
+"""
+Métricas de proceso en memoria (contadores, gauges y resúmenes de latencia).
+
+Cada worker mantiene sus propios valores; GET /api/metrics/ expone la instantánea
+del proceso que atiende la petición. Pensado para diagnóstico, no como sustituto
+de un sistema de monitoreo externo.
+"""
+
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+
+class Counter:
+    """
+    Contador monotónico seguro entre hilos.
+    """
+
+    def __init__(self, name: str, help_text: str = "") -> None:
+        self.name = name
+        self.help = help_text
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def snapshot(self) -> Any:
+        return self._value
+
+
+class Gauge:
+    """
+    Valor instantáneo (p. ej. profundidad de cola).
+    """
+
+    def __init__(self, name: str, help_text: str = "") -> None:
+        self.name = name
+        self.help = help_text
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> Any:
+        return self._value
+
+
+class Summary:
+    """
+    Resumen de observaciones (latencias en segundos): total, suma, máximo y
+    percentiles sobre una ventana reciente acotada.
+    """
+
+    def __init__(self, name: str, help_text: str = "", window: int = 1024) -> None:
+        self.name = name
+        self.help = help_text
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._recent: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+            self._recent.append(value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            data = sorted(self._recent)
+        if not data:
+            return None
+        idx = min(len(data) - 1, int(round(q * (len(data) - 1))))
+        return data[idx]
+
+    def snapshot(self) -> Any:
+        return {
+            "count": self._count,
+            "sum": round(self._sum, 6),
+            "max": round(self._max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas por nombre (get-or-create).
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, help_text, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"La métrica '{name}' ya existe con otro tipo")
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def summary(self, name: str, help_text: str = "", window: int = 1024) -> Summary:
+        return self._get_or_create(Summary, name, help_text, window=window)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: m.snapshot() for m in sorted(metrics, key=lambda m: m.name)}
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,114 @@
+"""
+Paginación keyset (por cursor) para los listados.
+
+El orden es siempre descendente por ``(campo_tiempo, id)`` y el cursor opaco
+codifica la última pareja devuelta; la página siguiente filtra
+``(campo, id) < (ts, id)``, que usa el índice compuesto correspondiente
+(ver ``manage.py create_keyset_indexes``) y cuesta lo mismo en cualquier página,
+a diferencia de OFFSET.
+
+Migración de clientes:
+- Con ``?cursor=`` o ``?page_size=`` la respuesta es ``{"next", "next_cursor", "results"}``.
+- Sin esos parámetros se mantiene la lista plana de siempre, pero acotada a
+  ``KEYSET_LEGACY_MAX_PAGE_SIZE`` elementos; si hay más, se informan las
+  cabeceras ``X-Next-Cursor`` y ``Link: <...>; rel="next"``.
+"""
+
+import base64
+import json
+from typing import Any, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(ts, pk: int) -> str:
+    raw = json.dumps([ts.isoformat(), pk], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts_raw, pk = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        ts = parse_datetime(ts_raw)
+        if ts is None or not isinstance(pk, int):
+            raise ValueError
+        return ts, pk
+    except (ValueError, TypeError, UnicodeError):
+        raise serializers.ValidationError({"cursor": "Cursor inválido"})
+
+
+class KeysetPagination:
+    """
+    Uso en una vista::
+
+        paginator = KeysetPagination("creado_en")
+        page = paginator.paginate_queryset(qs, request)
+        return paginator.get_paginated_response(Serializer(page, many=True).data)
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def __init__(self, field: str) -> None:
+        self.field = field
+        self.request = None
+        self.envelope = False
+        self.next_cursor: Optional[str] = None
+
+    def _page_size(self, request) -> int:
+        max_size = getattr(settings, "KEYSET_MAX_PAGE_SIZE", 100)
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw is None:
+            if self.envelope:
+                return min(settings.REST_FRAMEWORK.get("PAGE_SIZE", 20), max_size)
+            return getattr(settings, "KEYSET_LEGACY_MAX_PAGE_SIZE", 500)
+        try:
+            size = int(raw)
+        except ValueError:
+            raise serializers.ValidationError({"page_size": "Debe ser un entero"})
+        return max(1, min(size, max_size))
+
+    def paginate_queryset(self, queryset, request) -> List[Any]:
+        self.request = request
+        params = request.query_params
+        self.envelope = self.cursor_query_param in params or self.page_size_query_param in params
+        page_size = self._page_size(request)
+
+        queryset = queryset.order_by(f"-{self.field}", "-id")
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            ts, pk = decode_cursor(cursor)
+            # El primer filtro acota el rango del índice; el OR desempata por id
+            queryset = queryset.filter(**{f"{self.field}__lte": ts}).filter(
+                Q(**{f"{self.field}__lt": ts}) | Q(id__lt=pk)
+            )
+
+        rows = list(queryset[: page_size + 1])
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            if isinstance(last, dict):
+                self.next_cursor = encode_cursor(last[self.field], last["id"])
+            else:
+                self.next_cursor = encode_cursor(getattr(last, self.field), last.id)
+        return rows
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.next_cursor:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data, status: int = 200) -> Response:
+        if self.envelope:
+            return Response({"next": self.get_next_link(), "next_cursor": self.next_cursor, "results": data}, status=status)
+        headers = {}
+        if self.next_cursor:
+            headers["X-Next-Cursor"] = self.next_cursor
+            headers["Link"] = f'<{self.get_next_link()}>; rel="next"'
+        return Response(data, status=status, headers=headers)
@@ -0,0 +1,462 @@
+"""
+Capa de canales (Django Channels) sobre PostgreSQL LISTEN/NOTIFY.
+
+Permite el fan-out entre varios workers ASGI sin Redis, usando la base de datos
+que ya tenemos:
+
+- ``group_send(grupo, msg)`` hace ``NOTIFY`` en un canal de PostgreSQL derivado del
+  grupo; cada proceso con miembros locales del grupo tiene un ``LISTEN`` sobre él y
+  entrega el mensaje a sus canales.
+- ``send(canal, msg)`` notifica en el canal derivado de la parte no local del nombre
+  (``specific.<proceso>!``), que solo escucha el proceso que lo creó.
+- Los payloads que superan el límite de NOTIFY (8000 bytes) se guardan en la tabla
+  ``app.channels_spill`` y se notifica solo su id. La tabla la crea la propia capa en
+  el primer uso y las filas se purgan tras ``spill_ttl`` segundos.
+
+Cada proceso abre dos conexiones propias (fuera del ORM, en autocommit): una para
+enviar y otra para escuchar, atendida por un hilo daemon. Los mensajes se entregan
+a lo sumo una vez; si la conexión de escucha se cae, lo notificado mientras tanto se
+pierde (los eventos de alertas se recuperan con el replay del outbox).
+
+Los mensajes no recibidos caducan a los ``expiry`` segundos. La cola de un canal se
+descarta cuando deja su último grupo o su receptor se cancela (consumidor desconectado)
+sin mensajes pendientes; las que quedan sin receptor ni grupos se barren al caducar.
+Como en channels_redis, la pertenencia a un grupo caduca a los ``group_expiry`` segundos
+del último ``group_add`` (que la renueva): un socket que muere sin ``group_discard`` (worker
+caído) deja de recibir y su cola se descarta.
+``close()`` detiene el hilo de escucha y cierra ambas conexiones.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+import psycopg2
+from psycopg2 import sql
+from channels.layers import BaseChannelLayer
+from django.db import connections
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Límite de NOTIFY: 8000 bytes incluyendo el nombre del canal; margen para la envoltura
+NOTIFY_MAX_BYTES = 7800
+
+sent_counter = registry.counter("channels.pg.sent", "NOTIFY enviados por la capa de canales PostgreSQL")
+spilled_counter = registry.counter("channels.pg.spilled", "Mensajes guardados en app.channels_spill por tamaño")
+delivered_counter = registry.counter("channels.pg.delivered", "Mensajes entregados a canales locales")
+dropped_counter = registry.counter("channels.pg.dropped", "Mensajes descartados por canal local lleno")
+
+
+def _pg_channel(kind: str, name: str) -> str:
+    # Identificador estable, en minúsculas y < 63 bytes para cualquier nombre de grupo/canal
+    return f"cl_{kind}_{hashlib.sha1(name.encode('utf-8')).hexdigest()[:32]}"
+
+
+class _Inbox:
+    """
+    Cola de un canal local: el hilo de escucha agrega y ``receive`` espera en su propio loop.
+    """
+
+    def __init__(self) -> None:
+        self.messages: Deque[Tuple[float, Dict[str, Any]]] = deque()  # (caduca_en, mensaje)
+        self.waiter: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = None
+
+    def drop_expired(self, now: float) -> None:
+        while self.messages and self.messages[0][0] <= now:
+            self.messages.popleft()
+
+
+class PostgresChannelLayer(BaseChannelLayer):
+    """
+    Configuración::
+
+        CHANNEL_LAYERS = {"default": {
+            "BACKEND": "common.pg_channel_layer.PostgresChannelLayer",
+            "CONFIG": {"database": "default", "capacity": 100, "spill_ttl": 60, "group_expiry": 86400},
+        }}
+    """
+
+    extensions = ["groups", "flush"]
+
+    # Segundos máximos de espera a que el hilo de escucha confirme un LISTEN/UNLISTEN
+    LISTEN_TIMEOUT = 10.0
+
+    def __init__(self, database: str = "default", expiry: int = 60, group_expiry: int = 86400, capacity: int = 100,
+                 channel_capacity=None, spill_table: str = "app.channels_spill", spill_ttl: float = 60.0, **kwargs) -> None:
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.group_expiry = group_expiry
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.database = database
+        self.spill_table = spill_table
+        self.spill_ttl = spill_ttl
+        self.client_id = f"pg{os.getpid()}x{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._inboxes: Dict[str, _Inbox] = {}
+        self._groups: Dict[str, Dict[str, float]] = {}  # grupo -> {canal: último group_add}
+        self._memberships: Dict[str, Set[str]] = {}  # canal -> grupos
+        self._last_sweep = time.monotonic()
+        self._closed = threading.Event()
+        self._listening: Set[str] = set()
+        self._routes: Dict[str, Tuple[str, str]] = {}
+        self._send_conn = None
+        self._send_lock = threading.Lock()
+        self._spill_ready = False
+        self._last_spill_purge = 0.0
+        self._commands: Deque[Tuple[str, str, Future]] = deque()
+        self._wake_r, self._wake_w = os.pipe()
+        self._listener: Optional[threading.Thread] = None
+
+    # Conexiones
+
+    def _connect(self):
+        params = connections[self.database].get_connection_params()
+        conn = psycopg2.connect(**params)
+        conn.autocommit = True
+        return conn
+
+    def _execute_send(self, query, params) -> Any:
+        with self._send_lock:
+            for attempt in (1, 2):
+                try:
+                    if self._send_conn is None or self._send_conn.closed:
+                        self._send_conn = self._connect()
+                    with self._send_conn.cursor() as cur:
+                        cur.execute(query, params)
+                        return cur.fetchone() if cur.description else None
+                except psycopg2.OperationalError:
+                    self._send_conn = None
+                    if attempt == 2:
+                        raise
+
+    # Envío
+
+    def _encode(self, target: Dict[str, Any], message: Dict[str, Any]) -> str:
+        payload = json.dumps({**target, "m": message}, separators=(",", ":"))
+        if len(payload.encode("utf-8")) <= NOTIFY_MAX_BYTES:
+            return payload
+        self._ensure_spill_table()
+        (spill_id,) = self._execute_send(f"INSERT INTO {self.spill_table} (payload) VALUES (%s) RETURNING id", [payload])
+        spilled_counter.inc()
+        now = time.monotonic()
+        if now - self._last_spill_purge > self.spill_ttl:
+            self._last_spill_purge = now
+            self._execute_send(
+                f"DELETE FROM {self.spill_table} WHERE creado_en < NOW() - make_interval(secs => %s)", [self.spill_ttl]
+            )
+        return json.dumps({"spill": spill_id})
+
+    def _ensure_spill_table(self) -> None:
+        if self._spill_ready:
+            return
+        schema = self.spill_table.split(".")[0] if "." in self.spill_table else None
+        if schema:
+            self._execute_send(f"CREATE SCHEMA IF NOT EXISTS {schema}", None)
+        self._execute_send(
+            f"CREATE TABLE IF NOT EXISTS {self.spill_table} ("
+            "id BIGSERIAL PRIMARY KEY, payload TEXT NOT NULL, creado_en TIMESTAMPTZ NOT NULL DEFAULT NOW())",
+            None,
+        )
+        self._spill_ready = True
+
+    def _notify(self, pg_channel: str, target: Dict[str, Any], message: Dict[str, Any]) -> None:
+        self._execute_send("SELECT pg_notify(%s, %s)", [pg_channel, self._encode(target, message)])
+        sent_counter.inc()
+
+    async def send(self, channel: str, message: Dict[str, Any]) -> None:
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        pg_channel = _pg_channel("c", self.non_local_name(channel))
+        await asyncio.get_running_loop().run_in_executor(None, self._notify, pg_channel, {"c": channel}, message)
+
+    async def group_send(self, group: str, message: Dict[str, Any]) -> None:
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+        await asyncio.get_running_loop().run_in_executor(None, self._notify, _pg_channel("g", group), {"g": group}, message)
+
+    # Recepción
+
+    async def new_channel(self, prefix: str = "specific") -> str:
+        return f"{prefix}.{self.client_id}!{uuid.uuid4().hex[:12]}"
+
+    def _discard_inbox(self, channel: str) -> None:
+        # Con self._lock: sin receptor esperando, sin grupos y sin mensajes pendientes
+        inbox = self._inboxes.get(channel)
+        if inbox is not None and inbox.waiter is None and not inbox.messages and channel not in self._memberships:
+            del self._inboxes[channel]
+
+    def _sweep(self, now: float) -> None:
+        # Con self._lock: caduca mensajes y descarta colas abandonadas, como mucho una vez por ``expiry``
+        if now - self._last_sweep < self.expiry:
+            return
+        self._last_sweep = now
+        for group in list(self._groups):
+            self._live_members(group, now)
+        for channel, inbox in list(self._inboxes.items()):
+            inbox.drop_expired(now)
+            self._discard_inbox(channel)
+
+    async def receive(self, channel: str) -> Dict[str, Any]:
+        self.require_valid_channel_name(channel)
+        await self._listen("c", self.non_local_name(channel))
+        while True:
+            with self._lock:
+                # Se busca en cada vuelta: el barrido puede haber descartado la cola vacía
+                inbox = self._inboxes.get(channel)
+                if inbox is None:
+                    inbox = self._inboxes[channel] = _Inbox()
+                inbox.drop_expired(time.monotonic())
+                if inbox.messages:
+                    return inbox.messages.popleft()[1]
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                inbox.waiter = (loop, future)
+            try:
+                await future
+            finally:
+                with self._lock:
+                    if inbox.waiter is not None and inbox.waiter[1] is future:
+                        inbox.waiter = None
+                    if future.cancelled():
+                        # El receptor se fue (p. ej. consumidor desconectado)
+                        self._discard_inbox(channel)
+
+    def _deliver(self, channel: str, message: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            inbox = self._inboxes.get(channel)
+            if inbox is None:
+                inbox = self._inboxes[channel] = _Inbox()
+            inbox.drop_expired(now)
+            if len(inbox.messages) >= self.get_capacity(channel):
+                dropped_counter.inc()
+                return
+            inbox.messages.append((now + self.expiry, message))
+            waiter, inbox.waiter = inbox.waiter, None
+        delivered_counter.inc()
+        if waiter is not None:
+            loop, future = waiter
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+    # Grupos
+
+    async def group_add(self, group: str, channel: str) -> None:
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        with self._lock:
+            self._groups.setdefault(group, {})[channel] = time.monotonic()
+            self._memberships.setdefault(channel, set()).add(group)
+        await self._listen("g", group)
+
+    async def group_discard(self, group: str, channel: str) -> None:
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        with self._lock:
+            if group not in self._groups:
+                return
+            empty = self._remove_member(group, channel)
+        if empty:
+            await self._submit("UNLISTEN", _pg_channel("g", group))
+
+    def _remove_member(self, group: str, channel: str) -> bool:
+        # Con self._lock: saca ``channel`` de ``group``; True si el grupo quedó vacío
+        groups = self._memberships.get(channel)
+        if groups is not None:
+            groups.discard(group)
+            if not groups:
+                del self._memberships[channel]
+                self._discard_inbox(channel)
+        members = self._groups[group]
+        members.pop(channel, None)
+        if members:
+            return False
+        del self._groups[group]
+        return True
+
+    def _live_members(self, group: str, now: float) -> List[str]:
+        """
+        Con self._lock: miembros vigentes de ``group``; saca los que superan ``group_expiry``
+        y, si el grupo se vacía, encola su UNLISTEN para el hilo de escucha.
+        """
+        members = self._groups.get(group)
+        if not members:
+            return []
+        cutoff = now - self.group_expiry
+        for channel in [c for c, added_at in members.items() if added_at <= cutoff]:
+            if self._remove_member(group, channel):
+                self._commands.append(("UNLISTEN", _pg_channel("g", group), Future()))
+                return []
+        return list(members)
+
+    async def _submit(self, command: str, pg_channel: str) -> None:
+        """
+        Ejecuta LISTEN/UNLISTEN en la conexión de escucha y espera a que quede activo.
+        """
+        if self._closed.is_set():
+            raise RuntimeError("La capa de canales está cerrada")
+        future: Future = Future()
+        with self._lock:
+            self._commands.append((command, pg_channel, future))
+        self._ensure_listener()
+        os.write(self._wake_w, b"x")
+        await asyncio.wait_for(asyncio.wrap_future(future), self.LISTEN_TIMEOUT)
+
+    async def flush(self) -> None:
+        with self._lock:
+            self._inboxes.clear()
+            self._groups.clear()
+            self._memberships.clear()
+            self._routes.clear()
+            listening = bool(self._listening)
+        if listening:
+            await self._submit("UNLISTEN", "*")
+
+    async def close(self) -> None:
+        """
+        Detiene el hilo de escucha (que hace ``UNLISTEN *``) y cierra conexiones y pipe. Idempotente.
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        listener = self._listener
+        if listener is not None and listener.is_alive():
+            os.write(self._wake_w, b"x")
+            await asyncio.get_running_loop().run_in_executor(None, listener.join, self.LISTEN_TIMEOUT)
+        with self._send_lock:
+            if self._send_conn is not None:
+                self._send_conn.close()
+                self._send_conn = None
+        with self._lock:
+            self._inboxes.clear()
+            self._groups.clear()
+            self._memberships.clear()
+            self._listening.clear()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    # Hilo de escucha
+
+    async def _listen(self, kind: str, name: str) -> None:
+        pg_channel = _pg_channel(kind, name)
+        with self._lock:
+            self._routes[pg_channel] = (kind, name)
+            if pg_channel in self._listening:
+                return
+        await self._submit("LISTEN", pg_channel)
+
+    def _ensure_listener(self) -> None:
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen_forever, name="pg-channel-layer", daemon=True)
+                self._listener.start()
+
+    def _listen_forever(self) -> None:
+        while not self._closed.is_set():
+            try:
+                conn = self._connect()
+            except psycopg2.OperationalError:
+                logger.exception("Capa de canales: no se pudo conectar a PostgreSQL; reintento en 1s")
+                self._closed.wait(1)
+                continue
+            try:
+                self._resubscribe(conn)
+                self._loop(conn)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                logger.exception("Capa de canales: conexión de escucha perdida; reconectando")
+            finally:
+                conn.close()
+        self._fail_commands(RuntimeError("La capa de canales está cerrada"))
+
+    def _fail_commands(self, exc: Exception) -> None:
+        with self._lock:
+            pending: List[Tuple[str, str, Future]] = list(self._commands)
+            self._commands.clear()
+        for _, _, future in pending:
+            if not future.done():
+                future.set_exception(exc)
+
+    def _resubscribe(self, conn) -> None:
+        with self._lock:
+            channels = list(self._listening)
+        with conn.cursor() as cur:
+            for pg_channel in channels:
+                cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(pg_channel)))
+
+    def _loop(self, conn) -> None:
+        while True:
+            if self._closed.is_set():
+                with conn.cursor() as cur:
+                    cur.execute("UNLISTEN *")
+                return
+            self._run_commands(conn)
+            # Un LISTEN/UNLISTEN puede haber leído ya notificaciones del socket: no esperar en select
+            if not conn.notifies:
+                readable, _, _ = select.select([conn, self._wake_r], [], [], 5.0)
+                if self._wake_r in readable:
+                    os.read(self._wake_r, 4096)
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    self._dispatch(conn, notify.payload)
+                except Exception:
+                    logger.exception("Capa de canales: mensaje inválido en %s", notify.channel)
+
+    def _run_commands(self, conn) -> None:
+        while True:
+            with self._lock:
+                if not self._commands:
+                    return
+                command, pg_channel, future = self._commands.popleft()
+            with self._lock:
+                kind, name = self._routes.get(pg_channel, ("", ""))
+                if command == "UNLISTEN" and kind == "g" and self._groups.get(name):
+                    # Un group_add posterior volvió a necesitar el LISTEN
+                    future.set_result(None)
+                    continue
+            try:
+                with conn.cursor() as cur:
+                    if pg_channel == "*":
+                        cur.execute("UNLISTEN *")
+                    else:
+                        cur.execute(sql.SQL(command + " {}").format(sql.Identifier(pg_channel)))
+            except Exception as exc:
+                future.set_exception(exc)
+                raise
+            with self._lock:
+                if pg_channel == "*":
+                    self._listening.clear()
+                elif command == "LISTEN":
+                    self._listening.add(pg_channel)
+                else:
+                    self._listening.discard(pg_channel)
+            future.set_result(None)
+
+    def _dispatch(self, conn, payload: str) -> None:
+        data = json.loads(payload)
+        if "spill" in data:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT payload FROM {self.spill_table} WHERE id = %s", [data["spill"]])
+                row = cur.fetchone()
+            if row is None:
+                return
+            data = json.loads(row[0])
+        message = data["m"]
+        if "c" in data:
+            self._deliver(data["c"], message)
+            return
+        with self._lock:
+            members = self._live_members(data["g"], time.monotonic())
+        for channel in members:
+            self._deliver(channel, dict(message))
@@ -1,3 +1,207 @@
-from django.test import TestCase
+import asyncio
+import os
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from common import catalogs
+
+
+DDL = """
+CREATE SCHEMA IF NOT EXISTS app;
+
+CREATE TABLE IF NOT EXISTS app.roles (
+  id BIGSERIAL PRIMARY KEY,
+  nombre VARCHAR(32) NOT NULL UNIQUE
+);
+ALTER TABLE app.roles ADD COLUMN IF NOT EXISTS descripcion TEXT;
+
+INSERT INTO app.roles (nombre) VALUES ('user'),('nurse') ON CONFLICT (nombre) DO NOTHING;
+"""
+
+
+class CatalogCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with connection.cursor() as cursor:
+            cursor.execute(DDL)
+        catalogs.invalidate_all()
+
+    def test_lookups_served_from_memory_and_invalidated_on_save(self):
+        from accounts.models import Role
+
+        self.assertEqual(catalogs.roles.get("NURSE").nombre, "nurse")
+        with self.assertNumQueries(0):
+            self.assertEqual(catalogs.roles.get(" User ").nombre, "user")
+            self.assertIsNone(catalogs.roles.get("auditor"))
+
+        # Alta vía ORM (admin) -> post_save invalida y la siguiente consulta recarga
+        Role.objects.create(nombre="auditor")
+        self.assertIsNotNone(catalogs.roles.get("auditor"))
+
+    def test_process_local_cache_reloads_without_shared_version(self):
+        self.assertEqual(catalogs.roles.get("nurse").nombre, "nurse")
+        # Cambio hecho por otro proceso: sin señal ni versión visible en LocMem
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO app.roles (nombre) VALUES ('farmacia')")
+        self.assertIsNone(catalogs.roles.get("farmacia"))
+        with self.settings(CATALOG_CACHE_CHECK_INTERVAL=0):
+            self.assertIsNotNone(catalogs.roles.get("farmacia"))
+
+
+class GeoTests(SimpleTestCase):
+    def test_geohash_and_distance(self):
+        from common import geo
+
+        self.assertEqual(geo.geohash_encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+        lat_min, lon_min, lat_max, lon_max = geo.geohash_bbox("u4pruydqqvj")
+        self.assertTrue(lat_min <= 57.64911 <= lat_max and lon_min <= 10.40744 <= lon_max)
+        self.assertAlmostEqual(geo.haversine_m(-17.78, -63.19, -17.79, -63.19), 1111.95, delta=1)
+        box = geo.bbox_around(-17.78, -63.19, 1000)
+        self.assertAlmostEqual(geo.haversine_m(-17.78, -63.19, box[2], -63.19), 1000, delta=1)
+        self.assertEqual(geo.precision_for_zoom(12), 5)
+
+
+class TimeseriesTests(SimpleTestCase):
+    def test_lttb_keeps_size_endpoints_and_peaks(self):
+        import numpy as np
+        from common.timeseries import lttb
+
+        x = np.arange(10000, dtype=float)
+        y = np.sin(x / 500)
+        y[4321] = 50  # pico aislado
+        keep = lttb(x, y, 200)
+        self.assertEqual(len(keep), 200)
+        self.assertEqual((keep[0], keep[-1]), (0, 9999))
+        self.assertTrue(np.all(np.diff(keep) > 0))
+        self.assertIn(4321, keep)
+        self.assertEqual(list(lttb(x[:5], y[:5], 200)), [0, 1, 2, 3, 4])
+
+
+class PostgresChannelLayerTests(TransactionTestCase):
+    """
+    Dos instancias de la capa simulan dos workers: cada una con sus propias conexiones
+    (fuera de la transacción del test, de ahí TransactionTestCase).
+    """
+
+    def setUp(self):
+        from common.pg_channel_layer import PostgresChannelLayer
+
+        self.worker_a, self.worker_b = PostgresChannelLayer(), PostgresChannelLayer()
+
+    def tearDown(self):
+        for layer in (self.worker_a, self.worker_b):
+            async_to_sync(layer.close)()
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS app.channels_spill")
+
+    def test_fan_out_between_layers(self):
+        worker_a, worker_b = self.worker_a, self.worker_b
+
+        async def scenario():
+            ch_a, ch_b = await worker_a.new_channel(), await worker_b.new_channel()
+            await worker_a.group_add("alerts.nurses", ch_a)
+            await worker_b.group_add("alerts.nurses", ch_b)
+            await worker_b.group_add("alerts.user.7", ch_b)
+
+            await worker_a.group_send("alerts.nurses", {"type": "alerts.message", "seq": 1})
+            self.assertEqual((await asyncio.wait_for(worker_a.receive(ch_a), 5))["seq"], 1)
+            self.assertEqual((await asyncio.wait_for(worker_b.receive(ch_b), 5))["seq"], 1)
+
+            # Payload por encima del límite de NOTIFY: viaja por la tabla de desborde
+            big = {"type": "alerts.message", "seq": 2, "payload": "x" * 20000}
+            await worker_a.group_send("alerts.user.7", big)
+            self.assertEqual(await asyncio.wait_for(worker_b.receive(ch_b), 5), big)
+
+            # Envío directo a un canal de otro worker
+            await worker_a.send(ch_b, {"type": "ping"})
+            self.assertEqual(await asyncio.wait_for(worker_b.receive(ch_b), 5), {"type": "ping"})
+
+            # Tras group_discard ya no se entrega
+            await worker_b.group_discard("alerts.nurses", ch_b)
+            await worker_a.group_send("alerts.nurses", {"type": "alerts.message", "seq": 3})
+            self.assertEqual((await asyncio.wait_for(worker_a.receive(ch_a), 5))["seq"], 3)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(worker_b.receive(ch_b), 0.5)
+
+        async_to_sync(scenario)()
+
+    def test_group_membership_expires_unless_renewed(self):
+        from common.pg_channel_layer import _pg_channel
+
+        layer = self.worker_a
+
+        def age(channel):
+            layer._groups["alerts.nurses"][channel] -= 2 * layer.group_expiry
+
+        async def scenario():
+            stale, live = await layer.new_channel(), await layer.new_channel()
+            await layer.group_add("alerts.nurses", stale)
+            await layer.group_add("alerts.nurses", live)
+            age(stale)
+            age(live)
+            await layer.group_add("alerts.nurses", live)  # renueva solo este
+
+            # El socket muerto (sin group_discard) deja de recibir y su cola se descarta
+            await layer.group_send("alerts.nurses", {"type": "alerts.message", "seq": 1})
+            self.assertEqual((await asyncio.wait_for(layer.receive(live), 5))["seq"], 1)
+            self.assertEqual(list(layer._groups["alerts.nurses"]), [live])
+            self.assertNotIn(stale, layer._inboxes)
+            self.assertNotIn(stale, layer._memberships)
+
+            # Grupo vacío por caducidad: se deja de escuchar su canal de PostgreSQL
+            age(live)
+            await layer.group_send("alerts.nurses", {"type": "alerts.message", "seq": 2})
+            group_channel = _pg_channel("g", "alerts.nurses")
+            for _ in range(50):
+                if group_channel not in layer._listening:
+                    break
+                await asyncio.sleep(0.05)
+            self.assertEqual(layer._groups, {})
+            self.assertNotIn(group_channel, layer._listening)
+
+        async_to_sync(scenario)()
+
+    def test_inbox_cleanup_expiry_flush_and_close(self):
+        layer = self.worker_a
+
+        async def scenario():
+            channel = await layer.new_channel()
+            await layer.group_add("alerts.nurses", channel)
+            await layer.group_send("alerts.nurses", {"type": "alerts.message", "seq": 1})
+            self.assertEqual((await asyncio.wait_for(layer.receive(channel), 5))["seq"], 1)
+            # Sale de su último grupo: la cola vacía se descarta
+            await layer.group_discard("alerts.nurses", channel)
+            self.assertNotIn(channel, layer._inboxes)
+
+            # Receptor cancelado (consumidor desconectado) sin grupos: tampoco queda cola
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(channel), 0.2)
+            self.assertNotIn(channel, layer._inboxes)
+
+            # Los mensajes no recibidos caducan a los ``expiry`` segundos
+            layer.expiry = 0.2
+            await layer.send(channel, {"type": "ping"})
+            for _ in range(50):
+                if layer._inboxes.get(channel):
+                    break
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(0.3)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(channel), 0.2)
+
+            await layer.group_add("alerts.user.7", channel)
+            self.assertTrue(layer._listening)
+            await layer.flush()
+            self.assertEqual((layer._listening, layer._inboxes, layer._groups), (set(), {}, {}))
+
+            await layer.close()
+            await layer.close()
+
+        async_to_sync(scenario)()
+        self.assertFalse(layer._listener.is_alive())
+        self.assertIsNone(layer._send_conn)
+        with self.assertRaises(OSError):
+            os.fstat(layer._wake_r)
@@ -0,0 +1,36 @@
+"""
+Reducción de series temporales para gráficas.
+
+``lttb`` implementa Largest-Triangle-Three-Buckets (Steinarsson, 2013): conserva el primer
+y el último punto y, de cada tramo intermedio, el que forma el triángulo de mayor área con
+el punto elegido en el tramo anterior y la media del siguiente. A diferencia de promediar,
+mantiene picos y valles visibles con un número fijo de puntos.
+"""
+
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Índices (ascendentes) de a lo sumo ``threshold`` puntos de la serie ``(x, y)`` ordenada por ``x``.
+    """
+    n = len(x)
+    if threshold >= n or n <= 2:
+        return np.arange(n)
+    if threshold <= 2:
+        return np.array([0, n - 1][:max(threshold, 0)], dtype=np.int64)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import HealthView
+from .views import HealthView, MetricsView
 
 urlpatterns = [
     # Ruta base /api/health/
     path('health/', HealthView.as_view(), name='health'),
+    # Métricas de proceso (solo admin)
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
 
@@ -1,6 +1,10 @@
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from accounts.permissions import IsAdmin
+from .metrics import registry
+
 
 class HealthView(APIView):
     """
@@ -10,3 +14,15 @@ class HealthView(APIView):
 
     def get(self, request):
         return Response({"status": "ok"})
+
+
+class MetricsView(APIView):
+    """
+    GET /api/metrics/ (admin)
+    Instantánea de las métricas en memoria del worker que atiende la petición.
+    """
+
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        return Response(registry.snapshot())
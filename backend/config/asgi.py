@@ -2,7 +2,9 @@
 Configuración ASGI para soportar HTTP y WebSockets (Channels).
 
 - En desarrollo se usa InMemoryChannelLayer (configurado en settings).
-- En producción se recomienda Redis como capa de canales.
+- En producción (varios workers) usar una capa compartida: CHANNEL_LAYER=postgres (LISTEN/NOTIFY) o Redis.
+- /api/alerts/stream (Server-Sent Events, alerts/sse.py) se atiende aquí de forma asíncrona;
+  el resto de HTTP va a Django.
 
 Documentación:
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -12,15 +14,21 @@ https://channels.readthedocs.io/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.urls import path, re_path
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
-from alerts.routing import websocket_urlpatterns
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 django_asgi_app = get_asgi_application()
 
+from alerts.routing import websocket_urlpatterns  # noqa: E402  (requiere las apps cargadas)
+from alerts.sse import AlertsEventStream  # noqa: E402
+
 application = ProtocolTypeRouter({
-    "http": django_asgi_app,
+    "http": URLRouter([
+        path("api/alerts/stream", AlertsEventStream()),
+        re_path(r"", django_asgi_app),
+    ]),
     "websocket": AuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
 })
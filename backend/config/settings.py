@@ -129,6 +129,37 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hashers de contraseñas. El primero es el preferido; el PBKDF2 de Django se sustituye por una
+# variante con iteraciones ajustables (mismo algoritmo "pbkdf2_sha256", ver accounts/hashers.py).
+PASSWORD_HASHERS = [
+    "accounts.hashers.TunedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# Iteraciones PBKDF2 (vacío = valor por defecto de Django). Calibrar con: manage.py calibrate_hashers
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv("PASSWORD_PBKDF2_ITERATIONS", "0")) or None
+
+# Re-hashear en segundo plano tras un login correcto si el hash usa parámetros antiguos
+PASSWORD_REHASH_ON_LOGIN = os.getenv("PASSWORD_REHASH_ON_LOGIN", "true").lower() == "true"
+
+# Volcado diferido de ultimo_login (ver accounts/login_buffer.py). ENABLED=false lo escribe en línea.
+LAST_LOGIN_WRITE_BEHIND = {
+    "ENABLED": os.getenv("LAST_LOGIN_WRITE_BEHIND", "true").lower() == "true",
+    "FLUSH_INTERVAL": float(os.getenv("LAST_LOGIN_FLUSH_INTERVAL", "5")),  # demora máxima en segundos
+    "MAX_PENDING": int(os.getenv("LAST_LOGIN_MAX_PENDING", "5000")),        # vuelca antes si se alcanza
+}
+
+# Pool de procesos para hashing de contraseñas (ver accounts/hashing.py).
+# WORKERS=0 ejecuta el hashing en el hilo de la petición.
+PASSWORD_HASHING_POOL = {
+    "WORKERS": int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    "MAX_QUEUE": int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "16")),        # en cola además de los procesos ocupados
+    "QUEUE_TIMEOUT": float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "10")),  # segundos máximos de espera
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -183,13 +214,130 @@ REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
-# Channels (capa en memoria para desarrollo; Redis en entornos productivos)
-CHANNEL_LAYERS = {
+# Caché compartida entre workers (LocMem por defecto; configurar Redis/Memcached en producción).
+# La invalidación de estados de usuario y catálogos entre workers la requiere: con LocMem cada
+# proceso tiene su propia caché y esos datos se reducen a TTL cortos (PROCESS_LOCAL_TTL, CATALOG_CACHE_MAX_AGE).
+CACHES = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
+        "BACKEND": os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", "unihealth"),
+    }
+}
+
+# Caché del estado de usuario usada por JwtAuthentication (ver accounts/user_cache.py)
+AUTH_USER_STATUS_CACHE = {
+    "TTL": int(os.getenv("AUTH_USER_STATUS_TTL", "300")),                  # segundos en la caché compartida
+    "LOCAL_TTL": float(os.getenv("AUTH_USER_STATUS_LOCAL_TTL", "1")),      # segundos en el LRU por proceso (0 = desactivado)
+    "LOCAL_MAX_ENTRIES": int(os.getenv("AUTH_USER_STATUS_LOCAL_MAX", "10000")),
+    "PROCESS_LOCAL_TTL": int(os.getenv("AUTH_USER_STATUS_PROCESS_LOCAL_TTL", "5")),  # tope de TTL con caché por proceso (LocMem)
+}
+
+# Segundos entre comprobaciones de versión de los catálogos cacheados (ver common/catalogs.py)
+CATALOG_CACHE_CHECK_INTERVAL = float(os.getenv("CATALOG_CACHE_CHECK_INTERVAL", "5"))
+# Antigüedad máxima de un catálogo cacheado aunque su versión no cambie (con LocMem: CHECK_INTERVAL)
+CATALOG_CACHE_MAX_AGE = float(os.getenv("CATALOG_CACHE_MAX_AGE", "300"))
+
+# Tokens JWT ya verificados que se memorizan por proceso hasta su expiración (0 = desactivado)
+JWT_VERIFIED_CACHE_SIZE = int(os.getenv("JWT_VERIFIED_CACHE_SIZE", "4096"))
+
+# Paginación keyset de listados (ver common/pagination.py)
+KEYSET_MAX_PAGE_SIZE = int(os.getenv("KEYSET_MAX_PAGE_SIZE", "100"))            # tope de ?page_size=
+KEYSET_LEGACY_MAX_PAGE_SIZE = int(os.getenv("KEYSET_LEGACY_MAX_PAGE_SIZE", "500"))  # tope de la lista plana sin parámetros
+
+# Outbox de eventos de alertas (ver alerts/outbox.py). En producción: IN_PROCESS=false y
+# uno o más procesos `manage.py relay_alert_outbox` con una capa de canales compartida.
+ALERTS_OUTBOX = {
+    "IN_PROCESS": os.getenv("ALERTS_OUTBOX_IN_PROCESS", "true").lower() == "true",  # hilo relay en cada worker
+    "BATCH_SIZE": int(os.getenv("ALERTS_OUTBOX_BATCH_SIZE", "200")),
+    "POLL_INTERVAL": float(os.getenv("ALERTS_OUTBOX_POLL_INTERVAL", "1")),  # segundos con la cola vacía
+    "RETENTION": float(os.getenv("ALERTS_OUTBOX_RETENTION", "3600")),      # segundos que se guardan los ya publicados (buffer de replay)
+    "REPLAY_LIMIT": int(os.getenv("ALERTS_OUTBOX_REPLAY_LIMIT", "500")),    # eventos máximos a reenviar al reconectar
+    "PURGE_INTERVAL": float(os.getenv("ALERTS_OUTBOX_PURGE_INTERVAL", "300")),  # segundos entre purgas de eventos publicados
+    "PUBLISH_TIMEOUT": float(os.getenv("ALERTS_OUTBOX_PUBLISH_TIMEOUT", "10")),  # segundos máximos de envío de un lote a la capa
+}
+
+# Estadísticas incrementales de alertas (ver alerts/stats.py): filas por clave de contador
+ALERTS_STATS = {
+    "SHARDS": int(os.getenv("ALERTS_STATS_SHARDS", "16")),
+}
+
+# Despacho automático de alertas (ver alerts/dispatch.py). Prioridad de una alerta pendiente:
+# peso del tipo + AGE_WEIGHT por minuto de espera - DISTANCE_WEIGHT por km hasta el enfermero
+ALERTS_DISPATCH = {
+    "TYPE_WEIGHTS": {"cardio": 30.0, "trauma": 30.0, "otro": 10.0},
+    "DEFAULT_TYPE_WEIGHT": 10.0,
+    "AGE_WEIGHT": float(os.getenv("ALERTS_DISPATCH_AGE_WEIGHT", "1")),
+    "DISTANCE_WEIGHT": float(os.getenv("ALERTS_DISPATCH_DISTANCE_WEIGHT", "2")),
+    "INTERVAL": float(os.getenv("ALERTS_DISPATCH_INTERVAL", "2")),  # segundos entre rondas de `manage.py dispatch_alerts`
 }
 
+# Particiones mensuales de app.eventos_alerta (ver alerts/partitions.py y `manage.py maintain_alert_events`)
+ALERTS_EVENTS = {
+    "MONTHS_AHEAD": int(os.getenv("ALERTS_EVENTS_MONTHS_AHEAD", "2")),          # particiones creadas por adelantado
+    "RETENTION_MONTHS": int(os.getenv("ALERTS_EVENTS_RETENTION_MONTHS", "0")),  # 0 = sin retención
+}
+
+# Ingesta idempotente por lotes (ver alerts/ingest.py)
+ALERTS_INGEST = {
+    "MAX_BATCH": int(os.getenv("ALERTS_INGEST_MAX_BATCH", "500")),
+    "KEY_TTL": float(os.getenv("ALERTS_INGEST_KEY_TTL", "86400")),         # segundos que se recuerda una idempotency_key
+    "LRU_SIZE": int(os.getenv("ALERTS_INGEST_LRU_SIZE", "10000")),        # claves recientes en memoria por proceso (0 = desactivado)
+    "PURGE_INTERVAL": float(os.getenv("ALERTS_INGEST_PURGE_INTERVAL", "300")),
+}
+
+# Alta de signos vitales por lotes (ver medical/vitals_batch.py)
+VITALS_BATCH = {
+    "MAX_ROWS": int(os.getenv("VITALS_BATCH_MAX_ROWS", "5000")),
+    "MAX_FUTURE_SKEW": float(os.getenv("VITALS_BATCH_MAX_FUTURE_SKEW", "300")),  # segundos de reloj adelantado tolerados en tomado_en
+}
+
+# Puntuación de alerta temprana estilo NEWS2 al escribir signos vitales (ver medical/early_warning.py)
+VITALS_EWS = {
+    "WINDOW": float(os.getenv("VITALS_EWS_WINDOW", "3600")),            # segundos que cuenta el último valor de cada signo
+    "SCORE_THRESHOLD": int(os.getenv("VITALS_EWS_SCORE_THRESHOLD", "5")),  # total que dispara una alerta
+    "SINGLE_THRESHOLD": int(os.getenv("VITALS_EWS_SINGLE_THRESHOLD", "3")),  # componente que dispara por sí solo (0 = no)
+    "TIPO_ALERTA": os.getenv("VITALS_EWS_TIPO_ALERTA", "otro"),
+    "LRU_SIZE": int(os.getenv("VITALS_EWS_LRU_SIZE", "10000")),           # ventanas de paciente en memoria por proceso
+}
+
+# Historial de signos vitales para gráficas (ver medical/history.py y medical/rollups.py)
+VITALS_HISTORY = {
+    "DEFAULT_DAYS": float(os.getenv("VITALS_HISTORY_DEFAULT_DAYS", "7")),     # ventana sin desde/hasta
+    "DEFAULT_POINTS": int(os.getenv("VITALS_HISTORY_DEFAULT_POINTS", "500")),
+    "MAX_POINTS": int(os.getenv("VITALS_HISTORY_MAX_POINTS", "5000")),
+    "RAW_MAX_HOURS": float(os.getenv("VITALS_HISTORY_RAW_MAX_HOURS", "48")),  # ventanas más largas usan agregados
+}
+
+# Stream SSE de alertas (alerts/sse.py): latido y reintento sugerido al EventSource
+ALERTS_SSE = {
+    "HEARTBEAT": float(os.getenv("ALERTS_SSE_HEARTBEAT", "15")),   # segundos entre comentarios ": ping"
+    "RETRY_MS": int(os.getenv("ALERTS_SSE_RETRY_MS", "3000")),      # campo "retry:" enviado al conectar
+}
+
+# Celdas del mapa de alertas (ver alerts/geo.py): ventanas ya cerradas se cachean este tiempo
+ALERTS_GEO_CLUSTER_CACHE_TTL = int(os.getenv("ALERTS_GEO_CLUSTER_CACHE_TTL", "3600"))
+ALERTS_GEO_CLUSTER_OPEN_TTL = int(os.getenv("ALERTS_GEO_CLUSTER_OPEN_TTL", "30"))  # `abiertas` cambia: TTL corto
+
+# Channels: capa en memoria para desarrollo (un solo proceso). Con varios workers ASGI,
+# CHANNEL_LAYER=postgres usa LISTEN/NOTIFY sobre la misma BD (ver common/pg_channel_layer.py).
+if os.getenv("CHANNEL_LAYER", "memory").lower() == "postgres":
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "common.pg_channel_layer.PostgresChannelLayer",
+            "CONFIG": {
+                "capacity": int(os.getenv("CHANNEL_LAYER_CAPACITY", "100")),   # mensajes en cola por socket
+                "spill_ttl": float(os.getenv("CHANNEL_LAYER_SPILL_TTL", "60")),  # segundos en app.channels_spill
+                "group_expiry": int(os.getenv("CHANNEL_LAYER_GROUP_EXPIRY", "86400")),  # segundos de pertenencia sin renovar
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
+
 # drf-spectacular
 SPECTACULAR_SETTINGS = {
     "TITLE": "UNIHealth API",
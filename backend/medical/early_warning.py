@@ -0,0 +1,301 @@
+"""
+Puntuación de alerta temprana (estilo NEWS2) calculada al escribir signos vitales.
+
+Con los signos que registra ``app.signos_vitales`` se puntúan SpO2 (escala 1), presión
+sistólica, frecuencia cardiaca y temperatura con las bandas de NEWS2 (``BANDS``); no hay
+frecuencia respiratoria, nivel de conciencia ni O2 suplementario, así que es una NEWS2
+parcial (máximo 12).
+
+Por paciente se mantiene una ventana pequeña: el último valor de cada signo con su
+``tomado_en``, válido durante ``VITALS_EWS["WINDOW"]`` segundos. Cada lectura actualiza su
+ventana y la puntuación es la suma de los componentes vigentes. Las ventanas viven en un LRU
+por proceso junto con el ``tomado_en`` más reciente aplicado; si falta la de un paciente
+(reinicio) o la BD tiene lecturas posteriores que no son del lote (las escribió otro worker),
+se reconstruye con una consulta indexada de sus lecturas recientes. Cada comprobación es una
+sola consulta por lote para todos los pacientes.
+
+Cuando la puntuación cruza el umbral (total ``>= SCORE_THRESHOLD`` o un componente
+``>= SINGLE_THRESHOLD``) se crea una ``Alerta`` con ``fuente="admin"`` y su ``EventoAlerta``,
+salvo que el paciente ya tenga una alerta temprana abierta; esa comprobación se hace bajo un
+advisory lock por paciente para que dos escrituras concurrentes no dupliquen la alerta. El
+coste por lectura es un ``bisect`` por signo y una búsqueda en un dict; en lotes los
+componentes se calculan con NumPy. Benchmark: ``manage.py bench_early_warning``.
+"""
+
+import threading
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from alerts import outbox, stats
+from alerts.models import Alerta, EventoAlerta
+from alerts.serializers import AlertaReadSerializer
+from common import catalogs
+from common.metrics import registry
+
+# Bandas NEWS2: puntuación scores[i] para edges[i-1] < valor <= edges[i]
+BANDS: Dict[str, Tuple[Tuple[float, ...], Tuple[int, ...]]] = {
+    "spo2": ((91, 93, 95), (3, 2, 1, 0)),
+    "pas_sistolica": ((90, 100, 110, 219), (3, 2, 1, 0, 3)),
+    "fcritmo": ((40, 50, 90, 110, 130), (3, 1, 0, 1, 2, 3)),
+    "temp_c": ((35.0, 36.0, 38.0, 39.0), (3, 1, 0, 1, 2)),
+}
+SIGNS = tuple(BANDS)
+DESCRIPTION_PREFIX = "Alerta temprana"
+OPEN_STATES = ("pendiente", "en_curso")
+# Clase del advisory lock (pg_advisory_xact_lock(clase, paciente)) que serializa la creación de alertas tempranas
+ALERT_LOCK = 0x6E657773
+
+alerts_counter = registry.counter("vitals.ews.alerts", "Alertas creadas por la puntuación de alerta temprana")
+window_misses = registry.counter("vitals.ews.window_misses", "Ventanas de paciente reconstruidas desde la BD")
+
+Window = Dict[str, Tuple[float, int]]  # signo -> (epoch de tomado_en, puntos)
+
+
+def _config(name: str, default):
+    return getattr(settings, "VITALS_EWS", {}).get(name, default)
+
+
+def component(sign: str, value: float) -> int:
+    edges, scores = BANDS[sign]
+    return scores[bisect_left(edges, value)]
+
+
+def components_array(sign: str, values: np.ndarray) -> np.ndarray:
+    """
+    Puntuación del signo para toda una columna (``NaN`` = sin dato -> -1).
+    """
+    edges, scores = BANDS[sign]
+    result = np.asarray(scores)[np.searchsorted(edges, np.nan_to_num(values), side="left")]
+    return np.where(np.isnan(values), -1, result)
+
+
+def score(window: Window, at: float) -> Tuple[int, Dict[str, int]]:
+    """
+    ``(total, {signo: puntos})`` con los valores de ``window`` vigentes en ``at``.
+    """
+    since = at - float(_config("WINDOW", 3600))
+    parts = {sign: points for sign, (ts, points) in window.items() if ts >= since}
+    return sum(parts.values()), parts
+
+
+def is_alarm(total: int, parts: Dict[str, int]) -> bool:
+    single = int(_config("SINGLE_THRESHOLD", 3))
+    return total >= int(_config("SCORE_THRESHOLD", 5)) or (single > 0 and any(p >= single for p in parts.values()))
+
+
+class _Windows:
+    """
+    LRU acotado paciente -> (``tomado_en`` más reciente aplicado, ventana de últimos valores).
+    """
+
+    def __init__(self) -> None:
+        self._data: "OrderedDict[int, Tuple[datetime, Window]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, paciente_id: int) -> Optional[Tuple[datetime, Window]]:
+        with self._lock:
+            item = self._data.get(paciente_id)
+            if item is not None:
+                self._data.move_to_end(paciente_id)
+                return item[0], dict(item[1])
+            return None
+
+    def put_many(self, items: Dict[int, Tuple[datetime, Window]]) -> None:
+        max_entries = int(_config("LRU_SIZE", 10000))
+        if max_entries <= 0:
+            return
+        with self._lock:
+            for paciente_id, window in items.items():
+                self._data[paciente_id] = window
+                self._data.move_to_end(paciente_id)
+            while len(self._data) > max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+windows = _Windows()
+
+
+def _load(first_seen: Dict[int, datetime]) -> Dict[int, Window]:
+    """
+    Reconstruye las ventanas con las lecturas anteriores a la primera de cada paciente.
+    """
+    result: Dict[int, Window] = {pid: {} for pid in first_seen}
+    if not first_seen:
+        return result
+    window_misses.inc(len(first_seen))
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT v.paciente_id, EXTRACT(EPOCH FROM s.tomado_en)::float8, {', '.join(f's.{x}::float8' for x in SIGNS)}
+            FROM unnest(%s::bigint[], %s::timestamptz[]) AS v(paciente_id, hasta)
+            JOIN LATERAL (
+              SELECT tomado_en, {', '.join(SIGNS)} FROM app.signos_vitales s
+              WHERE s.paciente_id = v.paciente_id AND s.tomado_en >= v.hasta - make_interval(secs => %s) AND s.tomado_en < v.hasta
+              ORDER BY s.tomado_en DESC LIMIT 50
+            ) s ON TRUE
+            """,
+            [list(first_seen), list(first_seen.values()), float(_config("WINDOW", 3600))],
+        )
+        for paciente_id, ts, *values in cur.fetchall():
+            window = result[paciente_id]
+            for sign, value in zip(SIGNS, values):
+                if value is not None and sign not in window:
+                    window[sign] = (ts, component(sign, value))
+    return result
+
+
+def _stale(since: Dict[int, datetime], readings: Sequence[Tuple[int, datetime]]) -> List[int]:
+    """
+    Pacientes con lecturas en la BD posteriores a ``since`` que no son del lote en curso.
+    """
+    if not since:
+        return []
+    own = Counter(paciente_id for paciente_id, tomado_en in readings if paciente_id in since and tomado_en > since[paciente_id])
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT v.paciente_id, COUNT(*) FROM unnest(%s::bigint[], %s::timestamptz[]) AS v(paciente_id, desde)
+            JOIN app.signos_vitales s ON s.paciente_id = v.paciente_id AND s.tomado_en > v.desde
+            GROUP BY 1
+            """,
+            [list(since), list(since.values())],
+        )
+        return [paciente_id for paciente_id, count in cur.fetchall() if count > own[paciente_id]]
+
+
+def _windows_for(readings: Sequence[Tuple[int, datetime]]) -> Tuple[Dict[int, Window], Dict[int, datetime]]:
+    """
+    ``(ventanas, tomado_en más reciente de cada ventana cacheada)`` para los pacientes del lote.
+    """
+    first: Dict[int, datetime] = {}
+    for paciente_id, tomado_en in readings:
+        if paciente_id not in first or tomado_en < first[paciente_id]:
+            first[paciente_id] = tomado_en
+    states: Dict[int, Window] = {}
+    since: Dict[int, datetime] = {}
+    missing: Dict[int, datetime] = {}
+    for paciente_id, tomado_en in first.items():
+        item = windows.get(paciente_id)
+        if item is None:
+            missing[paciente_id] = tomado_en
+        else:
+            since[paciente_id], states[paciente_id] = item
+    for paciente_id in _stale(since, readings):
+        del states[paciente_id], since[paciente_id]
+        missing[paciente_id] = first[paciente_id]
+    states.update(_load(missing))
+    return states, since
+
+
+def advance(
+    states: Dict[int, Window],
+    paciente_ids: Sequence[int],
+    tomados: Sequence[datetime],
+    parts: Dict[str, Sequence[int]],
+) -> Dict[int, Tuple[int, Dict[str, int]]]:
+    """
+    Aplica las lecturas (en orden de ``tomado_en``) a ``states`` y devuelve
+    ``{paciente_id: (total, componentes)}`` de los que pasan a estar en alarma. Solo memoria.
+    """
+    crossed: Dict[int, Tuple[int, Dict[str, int]]] = {}
+    for i in sorted(range(len(paciente_ids)), key=lambda i: tomados[i]):
+        paciente_id, at = paciente_ids[i], tomados[i].timestamp()
+        window = states[paciente_id]
+        before = is_alarm(*score(window, at))
+        for sign in SIGNS:
+            points = int(parts[sign][i])
+            if points >= 0 and (sign not in window or window[sign][0] <= at):
+                window[sign] = (at, points)
+        total, detail = score(window, at)
+        if not before and is_alarm(total, detail):
+            crossed[paciente_id] = (total, detail)
+    return crossed
+
+
+def evaluate(
+    paciente_ids: Sequence[int],
+    tomados: Sequence[datetime],
+    parts: Dict[str, Sequence[int]],
+    tomado_por_id: int,
+) -> List[Alerta]:
+    """
+    Actualiza las ventanas con lecturas ya insertadas (``parts``: puntos por signo, -1 = sin
+    dato) y crea las alertas de los pacientes que cruzan el umbral. Debe llamarse dentro de
+    la transacción que escribió las lecturas.
+    """
+    states, since = _windows_for(list(zip(paciente_ids, tomados)))
+    crossed = advance(states, paciente_ids, tomados, parts)
+    for paciente_id, tomado_en in zip(paciente_ids, tomados):
+        since[paciente_id] = max(since.get(paciente_id, tomado_en), tomado_en)
+    transaction.on_commit(lambda: windows.put_many({pid: (since[pid], window) for pid, window in states.items()}))
+    return _create_alerts(crossed, tomado_por_id) if crossed else []
+
+
+def evaluate_vitals(vitals, tomado_por_id: int) -> List[Alerta]:
+    """
+    ``evaluate`` para instancias de ``SignoVital`` recién guardadas (alta individual).
+    """
+    vitals = list(vitals)
+    return evaluate(
+        [v.paciente_id for v in vitals],
+        [v.tomado_en for v in vitals],
+        {sign: [-1 if getattr(v, sign) is None else component(sign, float(getattr(v, sign))) for v in vitals] for sign in SIGNS},
+        tomado_por_id,
+    )
+
+
+def evaluate_columns(paciente_ids: Sequence[int], tomados: Sequence[datetime], values: Dict[str, np.ndarray], tomado_por_id: int) -> List[Alerta]:
+    """
+    ``evaluate`` para columnas NumPy de un lote (``NaN`` = sin dato): los puntos se calculan vectorizados.
+    """
+    return evaluate(paciente_ids, tomados, {sign: components_array(sign, values[sign]) for sign in SIGNS}, tomado_por_id)
+
+
+def _create_alerts(crossed: Dict[int, Tuple[int, Dict[str, int]]], tomado_por_id: int) -> List[Alerta]:
+    with connection.cursor() as cur:
+        # En orden de id para que dos lotes con pacientes en común no se bloqueen mutuamente
+        cur.execute(
+            "SELECT pg_advisory_xact_lock(%s, (v.id & 2147483647)::int) FROM unnest(%s::bigint[]) AS v(id)",
+            [ALERT_LOCK, sorted(crossed)],
+        )
+    already_open = set(
+        Alerta.objects.filter(
+            paciente_id__in=list(crossed), fuente="admin", estado__in=OPEN_STATES, descripcion__startswith=DESCRIPTION_PREFIX
+        ).values_list("paciente_id", flat=True)
+    )
+    tipo = catalogs.tipos_alerta.get(_config("TIPO_ALERTA", "otro"))
+    created = []
+    for paciente_id, (total, detail) in crossed.items():
+        if paciente_id in already_open:
+            continue
+        text = ", ".join(f"{sign}={points}" for sign, points in detail.items() if points)
+        created.append(Alerta(
+            paciente_id=paciente_id,
+            tipo_alerta=tipo,
+            estado="pendiente",
+            descripcion=f"{DESCRIPTION_PREFIX}: NEWS2 parcial {total} ({text})",
+            fuente="admin",
+        ))
+    if not created:
+        return []
+    Alerta.objects.bulk_create(created)
+    EventoAlerta.objects.bulk_create([
+        EventoAlerta(alerta_id=alert.id, por_usuario_id=tomado_por_id, tipo="creada",
+                     detalle_json={"origen": "news2", "puntuacion": crossed[alert.paciente_id][0], "componentes": crossed[alert.paciente_id][1]})
+        for alert in created
+    ])
+    stats.record_created_many(created)
+    for alert in created:
+        outbox.emit_alert_event("alert_created", AlertaReadSerializer(alert).data)
+    alerts_counter.inc(len(created))
+    return created
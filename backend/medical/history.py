@@ -0,0 +1,107 @@
+"""
+Historial de signos vitales para gráficas, con tamaño acotado sea cual sea la ventana.
+
+La resolución se elige a partir de la ventana pedida (``resolucion=auto``):
+
+- hasta ``VITALS_HISTORY["RAW_MAX_HOURS"]``: lecturas crudas;
+- si caben en ``puntos`` intervalos de una hora: agregados horarios (``medical.rollups``);
+- si no: agregados diarios.
+
+Cualquier serie con más de ``puntos`` puntos se reduce con LTTB (``common.timeseries``)
+sobre el valor (crudo) o la media (agregados), de modo que la respuesta nunca pasa de
+``puntos`` elementos por signo.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from rest_framework import serializers
+
+from common.timeseries import lttb
+from .rollups import RESOLUTIONS, SIGNS
+
+_timestamp = serializers.DateTimeField()
+
+
+def _config(name: str, default):
+    return getattr(settings, "VITALS_HISTORY", {}).get(name, default)
+
+
+def _iso(epoch: float) -> str:
+    return _timestamp.to_representation(datetime.fromtimestamp(epoch, tz=dt_timezone.utc))
+
+
+def _value(sign: str, value: float):
+    return round(value, 1) if sign == "temp_c" else int(value)
+
+
+def choose_resolution(desde: datetime, hasta: datetime, puntos: int) -> str:
+    span = hasta - desde
+    if span <= timedelta(hours=float(_config("RAW_MAX_HOURS", 48))):
+        return "raw"
+    if span <= timedelta(hours=puntos):
+        return "hora"
+    return "dia"
+
+
+def raw_series(paciente_id: int, desde: datetime, hasta: datetime, signos: Sequence[str], puntos: int) -> Dict[str, List[Dict[str, Any]]]:
+    with connection.cursor() as cur:
+        cur.execute(
+            f"SELECT EXTRACT(EPOCH FROM tomado_en)::float8, {', '.join(f'{s}::float8' for s in signos)} "
+            "FROM app.signos_vitales WHERE paciente_id = %s AND tomado_en >= %s AND tomado_en < %s ORDER BY tomado_en, id",
+            [paciente_id, desde, hasta],
+        )
+        rows = cur.fetchall()
+    data = np.array(rows, dtype=np.float64).reshape(len(rows), len(signos) + 1)
+    series = {}
+    for column, sign in enumerate(signos, start=1):
+        present = ~np.isnan(data[:, column])
+        x, y = data[present, 0], data[present, column]
+        keep = lttb(x, y, puntos)
+        series[sign] = [{"t": _iso(x[i]), "v": _value(sign, y[i])} for i in keep]
+    return series
+
+
+def rollup_series(paciente_id: int, resolucion: str, desde: datetime, hasta: datetime, signos: Sequence[str], puntos: int) -> Dict[str, List[Dict[str, Any]]]:
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT signo, EXTRACT(EPOCH FROM bucket)::float8, n, minimo, maximo, suma / n "
+            "FROM app.signos_vitales_rollup "
+            "WHERE paciente_id = %s AND resolucion = %s AND signo = ANY(%s) "
+            "AND bucket >= date_trunc(%s, %s::timestamptz, 'UTC') AND bucket < %s "
+            "ORDER BY signo, bucket",
+            [paciente_id, resolucion, list(signos), RESOLUTIONS[resolucion], desde, hasta],
+        )
+        rows = cur.fetchall()
+    by_sign: Dict[str, List[tuple]] = {sign: [] for sign in signos}
+    for row in rows:
+        by_sign[row[0]].append(row)
+    series = {}
+    for sign, sign_rows in by_sign.items():
+        if len(sign_rows) > puntos:
+            keep = lttb(np.array([r[1] for r in sign_rows]), np.array([r[5] for r in sign_rows]), puntos)
+            sign_rows = [sign_rows[i] for i in keep]
+        series[sign] = [
+            {"t": _iso(t), "n": n, "min": _value(sign, lo), "max": _value(sign, hi), "media": round(mean, 1)}
+            for _, t, n, lo, hi, mean in sign_rows
+        ]
+    return series
+
+
+def history(paciente_id: int, desde: datetime, hasta: datetime, signos: Sequence[str] = SIGNS, puntos: int = 500, resolucion: str = "auto") -> Dict[str, Any]:
+    if resolucion == "auto":
+        resolucion = choose_resolution(desde, hasta, puntos)
+    if resolucion == "raw":
+        series = raw_series(paciente_id, desde, hasta, signos, puntos)
+    else:
+        series = rollup_series(paciente_id, resolucion, desde, hasta, signos, puntos)
+    return {
+        "paciente_id": paciente_id,
+        "desde": _timestamp.to_representation(desde),
+        "hasta": _timestamp.to_representation(hasta),
+        "resolucion": resolucion,
+        "series": series,
+    }
@@ -0,0 +1,95 @@
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from accounts.models import Usuario
+from medical import early_warning, rollups
+from medical.models import SignoVital
+
+
+def _percentile(data, q: float) -> float:
+    return data[min(len(data) - 1, int(round(q * (len(data) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Mide el coste de la puntuación de alerta temprana por lectura, el throughput por lotes y su peso en POST /api/vitals."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readings", type=int, default=100000, help="Lecturas sintéticas para los escenarios en memoria")
+        parser.add_argument("--patients", type=int, default=500, help="Pacientes distintos de las lecturas sintéticas")
+        parser.add_argument("--writes", type=int, default=300, help="Altas individuales contra la BD (0 = omitir)")
+
+    def _synthetic(self, n: int, patients: int):
+        rng = np.random.default_rng(7)
+        base = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        tomados = [base + timedelta(seconds=int(s)) for s in np.sort(rng.integers(0, 7 * 86400, n))]
+        ids = rng.integers(1, patients + 1, n).tolist()
+        values = {
+            "spo2": rng.normal(95, 3, n).round(),
+            "pas_sistolica": rng.normal(120, 20, n).round(),
+            "fcritmo": rng.normal(85, 18, n).round(),
+            "temp_c": rng.normal(37, 0.8, n).round(1),
+        }
+        for column in values.values():
+            column[rng.random(n) < 0.3] = np.nan  # lecturas parciales
+        return ids, tomados, values
+
+    def handle(self, *args, **options):
+        n, patients = options["readings"], options["patients"]
+        ids, tomados, values = self._synthetic(n, patients)
+
+        # Alta individual: bisect por signo + ventana del paciente, lectura a lectura
+        states = {pid: {} for pid in range(1, patients + 1)}
+        start = time.perf_counter()
+        crossed = 0
+        for i in range(n):
+            parts = {sign: [-1 if np.isnan(values[sign][i]) else early_warning.component(sign, values[sign][i])] for sign in early_warning.SIGNS}
+            crossed += len(early_warning.advance(states, [ids[i]], [tomados[i]], parts))
+        single = time.perf_counter() - start
+        self.stdout.write(f"por lectura (individual)   {single / n * 1e6:7.2f} µs/lectura  {n / single:12,.0f} lecturas/s  cruces={crossed}")
+
+        # Lote: componentes vectorizados con NumPy y un solo recorrido de ventanas
+        states = {pid: {} for pid in range(1, patients + 1)}
+        start = time.perf_counter()
+        parts = {sign: early_warning.components_array(sign, values[sign]) for sign in early_warning.SIGNS}
+        batch_crossed = len(early_warning.advance(states, ids, tomados, parts))
+        batch = time.perf_counter() - start
+        self.stdout.write(f"por lotes                  {batch / n * 1e6:7.2f} µs/lectura  {n / batch:12,.0f} lecturas/s  pacientes_en_alarma={batch_crossed}")
+
+        if options["writes"] <= 0:
+            return
+        user = Usuario.objects.order_by("id").first()
+        if user is None:
+            raise CommandError("Se necesita al menos un usuario (manage.py init_app_schema)")
+        # Paciente desechable: cada alta se confirma (las ventanas se guardan en on_commit) y se borra al final
+        patient = Usuario.objects.create(email=f"bench-ews-{uuid.uuid4().hex[:12]}@example.invalid", pass_hash="!", rol_id=user.rol_id, activo=False)
+        early_warning.windows.clear()
+        misses = early_warning.window_misses.value
+        try:
+            for label, scoring in (("alta sin puntuación", False), ("alta con puntuación", True)):
+                samples = []
+                for _ in range(options["writes"]):
+                    started = time.perf_counter()
+                    with transaction.atomic():
+                        v = SignoVital.objects.create(
+                            paciente_id=patient.id, tomado_por_id=user.id,
+                            spo2=random.randint(96, 99), fcritmo=random.randint(60, 85), pas_sistolica=random.randint(115, 130),
+                        )
+                        rollups.record([v])
+                        if scoring:
+                            early_warning.evaluate_vitals([v], user.id)
+                    samples.append((time.perf_counter() - started) * 1000)
+                samples.sort()
+                self.stdout.write(f"{label:<26} p50={_percentile(samples, 0.5):6.2f} ms  p95={_percentile(samples, 0.95):6.2f} ms")
+            self.stdout.write(f"ventanas reconstruidas desde la BD: {early_warning.window_misses.value - misses}")
+        finally:
+            with connection.cursor() as cur:
+                cur.execute("DELETE FROM app.signos_vitales_rollup WHERE paciente_id = %s", [patient.id])
+                cur.execute("DELETE FROM app.signos_vitales WHERE paciente_id = %s", [patient.id])
+                cur.execute("DELETE FROM app.usuarios WHERE id = %s", [patient.id])
+        self.stdout.write(self.style.SUCCESS("Datos de prueba descartados."))
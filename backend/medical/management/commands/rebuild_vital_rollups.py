@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from medical import rollups
+
+
+class Command(BaseCommand):
+    help = "Recalcula app.signos_vitales_rollup (agregados horarios y diarios) desde app.signos_vitales."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rollups.rebuild()
+        with connection.cursor() as cur:
+            cur.execute("SELECT resolucion, COUNT(*) FROM app.signos_vitales_rollup GROUP BY 1 ORDER BY 1")
+            counts = dict(cur.fetchall())
+        self.stdout.write(f"intervalos={counts}")
+        self.stdout.write(self.style.SUCCESS("Agregados de signos vitales recalculados."))
@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.db import connection, transaction
 
+from common import catalogs
+
 
 SQL = """
 CREATE SCHEMA IF NOT EXISTS app;
@@ -12,6 +14,19 @@ CREATE TABLE IF NOT EXISTS app.tipos_nota (
   activo BOOLEAN NOT NULL DEFAULT TRUE
 );
 
+-- Agregados horarios/diarios de signos vitales (medical/rollups.py)
+CREATE TABLE IF NOT EXISTS app.signos_vitales_rollup (
+  paciente_id BIGINT NOT NULL REFERENCES app.usuarios(id) ON DELETE CASCADE,
+  resolucion VARCHAR(4) NOT NULL CHECK (resolucion IN ('hora','dia')),
+  signo VARCHAR(16) NOT NULL,
+  bucket TIMESTAMPTZ NOT NULL,
+  n INTEGER NOT NULL,
+  minimo DOUBLE PRECISION NOT NULL,
+  maximo DOUBLE PRECISION NOT NULL,
+  suma DOUBLE PRECISION NOT NULL,
+  PRIMARY KEY (paciente_id, resolucion, signo, bucket)
+);
+
 INSERT INTO app.tipos_nota (codigo, nombre, activo) VALUES
 ('triaje','Nota de triaje', TRUE),
 ('evol','Evolución', TRUE),
@@ -21,11 +36,12 @@ ON CONFLICT (codigo) DO NOTHING;
 
 
 class Command(BaseCommand):
-    help = "Crea/asegura tipos de nota mínimos (triaje, evol, resumen)."
+    help = "Crea/asegura tipos de nota mínimos (triaje, evol, resumen) y la tabla de agregados de signos vitales."
 
     def handle(self, *args, **options):
         with transaction.atomic():
             with connection.cursor() as cursor:
                 cursor.execute(SQL)
+        catalogs.invalidate_all()
         self.stdout.write(self.style.SUCCESS("Tipos de nota sembrados/asegurados (triaje, evol, resumen)."))
 
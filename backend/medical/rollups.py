@@ -0,0 +1,85 @@
+"""
+Agregados horarios y diarios de signos vitales mantenidos de forma incremental.
+
+``app.signos_vitales_rollup`` guarda por (paciente, resolución ``hora``/``dia``, signo,
+inicio del intervalo en UTC) el número de lecturas, mínimo, máximo y suma (la media es
+``suma / n``). Las mismas transacciones que escriben ``app.signos_vitales`` (alta individual
+y por lotes) hacen un único upsert agregando en SQL las lecturas nuevas, así que el
+historial de meses o años se lee de unos cientos de filas en lugar de todas las lecturas.
+
+``manage.py rebuild_vital_rollups`` recalcula la tabla desde cero (p. ej. al activarlo).
+"""
+
+from datetime import datetime
+from typing import Any, Iterable, List, Sequence
+
+from django.db import connection
+
+from .serializers import VITAL_RANGES
+
+SIGNS = tuple(VITAL_RANGES)
+RESOLUTIONS = {"hora": "hour", "dia": "day"}
+
+_SIGN_VALUES = ", ".join(f"('{sign}', v.{sign})" for sign in SIGNS)
+_RESOLUTION_VALUES = ", ".join(f"('{name}', '{unit}')" for name, unit in RESOLUTIONS.items())
+
+
+def _aggregate_sql(source: str) -> str:
+    # ``source`` expone paciente_id, tomado_en y una columna float8 por signo con el alias ``v``
+    return f"""
+    SELECT v.paciente_id, res.resolucion, date_trunc(res.unidad, v.tomado_en, 'UTC') AS bucket, s.signo,
+           COUNT(*), MIN(s.valor), MAX(s.valor), SUM(s.valor)
+    FROM {source}
+    CROSS JOIN LATERAL (VALUES {_SIGN_VALUES}) AS s(signo, valor)
+    CROSS JOIN (VALUES {_RESOLUTION_VALUES}) AS res(resolucion, unidad)
+    WHERE s.valor IS NOT NULL AND s.valor <> 'NaN'::float8
+    GROUP BY 1, 2, 3, 4
+    """
+
+
+UPSERT_SQL = f"""
+INSERT INTO app.signos_vitales_rollup AS r (paciente_id, resolucion, bucket, signo, n, minimo, maximo, suma)
+{_aggregate_sql("unnest(%s::bigint[], %s::timestamptz[], " + ", ".join(["%s::float8[]"] * len(SIGNS)) + ") AS v(paciente_id, tomado_en, " + ", ".join(SIGNS) + ")")}
+ORDER BY 1, 2, 4, 3
+ON CONFLICT (paciente_id, resolucion, signo, bucket) DO UPDATE SET
+  n = r.n + EXCLUDED.n,
+  minimo = LEAST(r.minimo, EXCLUDED.minimo),
+  maximo = GREATEST(r.maximo, EXCLUDED.maximo),
+  suma = r.suma + EXCLUDED.suma
+"""
+
+REBUILD_SQL = f"""
+TRUNCATE app.signos_vitales_rollup;
+INSERT INTO app.signos_vitales_rollup (paciente_id, resolucion, bucket, signo, n, minimo, maximo, suma)
+{_aggregate_sql("(SELECT paciente_id, tomado_en, " + ", ".join(f"{sign}::float8 AS {sign}" for sign in SIGNS) + " FROM app.signos_vitales) AS v")};
+"""
+
+
+def record_columns(paciente_ids: Sequence[int], tomados: Sequence[datetime], values: Iterable[Sequence[Any]]) -> None:
+    """
+    Suma lecturas ya insertadas: ``values`` trae una secuencia por signo (orden de ``SIGNS``;
+    ``None`` o ``NaN`` = sin dato), alineada con ``paciente_ids`` y ``tomados``.
+    """
+    if not len(paciente_ids):
+        return
+    params: List[Any] = [list(paciente_ids), list(tomados)]
+    params.extend(list(column) for column in values)
+    with connection.cursor() as cur:
+        cur.execute(UPSERT_SQL, params)
+
+
+def record(vitals) -> None:
+    """
+    Suma instancias de ``SignoVital`` recién guardadas.
+    """
+    vitals = list(vitals)
+    record_columns(
+        [v.paciente_id for v in vitals],
+        [v.tomado_en for v in vitals],
+        [[None if getattr(v, sign) is None else float(getattr(v, sign)) for v in vitals] for sign in SIGNS],
+    )
+
+
+def rebuild() -> None:
+    with connection.cursor() as cur:
+        cur.execute(REBUILD_SQL)
@@ -1,8 +1,13 @@
+from datetime import timedelta
 from typing import Any, Dict
 
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 
 from accounts.models import Usuario
+from common import catalogs
+from common.fastread import RowSerializer
 from .models import TipoNota, RegistroClinico, SignoVital, Adjunto
 
 
@@ -14,8 +19,8 @@ class TipoNotaSerializer(serializers.ModelSerializer):
 
 class RecordReadSerializer(serializers.ModelSerializer):
     tipo_nota = TipoNotaSerializer()
-    paciente_id = serializers.IntegerField(source="paciente.id")
-    creado_por_id = serializers.IntegerField(source="creado_por.id")
+    paciente_id = serializers.IntegerField()
+    creado_por_id = serializers.IntegerField()
 
     class Meta:
         model = RegistroClinico
@@ -32,13 +37,23 @@ class RecordWriteSerializer(serializers.Serializer):
         code = data["tipo_nota_codigo"]
         if not Usuario.objects.filter(id=pid).exists():
             raise serializers.ValidationError({"paciente_id": "Paciente no existe"})
-        tipo = TipoNota.objects.filter(codigo__iexact=code, activo=True).first()
+        tipo = catalogs.tipos_nota.get(code)
         if not tipo:
             raise serializers.ValidationError({"tipo_nota_codigo": "Tipo de nota inválido"})
         data["_tipo_obj"] = tipo
         return data
 
 
+# Rangos admitidos por signo vital (los mismos para el alta individual y por lotes)
+VITAL_RANGES = {
+    "pas_sistolica": (40, 260),
+    "pas_diastolica": (20, 160),
+    "fcritmo": (20, 260),
+    "spo2": (50, 100),
+    "temp_c": (30.0, 45.0),
+}
+
+
 class VitalsWriteSerializer(serializers.Serializer):
     paciente_id = serializers.IntegerField()
     pas_sistolica = serializers.IntegerField(required=False, allow_null=True)
@@ -54,25 +69,53 @@ class VitalsWriteSerializer(serializers.Serializer):
 
     def validate(self, data: Dict[str, Any]) -> Dict[str, Any]:
         # Rango básico para evitar violar constraints BD antes de llegar
-        def in_range(val, lo, hi, name):
-            if val is None:
-                return
-            if not (lo <= val <= hi):
+        for name, (lo, hi) in VITAL_RANGES.items():
+            val = data.get(name)
+            if val is not None and not (lo <= float(val) <= hi):
                 raise serializers.ValidationError({name: f"Fuera de rango permitido [{lo},{hi}]."})
+        return data
+
+
+class VitalsBatchSerializer(serializers.Serializer):
+    # Cada lectura se valida por columnas en medical.vitals_batch, no con un serializer por fila
+    lecturas = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_lecturas(self, value):
+        max_rows = int(getattr(settings, "VITALS_BATCH", {}).get("MAX_ROWS", 5000))
+        if len(value) > max_rows:
+            raise serializers.ValidationError(f"Máximo {max_rows} lecturas por lote")
+        return value
+
+
+class VitalsHistoryQuerySerializer(serializers.Serializer):
+    desde = serializers.DateTimeField(required=False)
+    hasta = serializers.DateTimeField(required=False)
+    signos = serializers.CharField(required=False)
+    puntos = serializers.IntegerField(required=False, min_value=3)
+    resolucion = serializers.ChoiceField(choices=("auto", "raw", "hora", "dia"), default="auto")
+
+    def validate_signos(self, value: str):
+        signos = [s.strip() for s in value.split(",") if s.strip()]
+        invalid = [s for s in signos if s not in VITAL_RANGES]
+        if invalid or not signos:
+            raise serializers.ValidationError(f"Signos válidos: {', '.join(VITAL_RANGES)}")
+        return signos
 
-        in_range(data.get("pas_sistolica"), 40, 260, "pas_sistolica")
-        in_range(data.get("pas_diastolica"), 20, 160, "pas_diastolica")
-        in_range(data.get("fcritmo"), 20, 260, "fcritmo")
-        in_range(data.get("spo2"), 50, 100, "spo2")
-        t = data.get("temp_c")
-        if t is not None and not (30.0 <= float(t) <= 45.0):
-            raise serializers.ValidationError({"temp_c": "Fuera de rango permitido [30.0,45.0]."})
+    def validate(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        config = getattr(settings, "VITALS_HISTORY", {})
+        data["hasta"] = data.get("hasta") or timezone.now()
+        data["desde"] = data.get("desde") or data["hasta"] - timedelta(days=float(config.get("DEFAULT_DAYS", 7)))
+        if data["desde"] >= data["hasta"]:
+            raise serializers.ValidationError({"desde": "Debe ser anterior a hasta"})
+        max_points = int(config.get("MAX_POINTS", 5000))
+        data["puntos"] = min(data.get("puntos") or int(config.get("DEFAULT_POINTS", 500)), max_points)
+        data["signos"] = data.get("signos") or list(VITAL_RANGES)
         return data
 
 
 class VitalsReadSerializer(serializers.ModelSerializer):
-    paciente_id = serializers.IntegerField(source="paciente.id")
-    tomado_por_id = serializers.IntegerField(source="tomado_por.id")
+    paciente_id = serializers.IntegerField()
+    tomado_por_id = serializers.IntegerField()
 
     class Meta:
         model = SignoVital
@@ -90,3 +133,8 @@ class AttachmentReadSerializer(serializers.ModelSerializer):
         model = Adjunto
         fields = ["id", "propietario_tabla", "propietario_id", "nombre_archivo", "mime", "ruta_storage", "tamano_bytes", "creado_por_id", "creado_en"]
 
+
+# Listados: misma salida que los serializers de lectura, desde filas values() (ver common.fastread)
+record_rows = RowSerializer(RecordReadSerializer)
+vitals_rows = RowSerializer(VitalsReadSerializer)
+attachment_rows = RowSerializer(AttachmentReadSerializer)
@@ -1,10 +1,13 @@
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.db import connection
 from rest_framework.test import APIClient
 from django.contrib.auth.hashers import make_password
 
+from common import catalogs
 from accounts.jwt_utils import create_access_token
+from alerts.tests.test_alerts_flow import DDL as ALERTS_DDL
 
 
 DDL = """
@@ -56,6 +59,18 @@ CREATE TABLE IF NOT EXISTS app.signos_vitales (
   tomado_en TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
+CREATE TABLE IF NOT EXISTS app.signos_vitales_rollup (
+  paciente_id BIGINT NOT NULL REFERENCES app.usuarios(id) ON DELETE CASCADE,
+  resolucion VARCHAR(4) NOT NULL CHECK (resolucion IN ('hora','dia')),
+  signo VARCHAR(16) NOT NULL,
+  bucket TIMESTAMPTZ NOT NULL,
+  n INTEGER NOT NULL,
+  minimo DOUBLE PRECISION NOT NULL,
+  maximo DOUBLE PRECISION NOT NULL,
+  suma DOUBLE PRECISION NOT NULL,
+  PRIMARY KEY (paciente_id, resolucion, signo, bucket)
+);
+
 INSERT INTO app.roles (nombre) VALUES ('user'),('nurse') ON CONFLICT (nombre) DO NOTHING;
 INSERT INTO app.tipos_nota (codigo, nombre, activo) VALUES ('triaje','Nota de triaje', TRUE)
 ON CONFLICT (codigo) DO NOTHING;
@@ -68,6 +83,11 @@ class MedicalEndpointsTests(TestCase):
         super().setUpClass()
         with connection.cursor() as cursor:
             cursor.execute(DDL)
+            # La alerta temprana de signos vitales crea alertas
+            cursor.execute(ALERTS_DDL)
+            cursor.execute("INSERT INTO app.tipos_alerta (codigo, nombre, activo) VALUES ('otro','Otro', TRUE) ON CONFLICT (codigo) DO NOTHING")
+        # Las tablas de catálogo se recrean por clase de test: descartar lo cacheado
+        catalogs.invalidate_all()
         from accounts.models import Usuario, Role
         nurse_role = Role.objects.get(nombre="nurse")
         user_role = Role.objects.get(nombre="user")
@@ -112,3 +132,225 @@ class MedicalEndpointsTests(TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertTrue(len(res.data) >= 1)
 
+    def test_patient_lists_constant_queries(self):
+        from medical.models import RegistroClinico, SignoVital, TipoNota
+
+        triaje = TipoNota.objects.get(codigo="triaje")
+
+        def queries(url_name):
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(reverse(url_name, args=[self.patient.id]))
+            self.assertEqual(res.status_code, 200)
+            return len(ctx.captured_queries)
+
+        def add_rows(n):
+            for i in range(n):
+                RegistroClinico.objects.create(paciente=self.patient, creado_por=self.nurse, tipo_nota=triaje, nota=f"n{i}")
+                SignoVital.objects.create(paciente=self.patient, tomado_por=self.nurse, spo2=97)
+
+        add_rows(1)
+        records, vitals = queries("records-by-patient"), queries("vitals-by-patient")
+        add_rows(10)
+        self.assertEqual(queries("records-by-patient"), records)
+        self.assertEqual(queries("vitals-by-patient"), vitals)
+
+    def test_attachments_list_constant_queries(self):
+        from medical.models import Adjunto
+
+        params = {"propietario_tabla": "registros_clinicos", "propietario_id": 1}
+
+        def add_rows(n):
+            for _ in range(n):
+                Adjunto.objects.create(
+                    propietario_tabla="registros_clinicos", propietario_id=1, nombre_archivo="f.pdf",
+                    mime="application/pdf", ruta_storage=f"/media/attachments/{Adjunto.objects.count()}.pdf",
+                    tamano_bytes=10, creado_por=self.nurse,
+                )
+
+        def queries():
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(reverse("attachments"), params)
+            self.assertEqual(res.status_code, 200)
+            return res, len(ctx.captured_queries)
+
+        add_rows(1)
+        queries()  # calienta la caché de autenticación
+        _, baseline = queries()
+        add_rows(10)
+        res, count = queries()
+        self.assertEqual(count, baseline)
+        self.assertEqual(len(res.data), 11)
+        self.assertEqual(res.data[0]["creado_por_id"], self.nurse.id)
+
+        # Una sola ruta para listar y subir; ambos métodos exigen enfermería
+        patient = APIClient()
+        patient.credentials(HTTP_AUTHORIZATION=f"Bearer {create_access_token({'sub': str(self.patient.id), 'email': self.patient.email, 'role': 'user'}, 600)}")
+        self.assertEqual(patient.get(reverse("attachments"), params).status_code, 403)
+        self.assertEqual(patient.post(reverse("attachments"), {**params, "file": b""}, format="multipart").status_code, 403)
+
+    def test_vitals_batch_vectorized_validation(self):
+        from medical.models import SignoVital
+
+        rows = [
+            {"paciente_id": self.patient.id, "pas_sistolica": 120, "pas_diastolica": 80, "temp_c": 36.6, "tomado_en": "2026-01-05T08:00:00Z"},
+            {"paciente_id": self.patient.id, "spo2": 97, "fcritmo": 72},
+            {"paciente_id": self.patient.id, "spo2": 120, "fcritmo": 10},
+            {"paciente_id": 999999, "spo2": 97},
+            {"pas_sistolica": 120},
+            {"paciente_id": self.patient.id, "fcritmo": "rápido", "temp_c": 36.65},
+            {"paciente_id": self.patient.id, "spo2": 97.5, "tomado_en": "ayer"},
+            {"paciente_id": self.patient.id, "spo2": 97, "tomado_en": "2999-01-01T00:00:00Z"},
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(reverse("vitals-batch"), {"lecturas": rows}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual((res.data["total"], res.data["insertadas"]), (8, 2))
+        errors = {e["fila"]: e["errores"] for e in res.data["errores"]}
+        self.assertEqual(sorted(errors), [2, 3, 4, 5, 6, 7])
+        self.assertEqual(set(errors[2]), {"spo2", "fcritmo"})
+        self.assertEqual(errors[3], {"paciente_id": "Paciente no existe"})
+        self.assertEqual(errors[4], {"paciente_id": "Este campo es requerido."})
+        self.assertEqual(set(errors[5]), {"fcritmo", "temp_c"})
+        self.assertEqual(set(errors[6]), {"spo2", "tomado_en"})
+        self.assertIn("tomado_en", errors[7])
+        # Una sola consulta de pacientes para todo el lote (la otra es la del usuario autenticado)
+        self.assertEqual(sum("app\".\"usuarios" in q["sql"] for q in ctx.captured_queries), 2)
+
+        vitals = list(SignoVital.objects.filter(paciente=self.patient).order_by("tomado_en"))
+        self.assertEqual(len(vitals), 2)
+        self.assertEqual((vitals[0].pas_sistolica, str(vitals[0].temp_c), vitals[0].tomado_en.isoformat()), (120, "36.6", "2026-01-05T08:00:00+00:00"))
+        self.assertEqual((vitals[1].spo2, vitals[1].fcritmo, vitals[1].tomado_por_id), (97, 72, self.nurse.id))
+
+        # Ninguna válida: 400 con los errores por fila
+        res = self.client.post(reverse("vitals-batch"), {"lecturas": [{"paciente_id": self.patient.id, "spo2": 10}]}, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data["errores"][0]["fila"], 0)
+        with self.settings(VITALS_BATCH={"MAX_ROWS": 1}):
+            res = self.client.post(reverse("vitals-batch"), {"lecturas": rows[:2]}, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("lecturas", res.data["errors"])
+
+    def test_vitals_rollups_and_history(self):
+        from datetime import datetime, timedelta, timezone as dt_timezone
+        from medical import rollups
+
+        base = datetime(2026, 3, 1, 8, 0, tzinfo=dt_timezone.utc)
+        rows = [
+            {"paciente_id": self.patient.id, "spo2": 90 + (i % 10), "temp_c": 36.5, "tomado_en": (base + timedelta(minutes=10 * i)).isoformat()}
+            for i in range(6 * 24 * 30)  # 30 días, una lectura cada 10 minutos
+        ]
+        self.assertEqual(self.client.post(reverse("vitals-batch"), {"lecturas": rows}, format="json").status_code, 201)
+        res = self.client.post(reverse("vitals-create"), {"paciente_id": self.patient.id, "spo2": 80}, format="json")
+        self.assertEqual(res.status_code, 201)
+
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT n, minimo, maximo, suma FROM app.signos_vitales_rollup "
+                "WHERE paciente_id = %s AND resolucion = 'dia' AND signo = 'spo2' AND bucket = %s",
+                [self.patient.id, base.replace(hour=0)],
+            )
+            self.assertEqual(cur.fetchone(), (96, 90.0, 99.0, float(sum(90 + i % 10 for i in range(96)))))
+            cur.execute("SELECT COUNT(*), SUM(n) FROM app.signos_vitales_rollup WHERE paciente_id = %s AND resolucion = 'hora' AND signo = 'spo2'", [self.patient.id])
+            hours, readings = cur.fetchone()
+        self.assertEqual((hours, readings), (24 * 30 + 1, len(rows) + 1))
+
+        def get(**params):
+            res = self.client.get(reverse("vitals-history", args=[self.patient.id]), params)
+            self.assertEqual(res.status_code, 200, res.data)
+            return res.data
+
+        # Ventana corta: crudo; si hay más lecturas que puntos, LTTB a tamaño fijo
+        data = get(desde="2026-03-01T08:00:00Z", hasta="2026-03-02T08:00:00Z", signos="spo2", puntos=50)
+        self.assertEqual(data["resolucion"], "raw")
+        self.assertEqual(list(data["series"]), ["spo2"])
+        self.assertEqual(len(data["series"]["spo2"]), 50)
+        self.assertEqual(data["series"]["spo2"][0], {"t": "2026-03-01T08:00:00Z", "v": 90})
+
+        # 10 días caben en 500 puntos horarios; 30 días con 100 puntos pasan a diarios
+        data = get(desde="2026-03-01T00:00:00Z", hasta="2026-03-11T00:00:00Z", signos="spo2,temp_c")
+        self.assertEqual(data["resolucion"], "hora")
+        self.assertEqual(len(data["series"]["spo2"]), 10 * 24 - 8)
+        self.assertEqual(data["series"]["temp_c"][0], {"t": "2026-03-01T08:00:00Z", "n": 6, "min": 36.5, "max": 36.5, "media": 36.5})
+        data = get(desde="2026-03-01T00:00:00Z", hasta="2026-04-01T00:00:00Z", puntos=100)
+        self.assertEqual(data["resolucion"], "dia")
+        self.assertEqual(len(data["series"]["spo2"]), 31)
+        self.assertEqual(data["series"]["pas_sistolica"], [])
+        # Forzar horario sobre 30 días: LTTB deja exactamente `puntos`
+        self.assertEqual(len(get(desde="2026-03-01T00:00:00Z", hasta="2026-04-01T00:00:00Z", puntos=100, resolucion="hora")["series"]["spo2"]), 100)
+
+        res = self.client.get(reverse("vitals-history", args=[self.patient.id]), {"signos": "peso"})
+        self.assertEqual(res.status_code, 400)
+
+        # Recalcular desde cero da lo mismo que el mantenimiento incremental
+        def snapshot():
+            with connection.cursor() as cur:
+                cur.execute("SELECT * FROM app.signos_vitales_rollup ORDER BY paciente_id, resolucion, signo, bucket")
+                return cur.fetchall()
+
+        before = snapshot()
+        rollups.rebuild()
+        self.assertEqual(snapshot(), before)
+
+    def test_early_warning_creates_alert_on_crossing(self):
+        from datetime import datetime, timedelta, timezone as dt_timezone
+        from accounts.models import Usuario
+        from alerts.models import Alerta, AlertaOutbox, EventoAlerta
+        from medical import early_warning
+
+        early_warning.windows.clear()
+        self.assertEqual([early_warning.component("temp_c", t) for t in (35.0, 35.1, 36.1, 38.1, 39.1)], [3, 1, 0, 1, 2])
+        self.assertEqual(list(early_warning.components_array("spo2", __import__("numpy").array([91, 92, 95, 96, float("nan")]))), [3, 2, 1, 0, -1])
+
+        def post(**vitals):
+            res = self.client.post(reverse("vitals-create"), {"paciente_id": self.patient.id, **vitals}, format="json")
+            self.assertEqual(res.status_code, 201)
+            return list(Alerta.objects.filter(paciente_id=self.patient.id, fuente="admin"))
+
+        self.assertEqual(post(spo2=97, fcritmo=80), [])
+        self.assertEqual(post(fcritmo=115, temp_c="38.5"), [])  # 2 + 1
+        outbox_before = AlertaOutbox.objects.count()
+        (alert,) = post(pas_sistolica=95)  # + 2 = 5 con la ventana del paciente
+        self.assertEqual((alert.estado, alert.tipo_alerta.codigo), ("pendiente", "otro"))
+        self.assertTrue(alert.descripcion.startswith("Alerta temprana: NEWS2 parcial 5"))
+        evento = EventoAlerta.objects.get(alerta=alert)
+        self.assertEqual((evento.tipo, evento.por_usuario_id), ("creada", self.nurse.id))
+        self.assertEqual(evento.detalle_json["componentes"], {"spo2": 0, "fcritmo": 2, "temp_c": 1, "pas_sistolica": 2})
+        self.assertEqual(AlertaOutbox.objects.count(), outbox_before + 1)
+        # Sigue en alarma (no cruza) y, al volver a cruzar, ya tiene una alerta temprana abierta
+        self.assertEqual(len(post(spo2=96)), 1)
+        self.assertEqual(len(post(pas_sistolica=120, fcritmo=80, temp_c="37.0")), 1)
+        self.assertEqual(len(post(spo2=91)), 1)
+
+        # Lote: componentes por columnas; las lecturas fuera de la ventana no suman
+        user_role = self.patient.rol
+        other, spaced = (Usuario.objects.create(email=f"ews{i}@example.com", pass_hash="x", rol=user_role) for i in range(2))
+        base = datetime(2026, 5, 1, 8, 0, tzinfo=dt_timezone.utc)
+        rows = [
+            {"paciente_id": other.id, "spo2": 95, "tomado_en": base.isoformat()},
+            {"paciente_id": other.id, "fcritmo": 112, "tomado_en": (base + timedelta(minutes=5)).isoformat()},
+            {"paciente_id": other.id, "temp_c": 39.5, "tomado_en": (base + timedelta(minutes=10)).isoformat()},
+        ] + [
+            {"paciente_id": spaced.id, sign: value, "tomado_en": (base + timedelta(hours=2 * i)).isoformat()}
+            for i, (sign, value) in enumerate((("spo2", 93), ("fcritmo", 115), ("pas_sistolica", 95)))
+        ]
+        res = self.client.post(reverse("vitals-batch"), {"lecturas": rows}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(len(res.data["alertas_tempranas"]), 1)
+        self.assertEqual(Alerta.objects.get(id=res.data["alertas_tempranas"][0]).paciente_id, other.id)
+        self.assertFalse(Alerta.objects.filter(paciente_id=spaced.id).exists())
+
+        # Ventana cacheada desactualizada: otro worker escribió una lectura posterior a la última
+        # aplicada, así que se reconstruye desde la BD en vez de puntuar solo con la caché
+        from medical.models import SignoVital
+        stale = Usuario.objects.create(email="ews-stale@example.com", pass_hash="x", rol=user_role)
+        early_warning.windows.put_many({stale.id: (base, {})})
+        other_write = SignoVital.objects.create(paciente_id=stale.id, tomado_por_id=self.nurse.id, spo2=92, fcritmo=115)
+        SignoVital.objects.filter(id=other_write.id).update(tomado_en=base + timedelta(minutes=1))
+        res = self.client.post(reverse("vitals-batch"), {"lecturas": [
+            {"paciente_id": stale.id, "pas_sistolica": 95, "tomado_en": (base + timedelta(minutes=2)).isoformat()},
+        ]}, format="json")
+        self.assertEqual(len(res.data["alertas_tempranas"]), 1)
+        # La comprobación de alerta abierta va bajo el advisory lock del paciente
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(early_warning._create_alerts({stale.id: (5, {"spo2": 3})}, self.nurse.id), [])
+        self.assertIn("pg_advisory_xact_lock", ctx.captured_queries[0]["sql"])
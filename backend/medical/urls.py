@@ -4,9 +4,10 @@ from .views import (
     RecordsView,
     RecordsByPatientView,
     VitalsCreateView,
+    VitalsBatchView,
     VitalsByPatientView,
-    AttachmentCreateView,
-    AttachmentsListView,
+    VitalsHistoryView,
+    AttachmentsView,
     AttachmentDetailView,
 )
 
@@ -14,9 +15,10 @@ urlpatterns = [
     path("records", RecordsView.as_view(), name="records"),
     path("records/<int:paciente_id>", RecordsByPatientView.as_view(), name="records-by-patient"),
     path("vitals", VitalsCreateView.as_view(), name="vitals-create"),
+    path("vitals/batch", VitalsBatchView.as_view(), name="vitals-batch"),
     path("vitals/<int:paciente_id>", VitalsByPatientView.as_view(), name="vitals-by-patient"),
-    path("attachments", AttachmentCreateView.as_view(), name="attachments-create"),
-    path("attachments", AttachmentsListView.as_view(), name="attachments-list"),
+    path("vitals/<int:paciente_id>/history", VitalsHistoryView.as_view(), name="vitals-history"),
+    path("attachments", AttachmentsView.as_view(), name="attachments"),
     path("attachments/<int:id>", AttachmentDetailView.as_view(), name="attachments-detail"),
 ]
 
@@ -11,14 +11,21 @@ from rest_framework.views import APIView
 
 from accounts.authentication import get_user_from_request
 from accounts.permissions import IsNurse
+from common.pagination import KeysetPagination
+from . import early_warning, history, rollups, vitals_batch
 from .models import RegistroClinico, SignoVital, Adjunto
 from .serializers import (
     RecordReadSerializer,
     RecordWriteSerializer,
     VitalsWriteSerializer,
     VitalsReadSerializer,
+    VitalsBatchSerializer,
+    VitalsHistoryQuerySerializer,
     AttachmentCreateSerializer,
     AttachmentReadSerializer,
+    record_rows,
+    vitals_rows,
+    attachment_rows,
 )
 
 
@@ -35,8 +42,10 @@ class RecordsView(APIView):
         if not usuario:
             return Response({"detail": "No autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
         # Usuario ve sus propios registros
-        registros = RegistroClinico.objects.select_related("tipo_nota").filter(paciente_id=usuario.id).order_by("-creado_en")
-        return Response(RecordReadSerializer(registros, many=True).data, status=status.HTTP_200_OK)
+        registros = RegistroClinico.objects.filter(paciente_id=usuario.id)
+        paginator = KeysetPagination("creado_en")
+        page = paginator.paginate_queryset(record_rows.values(registros), request)
+        return paginator.get_paginated_response(record_rows.many(page))
 
     @transaction.atomic
     def post(self, request):
@@ -73,12 +82,10 @@ class RecordsByPatientView(APIView):
     def get(self, request, paciente_id: int):
         if not IsNurse().has_permission(request, self):
             return Response({"detail": "Permisos insuficientes"}, status=status.HTTP_403_FORBIDDEN)
-        registros = (
-            RegistroClinico.objects.select_related("tipo_nota")
-            .filter(paciente_id=paciente_id)
-            .order_by("-creado_en")
-        )
-        return Response(RecordReadSerializer(registros, many=True).data, status=status.HTTP_200_OK)
+        registros = RegistroClinico.objects.filter(paciente_id=paciente_id)
+        paginator = KeysetPagination("creado_en")
+        page = paginator.paginate_queryset(record_rows.values(registros), request)
+        return paginator.get_paginated_response(record_rows.many(page))
 
 
 class VitalsCreateView(APIView):
@@ -109,9 +116,36 @@ class VitalsCreateView(APIView):
             temp_c=ser.validated_data.get("temp_c"),
             spo2=ser.validated_data.get("spo2"),
         )
+        rollups.record([v])
+        early_warning.evaluate_vitals([v], usuario.id)
         return Response(VitalsReadSerializer(v).data, status=status.HTTP_201_CREATED)
 
 
+class VitalsBatchView(APIView):
+    """
+    POST /api/vitals/batch {lecturas: [{paciente_id, tomado_en?, ...}]} -> enfermería/dispositivos:
+    miles de lecturas validadas por columnas y cargadas con COPY (ver medical.vitals_batch)
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @transaction.atomic
+    def post(self, request):
+        if not IsNurse().has_permission(request, self):
+            return Response({"detail": "Permisos insuficientes"}, status=status.HTTP_403_FORBIDDEN)
+        usuario = get_user_from_request(request)
+        if not usuario:
+            return Response({"detail": "No autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        ser = VitalsBatchSerializer(data=request.data)
+        if not ser.is_valid():
+            return Response({"detail": "Datos inválidos", "errors": ser.errors}, status=status.HTTP_400_BAD_REQUEST)
+        result = vitals_batch.ingest_vitals(usuario.id, ser.validated_data["lecturas"])
+        if not result["insertadas"]:
+            return Response({"detail": "Datos inválidos", **result}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
 class VitalsByPatientView(APIView):
     """
     GET /api/vitals/<paciente_id> -> enfermería
@@ -122,23 +156,63 @@ class VitalsByPatientView(APIView):
     def get(self, request, paciente_id: int):
         if not IsNurse().has_permission(request, self):
             return Response({"detail": "Permisos insuficientes"}, status=status.HTTP_403_FORBIDDEN)
-        vs = SignoVital.objects.filter(paciente_id=paciente_id).order_by("-tomado_en")
-        return Response(VitalsReadSerializer(vs, many=True).data, status=status.HTTP_200_OK)
+        vs = SignoVital.objects.filter(paciente_id=paciente_id)
+        paginator = KeysetPagination("tomado_en")
+        page = paginator.paginate_queryset(vitals_rows.values(vs), request)
+        return paginator.get_paginated_response(vitals_rows.many(page))
+
+
+class VitalsHistoryView(APIView):
+    """
+    GET /api/vitals/<paciente_id>/history?desde=&hasta=&signos=&puntos=&resolucion= -> enfermería:
+    series para gráficas, crudas o agregadas por hora/día según la ventana (ver medical.history)
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, paciente_id: int):
+        if not IsNurse().has_permission(request, self):
+            return Response({"detail": "Permisos insuficientes"}, status=status.HTTP_403_FORBIDDEN)
+        ser = VitalsHistoryQuerySerializer(data=request.query_params)
+        if not ser.is_valid():
+            return Response({"detail": "Datos inválidos", "errors": ser.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(history.history(paciente_id, **ser.validated_data))
 
 
-class AttachmentCreateView(APIView):
+class AttachmentsView(APIView):
     """
-    POST /api/attachments  (multipart/form-data)
+    GET /api/attachments?propietario_tabla=registros_clinicos&propietario_id=123  (enfermería)
+      Lista adjuntos de un propietario concreto.
+    POST /api/attachments  (enfermería, multipart/form-data)
     Campos:
       - propietario_tabla: registros_clinicos | alertas
       - propietario_id: id de la fila dueña
       - file: archivo a subir
     """
 
-    permission_classes = [IsAuthenticated, IsNurse]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not IsNurse().has_permission(request, self):
+            return Response({"detail": "Permisos insuficientes"}, status=status.HTTP_403_FORBIDDEN)
+        owner_table = request.query_params.get("propietario_tabla")
+        owner_id = request.query_params.get("propietario_id")
+        if not owner_table or not owner_id:
+            return Response({"detail": "Faltan propietario_tabla y propietario_id"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            owner_id_int = int(owner_id)
+        except ValueError:
+            return Response({"detail": "propietario_id inválido"}, status=status.HTTP_400_BAD_REQUEST)
+        qs = Adjunto.objects.filter(propietario_tabla=owner_table, propietario_id=owner_id_int)
+        paginator = KeysetPagination("creado_en")
+        page = paginator.paginate_queryset(attachment_rows.values(qs), request)
+        return paginator.get_paginated_response(attachment_rows.many(page))
 
     @transaction.atomic
     def post(self, request):
+        if not IsNurse().has_permission(request, self):
+            return Response({"detail": "Permisos insuficientes"}, status=status.HTTP_403_FORBIDDEN)
+
         ser = AttachmentCreateSerializer(data=request.data)
         if not ser.is_valid():
             return Response({"detail": "Datos inválidos", "errors": ser.errors}, status=status.HTTP_400_BAD_REQUEST)
@@ -177,29 +251,6 @@ class AttachmentCreateView(APIView):
         return Response(AttachmentReadSerializer(adj).data, status=status.HTTP_201_CREATED)
 
 
-class AttachmentsListView(APIView):
-    """
-    GET /api/attachments?propietario_tabla=registros_clinicos&propietario_id=123  (enfermería)
-    Lista adjuntos de un propietario concreto.
-    """
-
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request):
-        if not IsNurse().has_permission(request, self):
-            return Response({"detail": "Permisos insuficientes"}, status=status.HTTP_403_FORBIDDEN)
-        owner_table = request.query_params.get("propietario_tabla")
-        owner_id = request.query_params.get("propietario_id")
-        if not owner_table or not owner_id:
-            return Response({"detail": "Faltan propietario_tabla y propietario_id"}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            owner_id_int = int(owner_id)
-        except ValueError:
-            return Response({"detail": "propietario_id inválido"}, status=status.HTTP_400_BAD_REQUEST)
-        qs = Adjunto.objects.filter(propietario_tabla=owner_table, propietario_id=owner_id_int).order_by("-creado_en")
-        return Response(AttachmentReadSerializer(qs, many=True).data, status=status.HTTP_200_OK)
-
-
 class AttachmentDetailView(APIView):
     """
     GET /api/attachments/<id>  (enfermería)
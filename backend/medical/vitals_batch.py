@@ -0,0 +1,183 @@
+"""
+Alta de signos vitales por lotes (monitores y carros de enfermería).
+
+En lugar de un ``VitalsWriteSerializer`` y un INSERT por lectura:
+
+1. Las lecturas se pasan a columnas NumPy (``NaN`` = sin dato) y los tipos, decimales y
+   rangos de ``VITAL_RANGES`` se comprueban con operaciones vectorizadas sobre todo el lote.
+2. Los ``paciente_id`` se comprueban con una sola consulta ``id = ANY(...)`` sobre los
+   distintos del lote.
+3. Las filas válidas se cargan con un ``COPY`` a ``app.signos_vitales`` y se suman a los
+   agregados horarios/diarios (``medical.rollups``) con un único upsert.
+4. La puntuación de alerta temprana (``medical.early_warning``) se calcula por columnas y
+   puede crear alertas para los pacientes que cruzan el umbral.
+
+Cada lectura trae su ``tomado_en`` (ISO 8601; sin él, la hora de recepción). Los
+errores se devuelven por fila (índice en ``lecturas``) y no impiden cargar el resto.
+"""
+
+import csv
+import io
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import Usuario
+from . import early_warning, rollups
+from .serializers import VITAL_RANGES
+
+INT_FIELDS = ("pas_sistolica", "pas_diastolica", "fcritmo", "spo2")
+COLUMNS = ("paciente_id", "tomado_por_id", "pas_sistolica", "pas_diastolica", "fcritmo", "temp_c", "spo2", "tomado_en")
+
+
+def _config(name: str, default):
+    return getattr(settings, "VITALS_BATCH", {}).get(name, default)
+
+
+class _Errors:
+    """
+    Errores por fila: ``{indice: {campo: mensaje}}`` (el primero por campo).
+    """
+
+    def __init__(self) -> None:
+        self.by_row: Dict[int, Dict[str, str]] = {}
+
+    def add(self, index: int, name: str, message: str) -> None:
+        self.by_row.setdefault(index, {}).setdefault(name, message)
+
+    def add_mask(self, mask: np.ndarray, name: str, message: str) -> None:
+        for index in np.flatnonzero(mask):
+            self.add(int(index), name, message)
+
+    def as_list(self) -> List[Dict[str, Any]]:
+        return [{"fila": index, "errores": errors} for index, errors in sorted(self.by_row.items())]
+
+
+def _column(rows: List[Dict[str, Any]], name: str, errors: _Errors) -> np.ndarray:
+    """
+    Columna float64 del lote con ``NaN`` donde falta el valor.
+    """
+    values = [row.get(name) for row in rows]
+    try:
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    # Algún valor no numérico: conversión elemento a elemento para señalar cuál
+    column = np.full(len(values), np.nan)
+    for index, value in enumerate(values):
+        if value is None:
+            continue
+        try:
+            column[index] = float(value)
+        except (TypeError, ValueError):
+            errors.add(index, name, "Se requiere un número válido.")
+    return column
+
+
+def _timestamps(rows: List[Dict[str, Any]], now, errors: _Errors) -> List[Any]:
+    max_future = now + timedelta(seconds=float(_config("MAX_FUTURE_SKEW", 300)))
+    result = []
+    for index, row in enumerate(rows):
+        raw = row.get("tomado_en")
+        if raw is None:
+            result.append(now)
+            continue
+        value = parse_datetime(raw) if isinstance(raw, str) else None
+        if value is None:
+            errors.add(index, "tomado_en", "Fecha/hora inválida (ISO 8601).")
+        else:
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            if value > max_future:
+                errors.add(index, "tomado_en", "Fecha/hora en el futuro.")
+        result.append(value)
+    return result
+
+
+def validate(rows: List[Dict[str, Any]], errors: _Errors) -> Dict[str, np.ndarray]:
+    """
+    Valida el lote por columnas; devuelve las columnas numéricas y ``valid`` (máscara de filas sin errores).
+    """
+    n = len(rows)
+    columns = {name: _column(rows, name, errors) for name in ("paciente_id", *VITAL_RANGES)}
+    present = {name: ~np.isnan(column) for name, column in columns.items()}
+
+    ids = columns["paciente_id"]
+    errors.add_mask(np.array([row.get("paciente_id") is None for row in rows], dtype=bool), "paciente_id", "Este campo es requerido.")
+    for name in ("paciente_id", *INT_FIELDS):
+        column = columns[name]
+        errors.add_mask(present[name] & ((column != np.floor(column)) | ~np.isfinite(column)), name, "Se requiere un número entero válido.")
+    temp = columns["temp_c"]
+    errors.add_mask(present["temp_c"] & ~np.isclose(temp * 10, np.round(temp * 10)), "temp_c", "Asegúrese de que no haya más de 1 decimal.")
+
+    for name, (lo, hi) in VITAL_RANGES.items():
+        column = columns[name]
+        with np.errstate(invalid="ignore"):
+            errors.add_mask(present[name] & ((column < lo) | (column > hi)), name, f"Fuera de rango permitido [{lo},{hi}].")
+
+    with np.errstate(invalid="ignore"):
+        plausible = present["paciente_id"] & (ids == np.floor(ids)) & (ids >= 1) & (ids < 2 ** 53)
+    candidates = np.unique(ids[plausible]).astype(np.int64)
+    known = np.fromiter(
+        Usuario.objects.filter(id__in=candidates.tolist()).values_list("id", flat=True), dtype=np.int64
+    ) if candidates.size else np.empty(0, dtype=np.int64)
+    errors.add_mask(present["paciente_id"] & ~np.isin(ids, known), "paciente_id", "Paciente no existe")
+
+    valid = np.ones(n, dtype=bool)
+    valid[list(errors.by_row)] = False
+    columns["valid"] = valid
+    return columns
+
+
+def _cell(value: float, fmt: str) -> str:
+    return "" if np.isnan(value) else fmt % value
+
+
+def _copy(columns: Dict[str, np.ndarray], timestamps: List[Any], tomado_por_id: int, index: np.ndarray) -> int:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for i in index:
+        writer.writerow([
+            int(columns["paciente_id"][i]),
+            tomado_por_id,
+            *(_cell(columns[name][i], "%d") for name in ("pas_sistolica", "pas_diastolica", "fcritmo")),
+            _cell(columns["temp_c"][i], "%.1f"),
+            _cell(columns["spo2"][i], "%d"),
+            timestamps[i].isoformat(),
+        ])
+    buf.seek(0)
+    with connection.cursor() as cur:
+        cur.copy_expert(f"COPY app.signos_vitales ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+    rollups.record_columns(
+        columns["paciente_id"][index].astype(np.int64).tolist(),
+        [timestamps[i] for i in index],
+        [columns[sign][index].tolist() for sign in rollups.SIGNS],
+    )
+    return len(index)
+
+
+def ingest_vitals(tomado_por_id: int, rows: List[Dict[str, Any]], now: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Valida e inserta ``rows``; devuelve ``{total, insertadas, errores: [{fila, errores}], alertas_tempranas}``.
+    Debe llamarse dentro de una transacción.
+    """
+    now = now or timezone.now()
+    errors = _Errors()
+    timestamps = _timestamps(rows, now, errors)
+    columns = validate(rows, errors)
+    index = np.flatnonzero(columns["valid"])
+    inserted, alerts = 0, []
+    if index.size:
+        inserted = _copy(columns, timestamps, tomado_por_id, index)
+        alerts = early_warning.evaluate_columns(
+            columns["paciente_id"][index].astype(np.int64).tolist(),
+            [timestamps[i] for i in index],
+            {sign: columns[sign][index] for sign in early_warning.SIGNS},
+            tomado_por_id,
+        )
+    return {"total": len(rows), "insertadas": inserted, "errores": errors.as_list(), "alertas_tempranas": [a.id for a in alerts]}
@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.db import connection, transaction
 
+from common import catalogs
+
 
 SQL = """
 CREATE SCHEMA IF NOT EXISTS app;
@@ -26,5 +28,6 @@ class Command(BaseCommand):
         with transaction.atomic():
             with connection.cursor() as cursor:
                 cursor.execute(SQL)
+        catalogs.invalidate_all()
         self.stdout.write(self.style.SUCCESS("Tipos de servicio sembrados/asegurados (control, consulta)."))
 
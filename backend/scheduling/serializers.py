@@ -5,6 +5,8 @@ from django.utils import timezone
 from rest_framework import serializers
 
 from accounts.models import Usuario
+from common import catalogs
+from common.fastread import RowSerializer
 from .models import Cita, Agenda, TipoServicio
 
 
@@ -37,7 +39,7 @@ class AppointmentCreateSerializer(serializers.Serializer):
         if not Usuario.objects.filter(id=data["enfermero_id"]).exists():
             raise serializers.ValidationError({"enfermero_id": "Enfermero no existe"})
         # tipo servicio
-        ts = TipoServicio.objects.filter(codigo__iexact=data["tipo_servicio_codigo"], activo=True).first()
+        ts = catalogs.tipos_servicio.get(data["tipo_servicio_codigo"])
         if not ts:
             raise serializers.ValidationError({"tipo_servicio_codigo": "Tipo de servicio inválido"})
         data["_tipo_servicio"] = ts
@@ -48,8 +50,8 @@ class AppointmentCreateSerializer(serializers.Serializer):
 
 
 class AppointmentReadSerializer(serializers.ModelSerializer):
-    paciente_id = serializers.IntegerField(source="paciente.id")
-    enfermero_id = serializers.IntegerField(source="enfermero.id")
+    paciente_id = serializers.IntegerField()
+    enfermero_id = serializers.IntegerField()
     tipo_servicio_codigo = serializers.CharField(source="tipo_servicio.codigo")
 
     class Meta:
@@ -60,3 +62,6 @@ class AppointmentReadSerializer(serializers.ModelSerializer):
 class AppointmentPatchSerializer(serializers.Serializer):
     estado = serializers.ChoiceField(choices=("confirmada", "cancelada", "inasistencia", "atendida"))
 
+
+# Listados: misma salida que los serializers de lectura, desde filas values() (ver common.fastread)
+appointment_rows = RowSerializer(AppointmentReadSerializer)
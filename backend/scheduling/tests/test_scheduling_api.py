@@ -1,12 +1,14 @@
 from datetime import time
 
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.db import connection
 from django.utils import timezone
 from rest_framework.test import APIClient
 from django.contrib.auth.hashers import make_password
 
+from common import catalogs
 from accounts.jwt_utils import create_access_token
 
 
@@ -68,6 +70,8 @@ class SchedulingTests(TestCase):
         super().setUpClass()
         with connection.cursor() as cursor:
             cursor.execute(DDL)
+        # Las tablas de catálogo se recrean por clase de test: descartar lo cacheado
+        catalogs.invalidate_all()
         from accounts.models import Usuario, Role
         cls.nurse_role = Role.objects.get(nombre="nurse")
         cls.user_role = Role.objects.get(nombre="user")
@@ -128,3 +132,31 @@ class SchedulingTests(TestCase):
         )
         self.assertEqual(res.status_code, 409)
 
+    def test_appointments_list_constant_queries(self):
+        from datetime import timedelta
+        from scheduling.models import Cita
+
+        control = catalogs.tipos_servicio.get("control")
+        start = timezone.now() + timedelta(days=30)
+        c = APIClient()
+        c.credentials(HTTP_AUTHORIZATION=f"Bearer {self.nurse_access}")
+
+        def add_rows(n):
+            for _ in range(n):
+                offset = timedelta(hours=Cita.objects.count())
+                Cita.objects.create(paciente=self.patient, enfermero=self.nurse, tipo_servicio=control, inicio=start + offset, fin=start + offset + timedelta(minutes=30))
+
+        def queries():
+            with CaptureQueriesContext(connection) as ctx:
+                res = c.get(reverse("appointments"))
+            self.assertEqual(res.status_code, 200)
+            return res, len(ctx.captured_queries)
+
+        add_rows(1)
+        queries()  # calienta la caché de autenticación
+        _, baseline = queries()
+        add_rows(10)
+        res, count = queries()
+        self.assertEqual(count, baseline)
+        self.assertEqual(len(res.data), 11)
+        self.assertEqual({r["tipo_servicio_codigo"] for r in res.data}, {"control"})
@@ -10,12 +10,14 @@ from rest_framework.views import APIView
 
 from accounts.authentication import get_user_from_request
 from accounts.permissions import IsNurse
+from common.pagination import KeysetPagination
 from .models import Agenda, Cita
 from .serializers import (
     SlotsQuerySerializer,
     AppointmentCreateSerializer,
     AppointmentReadSerializer,
     AppointmentPatchSerializer,
+    appointment_rows,
     DEFAULT_SLOT_MINUTES,
 )
 
@@ -68,13 +70,15 @@ class AppointmentsView(APIView):
         if not user:
             return Response({"detail": "No autenticado"}, status=status.HTTP_401_UNAUTHORIZED)
         mine = request.query_params.get("mine") == "true"
-        qs = Cita.objects.all().order_by("-inicio")
+        qs = Cita.objects.all()
         if mine:
             if user.rol.nombre == "nurse":
                 qs = qs.filter(enfermero_id=user.id)
             else:
                 qs = qs.filter(paciente_id=user.id)
-        return Response(AppointmentReadSerializer(qs, many=True).data, status=status.HTTP_200_OK)
+        paginator = KeysetPagination("inicio")
+        page = paginator.paginate_queryset(appointment_rows.values(qs), request)
+        return paginator.get_paginated_response(appointment_rows.many(page))
 
     @transaction.atomic
     def post(self, request):
@@ -115,7 +119,7 @@ class AppointmentDetailView(APIView):
     def patch(self, request, id: int):
         user = get_user_from_request(request)
         try:
-            appt = Cita.objects.get(id=id)
+            appt = Cita.objects.select_related("tipo_servicio").get(id=id)
         except Cita.DoesNotExist:
             return Response({"detail": "Cita no encontrada"}, status=status.HTTP_404_NOT_FOUND)
         ser = AppointmentPatchSerializer(data=request.data)